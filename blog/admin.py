@@ -1,23 +1,20 @@
 from django.contrib import admin
-from .models import Article, Comment, Tag, UserProfile, ArticleView
+from .models import Article, AuthorStats, Comment, ImageJob, MediaBlob, Tag, UserProfile, ArticleView, VisitorSketch
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
-    list_display = ['name', 'slug', 'color', 'article_count', 'created_at']
+    list_display = ['name', 'slug', 'color', 'published_count', 'created_at']
     list_filter = ['created_at']
     search_fields = ['name']
     prepopulated_fields = {'slug': ('name',)}
-    
-    def article_count(self, obj):
-        return obj.articles.count()
-    article_count.short_description = 'Nombre d\'articles'
+    readonly_fields = ['published_count']
 
 @admin.register(Article)
 class ArticleAdmin(admin.ModelAdmin):
-    list_display = ['title', 'author', 'status', 'is_featured', 'views', 'total_likes', 'total_comments', 'created_at']
+    list_display = ['title', 'author', 'status', 'is_featured', 'views', 'likes_count', 'comments_count', 'created_at']
     list_filter = ['status', 'is_featured', 'created_at', 'tags']
     search_fields = ['title', 'content']
-    readonly_fields = ['created_at', 'updated_at', 'views']
+    readonly_fields = ['created_at', 'updated_at', 'views', 'likes_count', 'comments_count']
     filter_horizontal = ['tags', 'likes']
     list_editable = ['status', 'is_featured']
     
@@ -29,7 +26,7 @@ class ArticleAdmin(admin.ModelAdmin):
             'fields': ('author', 'tags', 'status', 'is_featured')
         }),
         ('Statistiques', {
-            'fields': ('views', 'created_at', 'updated_at'),
+            'fields': ('views', 'likes_count', 'comments_count', 'created_at', 'updated_at'),
             'classes': ('collapse',)
         })
     )
@@ -57,6 +54,49 @@ class ArticleViewAdmin(admin.ModelAdmin):
     list_display = ['article', 'user', 'ip_address', 'timestamp']
     list_filter = ['timestamp', 'article']
     readonly_fields = ['timestamp']
+    list_select_related = ()  # base séparée : pas de jointure avec les articles
     
     def has_add_permission(self, request):
         return False  # Empêcher l'ajout manuel
+
+@admin.register(VisitorSketch)
+class VisitorSketchAdmin(admin.ModelAdmin):
+    list_display = ['article', 'day', 'estimate', 'updated_at']
+    list_filter = ['day']
+    list_select_related = ()
+    readonly_fields = ['article', 'day', 'estimate', 'updated_at']
+    exclude = ['registers']
+    
+    def estimate(self, obj):
+        return obj.estimate
+    estimate.short_description = 'Visiteurs uniques (estimation)'
+    
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(AuthorStats)
+class AuthorStatsAdmin(admin.ModelAdmin):
+    list_display = ['user', 'article_count', 'likes_received', 'views_received', 'comments_written']
+    search_fields = ['user__username']
+    readonly_fields = ['user', 'article_count', 'likes_received', 'views_received', 'comments_written']
+    
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(ImageJob)
+class ImageJobAdmin(admin.ModelAdmin):
+    list_display = ['model', 'object_id', 'field', 'status', 'attempts', 'available_at', 'created_at']
+    list_filter = ['status', 'model', 'field']
+    readonly_fields = ['model', 'object_id', 'field', 'force', 'attempts', 'error', 'locked_by', 'locked_at', 'created_at']
+    
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(MediaBlob)
+class MediaBlobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'size', 'ref_count', 'created_at']
+    search_fields = ['name']
+    readonly_fields = ['name', 'size', 'ref_count', 'created_at']
+    
+    def has_add_permission(self, request):
+        return False
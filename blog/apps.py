@@ -5,4 +5,5 @@ class BlogConfig(AppConfig):
     name = 'blog'
     
     def ready(self):
-        import blog.signals
\ No newline at end of file
+        import blog.signals
+        import blog.sqlite  # pragmas SQLite à chaque connexion
\ No newline at end of file
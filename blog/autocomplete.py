@@ -0,0 +1,238 @@
+"""Index de préfixes en mémoire pour l'autocomplétion de la recherche.
+
+L'index est un tableau trié de (mot normalisé, type, id) parcouru par
+bisection : une recherche coûte O(log n + k) sans aucune requête SQL. Il
+couvre les titres des articles publiés, les noms de tags et les auteurs.
+
+Il est construit au premier appel (une seule fois, sous verrou), mis à
+jour incrémentalement par les signaux de blog.signals, et reconstruit en
+arrière-plan après BLOG_AUTOCOMPLETE_TTL secondes pour rattraper les
+modifications faites par d'autres processus ; l'ancien index répond pendant
+la reconstruction.
+
+Les suggestions sont classées par poids avant d'être tronquées. Pour un
+préfixe court, qui couvre une grande partie de l'index, les TOP_K
+meilleures entrées sont calculées une fois et gardées jusqu'à la prochaine
+modification d'un mot qui commence par ce préfixe.
+"""
+import heapq
+import logging
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connections
+from django.urls import reverse
+
+from .models import Article, Tag
+
+ARTICLE, TAG, AUTHOR = 'article', 'tag', 'author'
+# Priorité d'affichage à poids égal
+KIND_PRIORITY = {ARTICLE: 3, TAG: 2, AUTHOR: 1}
+# Préfixes dont le classement est précalculé (les plus fréquents), et sa taille
+SHORT_PREFIX = 3
+TOP_K = 50
+
+logger = logging.getLogger(__name__)
+
+Suggestion = namedtuple('Suggestion', 'kind id label url weight extra')
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize(text):
+    """Minuscules sans accents : « Été » -> « ete »."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text):
+    return _WORD_RE.findall(normalize(text))
+
+
+def _rank(suggestion):
+    return suggestion.weight, KIND_PRIORITY[suggestion.kind], -suggestion.id
+
+
+def _short_prefixes(tokens):
+    return {token[:length] for token in tokens for length in range(1, min(len(token), SHORT_PREFIX) + 1)}
+
+
+class PrefixIndex:
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries = []
+        self._items = {}
+        # préfixe court -> ses TOP_K meilleures suggestions, calculé à la demande
+        self._top = {}
+        self.built_at = None
+
+    def __len__(self):
+        return len(self._items)
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+            self._items = {}
+            self._top = {}
+            self.built_at = None
+
+    def add(self, suggestion):
+        key = (suggestion.kind, suggestion.id)
+        with self._lock:
+            if key in self._items:
+                self._remove_entries(key)
+            self._items[key] = suggestion
+            tokens = set(tokenize(suggestion.label))
+            for token in tokens:
+                insort(self._entries, (token, suggestion.kind, suggestion.id))
+            self._forget_top(tokens)
+
+    def remove(self, kind, obj_id):
+        with self._lock:
+            if (kind, obj_id) in self._items:
+                self._remove_entries((kind, obj_id))
+                del self._items[(kind, obj_id)]
+
+    def _remove_entries(self, key):
+        kind, obj_id = key
+        tokens = set(tokenize(self._items[key].label))
+        for token in tokens:
+            i = bisect_left(self._entries, (token, kind, obj_id))
+            if i < len(self._entries) and self._entries[i] == (token, kind, obj_id):
+                del self._entries[i]
+        self._forget_top(tokens)
+
+    def _forget_top(self, tokens):
+        for prefix in _short_prefixes(tokens):
+            self._top.pop(prefix, None)
+
+    def load(self, suggestions):
+        """Remplace tout le contenu de l'index (tri unique, plus rapide que des insort)."""
+        items = {(s.kind, s.id): s for s in suggestions}
+        entries = sorted(
+            (token, kind, obj_id)
+            for (kind, obj_id), s in items.items()
+            for token in set(tokenize(s.label))
+        )
+        with self._lock:
+            self._items = items
+            self._entries = entries
+            self._top = {}
+            self.built_at = time.monotonic()
+
+    def _keys_for_prefix(self, prefix):
+        keys = set()
+        start = bisect_left(self._entries, (prefix,))
+        for token, kind, obj_id in self._entries[start:]:
+            if not token.startswith(prefix):
+                break
+            keys.add((kind, obj_id))
+        return keys
+
+    def _top_for(self, prefix):
+        if prefix not in self._top:
+            candidates = (self._items[key] for key in self._keys_for_prefix(prefix))
+            self._top[prefix] = heapq.nlargest(TOP_K, candidates, key=_rank)
+        return self._top[prefix]
+
+    def search(self, query, limit=8, kinds=None):
+        """Les `limit` meilleures suggestions dont les mots commencent par ceux de la requête."""
+        words = tokenize(query)
+        if not words:
+            return []
+        # Le mot le plus long est le plus sélectif
+        words.sort(key=len, reverse=True)
+        first, others = words[0], words[1:]
+
+        def matches(suggestion):
+            if kinds is not None and suggestion.kind not in kinds:
+                return False
+            tokens = tokenize(suggestion.label)
+            return all(any(token.startswith(word) for token in tokens) for word in others)
+
+        with self._lock:
+            if len(first) <= SHORT_PREFIX:
+                # Classement précalculé : exact si assez de suggestions y répondent à la requête,
+                # les suivantes ayant un poids inférieur
+                top = self._top_for(first)
+                found = [suggestion for suggestion in top if matches(suggestion)][:limit]
+                if len(found) == limit or len(top) < TOP_K:
+                    return found
+            keys = self._keys_for_prefix(first)
+            for word in others:
+                if not keys:
+                    break
+                if len(word) > SHORT_PREFIX:
+                    keys &= self._keys_for_prefix(word)
+            candidates = [self._items[key] for key in keys if matches(self._items[key])]
+        return heapq.nlargest(limit, candidates, key=_rank)
+
+
+def article_suggestion(article_id, title, author_username, views, likes_count):
+    return Suggestion(
+        ARTICLE, article_id, title, reverse('article_detail', kwargs={'pk': article_id}),
+        views + 10 * likes_count, {'author': author_username},
+    )
+
+
+def tag_suggestion(tag_id, name, slug):
+    return Suggestion(TAG, tag_id, name, f"{reverse('article_list')}?tag={slug}", 0, {})
+
+
+def author_suggestion(user_id, username):
+    return Suggestion(AUTHOR, user_id, username, reverse('user_profile', kwargs={'username': username}), 0, {})
+
+
+def _load_suggestions():
+    articles = Article.objects.filter(status='published').order_by().values_list(
+        'pk', 'title', 'author__username', 'views', 'likes_count'
+    )
+    for row in articles.iterator(chunk_size=5000):
+        yield article_suggestion(*row)
+    for row in Tag.objects.order_by().values_list('pk', 'name', 'slug'):
+        yield tag_suggestion(*row)
+    authors = User.objects.filter(article__status='published').order_by().values_list('pk', 'username').distinct()
+    for row in authors:
+        yield author_suggestion(*row)
+
+
+index = PrefixIndex()
+_build_lock = threading.Lock()
+_rebuilding = threading.Event()
+
+
+def _rebuild():
+    try:
+        index.load(_load_suggestions())
+    except Exception:
+        logger.exception("Échec de la reconstruction de l'index d'autocomplétion, nouvel essai au prochain appel")
+    finally:
+        # Connexions propres à ce thread
+        connections.close_all()
+        _rebuilding.clear()
+
+
+def get_index():
+    """L'index du processus : construit au premier appel, reconstruit en arrière-plan une fois périmé."""
+    if index.built_at is None:
+        with _build_lock:
+            if index.built_at is None:
+                index.load(_load_suggestions())
+    elif time.monotonic() - index.built_at > getattr(settings, 'BLOG_AUTOCOMPLETE_TTL', 300):
+        with _build_lock:
+            if _rebuilding.is_set():
+                return index
+            _rebuilding.set()
+        threading.Thread(target=_rebuild, name='autocomplete-rebuild', daemon=True).start()
+    return index
+
+
+def is_built():
+    return index.built_at is not None
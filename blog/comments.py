@@ -0,0 +1,136 @@
+"""Chargement des fils de commentaires.
+
+Les commentaires sont lus triés par chemin matérialisé (Comment.path), puis
+assemblés en arbre en Python : le gabarit parcourt `comment.children` sans
+requête supplémentaire, quelle que soit la profondeur du fil.
+
+thread_page() et reply_page() découpent les fils en pages par curseur (le
+path du dernier commentaire affiché), pour que la page d'un article très
+commenté reste légère et que la suite soit chargée à la demande.
+"""
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+
+from .models import Comment
+
+
+def build_comment_tree(comments):
+    """Assemble des commentaires triés par path en arbre ; retourne les racines.
+
+    Un commentaire dont le parent n'est pas dans la liste est traité comme
+    une racine (utile pour des portions de fil).
+    """
+    by_id = {}
+    roots = []
+    for comment in comments:
+        comment.children = []
+        by_id[comment.pk] = comment
+    for comment in comments:
+        parent = by_id.get(comment.parent_id)
+        if parent is None:
+            roots.append(comment)
+        else:
+            parent.children.append(comment)
+    return roots
+
+
+THREADS_PER_PAGE = 10
+REPLY_PREVIEW = 3
+REPLIES_PER_PAGE = 20
+
+
+class CommentPage:
+
+    def __init__(self, comments, next_cursor):
+        self.comments = comments
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def thread_page(article, cursor=None, per_page=THREADS_PER_PAGE, preview=REPLY_PREVIEW):
+    """Une page de fils (commentaires racines) avec un aperçu de leurs réponses.
+
+    Deux requêtes quelle que soit la taille des fils : les racines (curseur =
+    path de la dernière racine affichée), puis les `preview` premières
+    réponses de chaque fil avec le nombre total de réponses (fonctions de
+    fenêtre). Chaque racine reçoit `reply_count`, `hidden_replies` et
+    `replies_cursor` pour le bouton « voir plus de réponses ».
+    """
+    roots = article.comments.filter(parent__isnull=True).select_related('author').order_by('path')
+    if cursor:
+        roots = roots.filter(path__gt=cursor)
+    roots = list(roots[:per_page + 1])
+    next_cursor = None
+    if len(roots) > per_page:
+        roots = roots[:per_page]
+        next_cursor = roots[-1].path
+
+    by_id = {root.pk: root for root in roots}
+    for root in roots:
+        root.children = []
+        root.reply_count = 0
+        root.hidden_replies = 0
+        root.replies_cursor = root.path
+    if not roots:
+        return CommentPage(roots, next_cursor)
+
+    replies = (
+        Comment.objects.filter(thread_id__in=by_id, parent__isnull=False)
+        .annotate(
+            position=Window(RowNumber(), partition_by=[F('thread_id')], order_by=F('path').asc()),
+            thread_total=Window(Count('id'), partition_by=[F('thread_id')]),
+        )
+        .filter(position__lte=preview)
+        .select_related('author')
+        .order_by('path')
+    )
+    replies_by_thread = {}
+    for reply in replies:
+        replies_by_thread.setdefault(reply.thread_id, []).append(reply)
+    for thread_id, thread_replies in replies_by_thread.items():
+        root = by_id[thread_id]
+        root.children = build_comment_tree(thread_replies)
+        root.reply_count = thread_replies[0].thread_total
+        root.hidden_replies = root.reply_count - len(thread_replies)
+        root.replies_cursor = thread_replies[-1].path
+    return CommentPage(roots, next_cursor)
+
+
+def reply_page(root, cursor=None, per_page=REPLIES_PER_PAGE):
+    """Réponses suivantes d'un fil, dans l'ordre du fil (curseur = dernier path affiché).
+
+    Retourne les sous-arbres de la page ; chacun reçoit `indent`, sa
+    profondeur relative sous la racine du fil.
+    """
+    replies = (
+        Comment.objects.filter(thread_id=root.pk, path__gt=cursor or root.path)
+        .select_related('author')
+        .order_by('path')
+    )
+    replies = list(replies[:per_page + 1])
+    next_cursor = None
+    if len(replies) > per_page:
+        replies = replies[:per_page]
+        next_cursor = replies[-1].path
+    subtrees = build_comment_tree(replies)
+    for comment in subtrees:
+        comment.indent = comment.depth - root.depth
+    return CommentPage(subtrees, next_cursor)
+
+
+def serialize_comment(comment):
+    return {
+        'id': comment.pk,
+        'parent_id': comment.parent_id,
+        'author': comment.author.username,
+        'body': comment.body,
+        'created_at': comment.created_at.isoformat(),
+        'depth': comment.depth,
+        'reply_count': getattr(comment, 'reply_count', None),
+        'hidden_replies': getattr(comment, 'hidden_replies', 0),
+        'replies_cursor': getattr(comment, 'replies_cursor', None),
+        'children': [serialize_comment(child) for child in getattr(comment, 'children', [])],
+    }
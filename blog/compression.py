@@ -0,0 +1,233 @@
+"""Compression gzip / brotli partagée par les fichiers statiques et les réponses.
+
+brotli est facultatif (`pip install brotli`) : sans lui, seul gzip est
+proposé. negotiate() choisit le codage d'après l'en-tête Accept-Encoding.
+
+CompressionMiddleware compresse les réponses HTML / JSON / texte à la volée
+(niveaux rapides), y compris les StreamingHttpResponse morceau par morceau.
+Il ignore les médias et fichiers statiques (déjà compressés ou servis
+précompressés) et les corps de moins de BLOG_COMPRESSION_MIN_SIZE octets.
+Les corps compressés des pages venant du cache de pages (blog.pagecache)
+sont eux-mêmes mis en cache : une page en cache n'est compressée qu'une fois.
+
+Contre BREACH, chaque réponse gzip reçoit, comme avec GZipMiddleware, un
+nom de fichier de longueur aléatoire dans son en-tête (la taille compressée
+ne révèle plus un secret de la page) ; brotli n'a pas d'emplacement
+équivalent et n'est donc pas proposé pour le HTML.
+"""
+import gzip
+import posixpath
+import secrets
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from . import pagecache
+
+try:
+    import brotli
+except ImportError:  # brotli facultatif
+    brotli = None
+
+# Types de fichiers qui gagnent à être compressés (les images, polices woff2
+# et archives le sont déjà)
+COMPRESSIBLE_EXTENSIONS = {
+    '.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ico', '.ttf', '.eot', '.otf',
+}
+
+# Codage -> extension du fichier précompressé, par ordre de préférence
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+def available_encodings():
+    return [encoding for encoding in SUFFIXES if encoding != 'br' or brotli is not None]
+
+
+def is_compressible(name):
+    return posixpath.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS
+
+
+# Longueur maximale du bourrage aléatoire des réponses gzip (comme GZipMiddleware)
+MAX_RANDOM_BYTES = 100
+
+# Niveaux (gzip, brotli) : maximal hors requête, rapide pendant la requête
+LEVELS = {'static': (9, 11), 'runtime': (6, 5)}
+
+# Types de réponse compressés par le middleware
+COMPRESSIBLE_TYPES = (
+    'text/', 'application/json', 'application/javascript', 'application/xml', 'image/svg+xml',
+)
+
+
+def compress(data, encoding, levels='static'):
+    """`data` compressé en un bloc (niveau maximal par défaut, 'runtime' pour les réponses)."""
+    gzip_level, brotli_quality = LEVELS[levels]
+    if encoding == 'br':
+        return brotli.compress(data, quality=brotli_quality)
+    # mtime=0 : sortie déterministe pour un même contenu
+    return gzip.compress(data, compresslevel=gzip_level, mtime=0)
+
+
+def pad_gzip(data, max_random_bytes=MAX_RANDOM_BYTES):
+    """`data` (début d'un flux gzip sans nom de fichier) avec un nom de longueur aléatoire.
+
+    Même procédé que django.utils.text.compress_string : drapeau FNAME et
+    nom de 0 à `max_random_bytes` - 1 octets après l'en-tête de 10 octets.
+    """
+    if not max_random_bytes:
+        return data
+    header = bytearray(data[:10])
+    header[3] = gzip.FNAME
+    return bytes(header) + b'a' * secrets.randbelow(max_random_bytes) + b'\x00' + data[10:]
+
+
+def compressor(encoding, max_random_bytes=0):
+    """(compresser un morceau, terminer) pour une compression incrémentale.
+
+    Chaque morceau est vidé aussitôt : le client reçoit la page au fil de
+    la génération, comme sans compression. En gzip, l'en-tête reçoit le
+    bourrage de pad_gzip().
+    """
+    gzip_level, brotli_quality = LEVELS['runtime']
+    if encoding == 'br':
+        stream = brotli.Compressor(quality=brotli_quality)
+        return (lambda chunk: stream.process(chunk) + stream.flush()), stream.finish
+    stream = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    started = False
+
+    def padded(data):
+        # L'en-tête est au début de la première sortie non vide
+        nonlocal started
+        if started or not data:
+            return data
+        started = True
+        return pad_gzip(data, max_random_bytes)
+
+    return (
+        (lambda chunk: padded(stream.compress(chunk) + stream.flush(zlib.Z_SYNC_FLUSH))),
+        (lambda: padded(stream.flush())),
+    )
+
+
+def accepted_encodings(header):
+    """{codage: q} de l'en-tête Accept-Encoding (codages refusés par q=0 exclus)."""
+    accepted = {}
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding] = quality
+    return {coding: q for coding, q in accepted.items() if q > 0}
+
+
+def negotiate(header, encodings=None):
+    """Meilleur codage proposé (`encodings`, par préférence) accepté par le client, ou None."""
+    accepted = accepted_encodings(header)
+    best, best_quality = None, 0
+    for encoding in encodings if encodings is not None else available_encodings():
+        quality = accepted.get(encoding, accepted.get('*', 0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _content_type(response):
+    return response.get('Content-Type', '').split(';')[0].strip().lower()
+
+
+def _prefix(url):
+    return '/' + url.lstrip('/') if url else None
+
+
+def _compress_stream(chunks, encoding):
+    process, finish = compressor(encoding, MAX_RANDOM_BYTES)
+    for chunk in chunks:
+        data = process(chunk)
+        if data:
+            yield data
+    yield finish()
+
+
+async def _compress_async_stream(chunks, encoding):
+    process, finish = compressor(encoding, MAX_RANDOM_BYTES)
+    async for chunk in chunks:
+        data = process(chunk)
+        if data:
+            yield data
+    yield finish()
+
+
+class CompressionMiddleware:
+    """Compression gzip / brotli des réponses, négociée par Accept-Encoding."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.skipped_prefixes = tuple(filter(None, (_prefix(settings.MEDIA_URL), _prefix(settings.STATIC_URL))))
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not _setting('BLOG_COMPRESSION_ENABLED', True) or not self._compressible(request, response):
+            return response
+        # Le corps dépend désormais d'Accept-Encoding, même non compressé
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encodings = available_encodings()
+        if _content_type(response) == 'text/html':
+            # Pas de bourrage possible en brotli : gzip seul pour le HTML
+            encodings = [encoding for encoding in encodings if encoding != 'br']
+        encoding = negotiate(request.headers.get('Accept-Encoding'), encodings)
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = _compress_async_stream(response.streaming_content, encoding)
+            else:
+                response.streaming_content = _compress_stream(response.streaming_content, encoding)
+            del response['Content-Length']
+        else:
+            if len(response.content) < _setting('BLOG_COMPRESSION_MIN_SIZE', 512):
+                return response
+            compressed = self._compressed_content(response, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # Représentation différente : l'ETag fort devient faible (comme GZipMiddleware)
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
+
+    def _compressible(self, request, response):
+        return (
+            response.status_code == 200
+            and not response.has_header('Content-Encoding')
+            and not request.path.startswith(self.skipped_prefixes)
+            and _content_type(response).startswith(COMPRESSIBLE_TYPES)
+        )
+
+    def _compressed_content(self, response, encoding):
+        # Page du cache de pages : corps compressé mis en cache avec elle,
+        # sans bourrage (tiré à chaque réponse)
+        token = getattr(response, 'page_cache_token', None)
+        compressed = None if token is None else pagecache.compressed_body(token, encoding)
+        if compressed is None:
+            compressed = compress(response.content, encoding, 'runtime')
+            if token is not None:
+                pagecache.store_compressed_body(token, encoding, compressed)
+        return pad_gzip(compressed) if encoding == 'gzip' else compressed
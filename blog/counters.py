@@ -0,0 +1,151 @@
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from . import pagecache
+from .models import Article, AuthorStats, Comment, Tag
+
+POPULAR_TAGS_CACHE_KEY = 'blog:popular_tags'
+POPULAR_TAGS_LIMIT = 10
+
+
+def _aggregate_subquery(queryset, field, aggregate):
+    """Sous-requête d'agrégat corrélée sur la clé étrangère `field`."""
+    totals = (
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=aggregate)
+        .values('total')
+    )
+    return Coalesce(Subquery(totals), Value(0))
+
+
+def _count_subquery(queryset, field):
+    """Sous-requête COUNT(*) corrélée sur la clé étrangère `field`."""
+    return _aggregate_subquery(queryset, field, Count('*'))
+
+
+def refresh_article_counters(article_ids, likes=True, comments=True):
+    """Recalcule likes_count / comments_count des articles donnés.
+
+    Le recalcul se fait en un seul UPDATE avec des sous-requêtes COUNT sur
+    les index de clé étrangère : le résultat reste exact même si plusieurs
+    requêtes modifient les mêmes articles en parallèle.
+    """
+    article_ids = {pk for pk in article_ids if pk is not None}
+    if not article_ids or not (likes or comments):
+        return 0
+
+    updates = {}
+    if likes:
+        updates['likes_count'] = _count_subquery(Article.likes.through.objects.all(), 'article_id')
+    if comments:
+        updates['comments_count'] = _count_subquery(Comment.objects.all(), 'article_id')
+    pagecache.invalidate(*(f'article:{pk}' for pk in article_ids))
+    return Article.objects.filter(pk__in=article_ids).update(**updates)
+
+
+def refresh_author_stats(user_ids, articles=True, comments=True):
+    """Recalcule les statistiques des auteurs donnés.
+
+    `articles` couvre article_count, likes_received et views_received (tous
+    issus des articles publiés), `comments` couvre comments_written. Même
+    principe que refresh_article_counters : un UPDATE à sous-requêtes sur les
+    index de clé étrangère, coût proportionnel aux articles de l'auteur.
+    """
+    user_ids = {pk for pk in user_ids if pk is not None}
+    if not user_ids or not (articles or comments):
+        return 0
+
+    updates = {}
+    if articles:
+        published = Article.objects.filter(status='published')
+        updates['article_count'] = _count_subquery(published, 'author_id')
+        updates['likes_received'] = _aggregate_subquery(published, 'author_id', Sum('likes_count'))
+        updates['views_received'] = _aggregate_subquery(published, 'author_id', Sum('views'))
+    if comments:
+        updates['comments_written'] = _count_subquery(Comment.objects.all(), 'author_id')
+    return AuthorStats.objects.filter(pk__in=user_ids).update(**updates)
+
+
+def article_authors(article_ids):
+    article_ids = {pk for pk in article_ids if pk is not None}
+    if not article_ids:
+        return set()
+    return set(Article.objects.filter(pk__in=article_ids).values_list('author_id', flat=True))
+
+
+def add_author_views(views_per_article):
+    """Ajoute aux auteurs les vues nouvelles {article_id: n} de leurs articles publiés.
+
+    Appelé par le vidage du tampon de vues, dans sa transaction : une
+    requête pour retrouver les auteurs, puis un UPDATE `views_received + n`
+    par incrément distinct.
+    """
+    if not views_per_article:
+        return
+    per_author = defaultdict(int)
+    published = Article.objects.filter(pk__in=views_per_article.keys(), status='published')
+    for article_id, author_id in published.values_list('pk', 'author_id'):
+        per_author[author_id] += views_per_article[article_id]
+    by_increment = defaultdict(list)
+    for author_id, increment in per_author.items():
+        by_increment[increment].append(author_id)
+    for increment, author_ids in by_increment.items():
+        AuthorStats.objects.filter(pk__in=author_ids).update(views_received=F('views_received') + increment)
+
+
+def refresh_tag_counts(tag_ids):
+    """Recalcule published_count des tags donnés et invalide le bloc des tags populaires si besoin."""
+    tag_ids = {pk for pk in tag_ids if pk is not None}
+    if not tag_ids:
+        return 0
+    published_links = Article.tags.through.objects.filter(article__status='published')
+    updated = Tag.objects.filter(pk__in=tag_ids).update(
+        published_count=_count_subquery(published_links, 'tag_id')
+    )
+    pagecache.invalidate('tags', *(f'tag:{pk}' for pk in tag_ids))
+    new_counts = dict(Tag.objects.filter(pk__in=tag_ids).values_list('pk', 'published_count'))
+    if _popular_tags_affected(new_counts):
+        invalidate_popular_tags()
+    return updated
+
+
+def popular_tags():
+    """Les tags les plus utilisés (articles publiés), servis depuis le cache."""
+    tags = cache.get(POPULAR_TAGS_CACHE_KEY)
+    if tags is None:
+        tags = list(Tag.objects.order_by('-published_count', 'name')[:POPULAR_TAGS_LIMIT])
+        cache.set(POPULAR_TAGS_CACHE_KEY, tags, None)
+    # Les tags lus depuis le cache ne passent pas par Tag.from_db
+    pagecache.track('popular_tags', *(f'tag:{tag.pk}' for tag in tags))
+    return tags
+
+
+def invalidate_popular_tags():
+    cache.delete(POPULAR_TAGS_CACHE_KEY)
+    pagecache.invalidate('popular_tags')
+
+
+def _popular_tags_affected(new_counts):
+    """True si des tags aux nouveaux compteurs `new_counts` ({id: count}) modifient le classement en cache."""
+    cached = cache.get(POPULAR_TAGS_CACHE_KEY)
+    if cached is None or not new_counts:
+        return False
+    cached_counts = {tag.pk: tag.published_count for tag in cached}
+    threshold = cached[-1].published_count if len(cached) >= POPULAR_TAGS_LIMIT else None
+    for tag_id, count in new_counts.items():
+        if tag_id in cached_counts:
+            if count != cached_counts[tag_id]:
+                return True
+        elif threshold is None or count >= threshold:
+            return True
+    return False
+
+
+def popular_tags_contain(tag_id):
+    cached = cache.get(POPULAR_TAGS_CACHE_KEY)
+    return cached is not None and any(tag.pk == tag_id for tag in cached)
@@ -0,0 +1,305 @@
+"""Génération d'un jeu de données synthétique à l'échelle de la production.
+
+Les lignes sont insérées par bulk_create (tables de liaison des likes et
+des tags comprises) par lots d'articles, chaque lot dans sa transaction,
+sans passer par save() ni par les signaux : les identifiants sont attribués
+ici (chemins des commentaires calculés sans relecture) et les compteurs
+dénormalisés (likes_count, comments_count, views, Tag.published_count,
+AuthorStats) sont calculés en Python au fil de la génération. L'index de
+recherche est reconstruit à la fin.
+
+La popularité suit une loi de puissance (Pareto) : quelques articles
+concentrent la plupart des likes, commentaires et vues, quelques auteurs
+et tags la plupart des articles. Une même graine donne le même jeu.
+
+Les données s'ajoutent à celles de la base (identifiants à la suite), avec
+des utilisateurs nommés `<prefix><id>`, sans mot de passe utilisable sauf
+si `password` est donné. Un nom déjà pris par un utilisateur ou un tag
+existant reçoit un numéro (`user7_2`).
+"""
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connection, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.text import slugify
+
+from . import pagecache, search
+from .counters import invalidate_popular_tags
+from .models import Article, ArticleView, AuthorStats, Comment, Tag, UserProfile
+from .routers import analytics_db
+
+WORDS = (
+    'django python performance cache requête index serveur vue modèle gabarit '
+    'sqlite latence débit article commentaire réseau mémoire fichier image '
+    'recherche pagination compression session sécurité déploiement test'
+).split()
+
+TAG_COLORS = ('#6f42c1', '#0d6efd', '#198754', '#dc3545', '#fd7e14', '#20c997')
+
+# Exposant de Pareto : plus il est petit, plus la popularité est concentrée
+POPULARITY_ALPHA = 1.5
+PUBLISHED_RATIO = 0.95
+FEATURED_RATIO = 0.001
+# Probabilité qu'un commentaire réponde à un commentaire précédent, profondeur maximale
+REPLY_RATIO = 0.6
+MAX_REPLY_DEPTH = 8
+MAX_COMMENTS_PER_ARTICLE = 500
+# Taille des lots pour les requêtes IN (limite de variables SQLite)
+LOOKUP_CHUNK_SIZE = 500
+
+
+COMMENT_FIELDS = ('id', 'article', 'author', 'body', 'created_at', 'updated_at', 'parent', 'is_edited',
+                  'thread', 'path')
+
+
+def _insert(model, fields, rows, using='default'):
+    """INSERT direct de tuples déjà adaptés à la base (tables à fort volume : pas d'instance de modèle)."""
+    if not rows:
+        return
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(model._meta.get_field(name).column) for name in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    with connection.cursor() as cursor:
+        cursor.executemany(f'INSERT INTO {quote(model._meta.db_table)} ({columns}) VALUES ({placeholders})', rows)
+
+
+def _naive(value, connection):
+    """Date dans le fuseau de la connexion, sans fuseau : l'adapter ne coûte plus qu'un str()."""
+    return timezone.make_naive(value, connection.timezone) if timezone.is_aware(value) else value
+
+
+def _next_id(model, using='default'):
+    return (model.objects.using(using).aggregate(top=Max('pk'))['top'] or 0) + 1
+
+
+def _free_name(name, taken, separator='_', key=str):
+    """`name`, suffixé si besoin pour que key(nom) ne figure pas dans `taken` (mis à jour)."""
+    candidate, n = name, 1
+    while key(candidate) in taken:
+        n += 1
+        candidate = f'{name}{separator}{n}'
+    taken.add(key(candidate))
+    return candidate
+
+
+@contextmanager
+def manual_timestamps():
+    """Désactive auto_now / auto_now_add : les dates générées sont insérées telles quelles."""
+    fields = [
+        field for model in (Article, Comment, Tag, UserProfile) for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Generator:
+    """Génère `articles` articles et leurs données ; `likes`, `comments`, `views` sont des moyennes par article."""
+
+    def __init__(self, users, articles, tags, likes=5.0, comments=3.0, views=10.0, days=365,
+                 seed=0, batch_size=5000, prefix='user', password=None):
+        self.rng = random.Random(seed)
+        self.counts = {'users': users, 'articles': articles, 'tags': tags}
+        self.averages = {'likes': likes, 'comments': comments, 'views': views}
+        self.batch_size = batch_size
+        self.prefix = prefix
+        self.password = password
+        self.now = timezone.now()
+        self.start = self.now - timedelta(days=days)
+        # Textes tirés une fois : assembler les contenus coûte moins que les générer
+        self.paragraphs = [self._text(self.rng.randint(40, 120)) for _ in range(500)]
+        self.sentences = [self._text(self.rng.randint(5, 40)) for _ in range(2000)]
+        self.created = dict.fromkeys(('users', 'tags', 'articles', 'likes', 'tags_links', 'comments', 'views'), 0)
+
+    def _popularity(self, average):
+        # Moyenne de paretovariate : alpha / (alpha - 1)
+        weight = self.rng.paretovariate(POPULARITY_ALPHA) * (POPULARITY_ALPHA - 1) / POPULARITY_ALPHA
+        return int(average * weight + self.rng.random())
+
+    def _zipf_weights(self, size):
+        # Poids cumulés en 1 / rang : tirage par rng.choices(cum_weights=...)
+        return list(accumulate(1 / rank for rank in range(1, size + 1)))
+
+    def _date_between(self, start, end):
+        return start + (end - start) * self.rng.random()
+
+    def _text(self, words):
+        return ' '.join(self.rng.choices(WORDS, k=words))
+
+    def run(self, progress=None):
+        with manual_timestamps():
+            self._create_users()
+            self._create_tags()
+            article_id = _next_id(Article)
+            comment_id = _next_id(Comment)
+            for first in range(0, self.counts['articles'], self.batch_size):
+                size = min(self.batch_size, self.counts['articles'] - first)
+                comment_id = self._create_articles(first, size, article_id + first, comment_id)
+                if progress:
+                    progress(first + size, self.counts['articles'])
+            self._create_stats()
+        search.rebuild_index()
+        invalidate_popular_tags()
+        pagecache.invalidate('articles', 'tags')
+        return self.created
+
+    def _create_users(self):
+        first_id = _next_id(User)
+        self.user_ids = list(range(first_id, first_id + self.counts['users']))
+        # Un seul hachage pour tous les comptes ; None : mot de passe
+        # inutilisable (comme set_unusable_password), connexion impossible
+        password = make_password(self.password)
+        self.stats = {pk: [0, 0, 0, 0] for pk in self.user_ids}
+        # Auteurs en loi de puissance : les premiers écrivent l'essentiel des articles
+        self.author_weights = self._zipf_weights(len(self.user_ids))
+        # Comptes existants nommés comme les nôtres (« user7 » créé à la main)
+        taken = set(User.objects.filter(username__startswith=self.prefix).values_list('username', flat=True))
+        for first in range(0, len(self.user_ids), self.batch_size):
+            chunk = self.user_ids[first:first + self.batch_size]
+            with transaction.atomic():
+                users = []
+                for pk in chunk:
+                    joined = self._date_between(self.start, self.now)
+                    username = _free_name(f'{self.prefix}{pk}', taken)
+                    users.append(User(pk=pk, username=username, password=password, date_joined=joined))
+                User.objects.bulk_create(users)
+                UserProfile.objects.bulk_create([
+                    UserProfile(user_id=user.pk, created_at=user.date_joined, bio=self._text(12)) for user in users
+                ])
+        self.created['users'] = len(self.user_ids)
+
+    def _create_tags(self):
+        first_id = _next_id(Tag)
+        # Nom et slug uniques : un nom dont le slug est libre est libre aussi
+        slugs = set()
+        for name, slug in Tag.objects.values_list('name', 'slug'):
+            slugs.update((slugify(name), slug))
+        tags = []
+        for pk in range(first_id, first_id + self.counts['tags']):
+            name = _free_name(f'{self.rng.choice(WORDS)} {pk}', slugs, ' ', key=slugify)
+            tags.append(Tag(pk=pk, name=name, slug=slugify(name), color=self.rng.choice(TAG_COLORS),
+                            created_at=self.start))
+        Tag.objects.bulk_create(tags, batch_size=self.batch_size)
+        self.tag_ids = [tag.pk for tag in tags]
+        self.tag_weights = self._zipf_weights(len(self.tag_ids))
+        self.tag_counts = dict.fromkeys(self.tag_ids, 0)
+        self.created['tags'] = len(tags)
+
+    def _create_articles(self, index, size, first_id, comment_id):
+        rng = self.rng
+        using = analytics_db()
+        adapt = connections[using].ops.adapt_datetimefield_value
+        views_now = _naive(self.now, connections[using])
+        articles, tag_links, likes, comments, views = [], [], [], [], []
+        span = (self.now - self.start) / max(self.counts['articles'], 1)
+        for offset in range(size):
+            pk = first_id + offset
+            # Dates croissantes avec les identifiants, comme en production
+            created_at = self.start + span * (index + offset + rng.random())
+            author_id = rng.choices(self.user_ids, cum_weights=self.author_weights)[0]
+            published = rng.random() < PUBLISHED_RATIO
+            likers = rng.sample(self.user_ids, min(self._popularity(self.averages['likes']), len(self.user_ids)))
+            view_count = self._popularity(self.averages['views'])
+            article_tags = set(rng.choices(self.tag_ids, cum_weights=self.tag_weights, k=rng.randint(1, 3)))
+
+            comment_count = self._comments(comments, pk, _naive(created_at, connection), comment_id)
+            comment_id += comment_count
+
+            articles.append(Article(
+                pk=pk, title=f'{self._text(rng.randint(3, 8)).capitalize()} {pk}',
+                content='\n\n'.join(rng.choices(self.paragraphs, k=rng.randint(2, 6))),
+                author_id=author_id, created_at=created_at, updated_at=created_at,
+                status='published' if published else 'draft', is_featured=rng.random() < FEATURED_RATIO,
+                views=view_count, likes_count=len(likers), comments_count=comment_count,
+            ))
+            tag_links += [(pk, tag_id) for tag_id in article_tags]
+            likes += [(pk, user_id) for user_id in likers]
+            # Visiteurs anonymes distincts : une adresse par vue
+            viewed_from = _naive(created_at, connections[using])
+            views += [
+                (pk, f'10.{n >> 16 & 255}.{n >> 8 & 255}.{n & 255}', adapt(self._date_between(viewed_from, views_now)))
+                for n in range(view_count)
+            ]
+            if published:
+                stats = self.stats[author_id]
+                stats[0] += 1
+                stats[1] += len(likers)
+                stats[2] += view_count
+                for tag_id in article_tags:
+                    self.tag_counts[tag_id] += 1
+
+        with transaction.atomic():
+            Article.objects.bulk_create(articles)
+            _insert(Article.tags.through, ('article', 'tag'), tag_links)
+            _insert(Article.likes.through, ('article', 'user'), likes)
+            _insert(Comment, COMMENT_FIELDS, comments)
+        with transaction.atomic(using=using):
+            _insert(ArticleView, ('article', 'ip_address', 'timestamp'), views, using=using)
+        for key, rows in (('articles', articles), ('tags_links', tag_links), ('likes', likes),
+                          ('comments', comments), ('views', views)):
+            self.created[key] += len(rows)
+        return comment_id
+
+    def _comments(self, rows, article_id, article_date, first_id):
+        """Ajoute à `rows` les commentaires d'un article (fils et réponses imbriquées) ; retourne leur nombre.
+
+        `article_date` : date de l'article sans fuseau (voir _naive).
+        """
+        rng = self.rng
+        adapt = connection.ops.adapt_datetimefield_value
+        now = _naive(self.now, connection)
+        count = min(self._popularity(self.averages['comments']), MAX_COMMENTS_PER_ARTICLE)
+        # (id, thread_id, path) des commentaires déjà générés, pour choisir un parent
+        previous = []
+        created_at = article_date
+        for pk in range(first_id, first_id + count):
+            created_at = self._date_between(created_at, min(created_at + timedelta(days=2), now))
+            parent = None
+            if previous and rng.random() < REPLY_RATIO:
+                # Réponse de préférence aux commentaires récents
+                parent = previous[-1 - min(int(rng.expovariate(0.5)), len(previous) - 1)]
+                if parent[2].count('/') > MAX_REPLY_DEPTH:
+                    parent = None
+            parent_id, thread_id, path = parent if parent else (None, pk, '')
+            path = f'{path}{pk:0{Comment.PATH_SEGMENT_WIDTH}d}/'
+            previous.append((pk, thread_id, path))
+            author_id = rng.choice(self.user_ids)
+            date = adapt(created_at)
+            rows.append((pk, article_id, author_id, rng.choice(self.sentences), date, date,
+                         parent_id, False, thread_id, path))
+            self.stats[author_id][3] += 1
+        return count
+
+    def _create_stats(self):
+        with transaction.atomic():
+            AuthorStats.objects.bulk_create([
+                AuthorStats(user_id=pk, article_count=articles, likes_received=likes,
+                            views_received=views, comments_written=comments)
+                for pk, (articles, likes, views, comments) in self.stats.items()
+            ], batch_size=self.batch_size)
+            by_count = {}
+            for tag_id, count in self.tag_counts.items():
+                by_count.setdefault(count, []).append(tag_id)
+            for count, tag_ids in by_count.items():
+                for first in range(0, len(tag_ids), LOOKUP_CHUNK_SIZE):
+                    Tag.objects.filter(pk__in=tag_ids[first:first + LOOKUP_CHUNK_SIZE]).update(published_count=count)
+        # Identifiants attribués ici : séquences à recaler (sans effet sous SQLite)
+        statements = connection.ops.sequence_reset_sql(no_style(), [User, UserProfile, Tag, Article, Comment])
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
@@ -0,0 +1,143 @@
+"""File d'attente durable des déclinaisons d'images, traitée hors requête.
+
+L'enregistrement d'un article ou d'un profil n'exécute aucun travail Pillow :
+schedule() insère une ligne ImageJob (dans la transaction de la requête) et
+la page affiche l'original tant que le manifeste ne correspond pas au
+fichier. La commande process_image_jobs réserve les tâches par lots et les
+exécute dans un pool de processus (un par cœur par défaut).
+
+Une tâche réussie est supprimée ; une tâche en erreur est reprogrammée
+avec un délai croissant puis marquée 'failed' après
+BLOG_IMAGE_JOB_MAX_ATTEMPTS essais. Les tâches 'running' d'un worker
+interrompu sont reprises après BLOG_IMAGE_JOB_TIMEOUT secondes.
+"""
+import logging
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import images
+from .models import Article, ImageJob, UserProfile
+from .sqlite import serialized_write
+
+logger = logging.getLogger(__name__)
+
+# Champs image traités, par modèle
+IMAGE_FIELDS = {
+    Article: ('image',),
+    UserProfile: ('avatar', 'cover_image'),
+}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enqueue(model_name, object_id, field_name, force=False):
+    """Ajoute une tâche en attente (sans doublon) ; retourne la tâche."""
+    try:
+        with transaction.atomic():
+            job, created = ImageJob.objects.get_or_create(
+                model=model_name, object_id=object_id, field=field_name, status='pending',
+                defaults={'force': force},
+            )
+    except IntegrityError:
+        # Tâche identique créée en parallèle
+        job = ImageJob.objects.get(model=model_name, object_id=object_id, field=field_name, status='pending')
+        created = False
+    if force and not created and not job.force:
+        ImageJob.objects.filter(pk=job.pk).update(force=True)
+    return job
+
+
+def schedule(instance, field_name, force=False):
+    """Programme les déclinaisons de `instance.<field_name>` si le fichier a changé."""
+    if not force and images.is_current(instance, field_name):
+        return
+    # Image retirée : seule la suppression des déclinaisons reste, immédiate
+    if not getattr(instance, field_name) or not _setting('BLOG_IMAGE_QUEUE_ENABLED', True):
+        images.refresh_variants(instance, field_name, force=force)
+        return
+    enqueue(instance._meta.model_name, instance.pk, field_name, force=force)
+
+
+@serialized_write
+def claim(limit):
+    """Réserve jusqu'à `limit` tâches disponibles pour ce worker ; retourne leurs ids."""
+    token = uuid.uuid4().hex
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            ImageJob.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', available_at__lte=now)
+            .order_by('available_at', 'pk')
+            .values_list('pk', flat=True)[:limit]
+        )
+        ImageJob.objects.filter(pk__in=ids, status='pending').update(
+            status='running', locked_by=token, locked_at=now
+        )
+    # Seules les tâches effectivement passées à 'running' avec notre jeton
+    return list(ImageJob.objects.filter(locked_by=token, status='running').values_list('pk', flat=True))
+
+
+def _requeue(job, **fields):
+    """Repasse `job` en attente ; supprimée si une tâche identique attend déjà."""
+    try:
+        with transaction.atomic():
+            ImageJob.objects.filter(pk=job.pk).update(status='pending', locked_by='', locked_at=None, **fields)
+    except IntegrityError:
+        ImageJob.objects.filter(pk=job.pk).delete()
+
+
+def reclaim_stale():
+    """Remet en attente les tâches d'un worker interrompu ; retourne leur nombre."""
+    limit = timezone.now() - timedelta(seconds=_setting('BLOG_IMAGE_JOB_TIMEOUT', 600))
+    stale = list(ImageJob.objects.filter(status='running', locked_at__lt=limit))
+    for job in stale:
+        _requeue(job)
+    return len(stale)
+
+
+def run_job(job_id):
+    """Exécute une tâche réservée (dans un processus du pool) ; True si elle a abouti."""
+    job = ImageJob.objects.filter(pk=job_id, status='running').first()
+    if job is None:
+        return False
+    try:
+        instance = apps.get_model('blog', job.model).objects.filter(pk=job.object_id).first()
+        # Objet supprimé entre-temps : rien à faire
+        if instance is not None:
+            images.refresh_variants(instance, job.field, force=job.force)
+    except Exception:
+        logger.exception("Échec de la tâche d'image %s", job)
+        attempts = job.attempts + 1
+        error = traceback.format_exc()
+        if attempts >= _setting('BLOG_IMAGE_JOB_MAX_ATTEMPTS', 3):
+            ImageJob.objects.filter(pk=job.pk).update(status='failed', attempts=attempts, error=error)
+        else:
+            delay = timedelta(seconds=30 * 2 ** attempts)
+            _requeue(job, attempts=attempts, error=error, available_at=timezone.now() + delay)
+        return False
+    job.delete()
+    return True
+
+
+def backfill(force=False):
+    """Programme les déclinaisons de toutes les images existantes ; retourne le nombre de tâches."""
+    jobs = []
+    for model, field_names in IMAGE_FIELDS.items():
+        for field_name in field_names:
+            objects = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+            for instance in objects.only('pk', field_name, images.manifest_field(field_name)).iterator():
+                if force or not images.is_current(instance, field_name):
+                    jobs.append(ImageJob(
+                        model=model._meta.model_name, object_id=instance.pk, field=field_name, force=force
+                    ))
+    # Les images déjà en attente sont ignorées (contrainte imagejob_unique_pending)
+    ImageJob.objects.bulk_create(jobs, batch_size=500, ignore_conflicts=True)
+    return len(jobs)
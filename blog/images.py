@@ -0,0 +1,222 @@
+"""Déclinaisons des images envoyées (miniatures AVIF / WebP) avec Pillow.
+
+Pour chaque image (Article.image, UserProfile.avatar, UserProfile.cover_image)
+on produit quelques largeurs fixes dans les formats modernes, sans
+métadonnées EXIF (l'orientation est appliquée aux pixels). L'original est
+lui aussi réécrit sans EXIF (position GPS, appareil...).
+
+Le résultat est un manifeste JSON enregistré dans le champ `<champ>_variants`
+du modèle :
+
+    {"source": "blog_images/photo.jpg", "width": 1600, "height": 1067,
+     "variants": {"avif": [[400, 267, "variants/blog_images/photo/400.avif"], ...],
+                  "webp": [...]}}
+
+`source` permet de savoir si le manifeste correspond encore au fichier du
+champ ; les gabarits (blog_images) retombent sur l'original sinon.
+
+Avec le stockage par contenu (blog.storage), l'original réécrit est un
+nouveau fichier : le champ est repointé dessus et les déclinaisons, nommées
+d'après l'empreinte, appartiennent au fichier source (blog.media les
+supprime avec lui).
+"""
+import io
+import logging
+import posixpath
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps, features
+
+from . import pagecache
+from .storage import is_content_addressed
+
+logger = logging.getLogger(__name__)
+
+# Largeurs produites par type d'image ; les avatars sont recadrés au carré
+RENDITIONS = {
+    'article': {'widths': (400, 800, 1200), 'square': False},
+    'avatar': {'widths': (48, 96, 192), 'square': True},
+    'cover': {'widths': (800, 1600), 'square': False},
+}
+
+
+def _encoder_available(module):
+    # AVIF n'existe qu'à partir de Pillow 11.2 ; WebP dépend de libwebp
+    return module in features.modules and features.check_module(module)
+
+
+# (champ de manifeste, format Pillow, options d'encodage), du plus au moins
+# compact ; seuls les formats que ce Pillow sait écrire sont produits
+FORMATS = tuple(
+    entry for entry in (
+        ('avif', 'AVIF', {'quality': 50}),
+        ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    )
+    if _encoder_available(entry[0])
+)
+
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp'}
+
+# "<modèle>.<champ>" -> type de déclinaison
+FIELD_RENDITIONS = {
+    'article.image': 'article',
+    'userprofile.avatar': 'avatar',
+    'userprofile.cover_image': 'cover',
+}
+
+VARIANTS_DIR = 'variants'
+
+
+def rendition_for(instance, field_name):
+    return FIELD_RENDITIONS[f'{instance._meta.model_name}.{field_name}']
+
+
+def manifest_field(field_name):
+    return f'{field_name}_variants'
+
+
+def variant_name(source_name, width, extension):
+    stem, _ = posixpath.splitext(source_name)
+    return f'{VARIANTS_DIR}/{stem}/{width}.{extension}'
+
+
+def _open(storage, name):
+    with storage.open(name, 'rb') as f:
+        image = Image.open(f)
+        image.load()
+    return image
+
+
+def _strip_original(storage, name, image):
+    """Réécrit l'original sans EXIF, orientation appliquée.
+
+    Retourne l'image redressée et le nom de l'original réécrit (nouveau nom
+    avec un stockage par contenu ; l'ancien fichier est peut-être partagé).
+    """
+    upright = ImageOps.exif_transpose(image)
+    if not image.getexif() or image.format not in ('JPEG', 'PNG', 'WEBP'):
+        return upright, name
+    buffer = io.BytesIO()
+    options = {'quality': 90} if image.format in ('JPEG', 'WEBP') else {}
+    upright.save(buffer, image.format, **options)
+    if not getattr(storage, 'content_addressed', False):
+        storage.delete(name)
+    return upright, storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def _encode(image, image_format, options):
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def build_variants(fieldfile, rendition):
+    """Génère les déclinaisons du fichier `fieldfile` ; retourne le manifeste."""
+    storage = fieldfile.storage
+    config = RENDITIONS[rendition]
+    image, source = _strip_original(storage, fieldfile.name, _open(storage, fieldfile.name))
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+
+    # Pas d'agrandissement : les largeurs supérieures à l'original sont
+    # remplacées par la largeur d'origine (au plus une fois)
+    widths = sorted({min(width, image.width) for width in config['widths']})
+    variants = {extension: [] for extension, _, _ in FORMATS}
+    for width in widths:
+        if config['square']:
+            side = min(width, image.width, image.height)
+            resized = ImageOps.fit(image, (side, side), Image.LANCZOS)
+        else:
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.LANCZOS)
+        for extension, image_format, options in FORMATS:
+            name = variant_name(source, width, extension)
+            if storage.exists(name):
+                storage.delete(name)
+            storage.save(name, ContentFile(_encode(resized, image_format, options)))
+            variants[extension].append([resized.width, resized.height, name])
+
+    return {
+        'source': source,
+        'width': image.width,
+        'height': image.height,
+        'variants': variants,
+    }
+
+
+def delete_variants(storage, manifest):
+    # Déclinaisons d'un fichier stocké par contenu : partagées, supprimées avec lui
+    if is_content_addressed((manifest or {}).get('source', '')):
+        return
+    for entries in (manifest or {}).get('variants', {}).values():
+        for _, _, name in entries:
+            storage.delete(name)
+
+
+def _invalidate_pages(instance):
+    if instance._meta.model_name == 'article':
+        pagecache.invalidate(f'article:{instance.pk}')
+    else:
+        pagecache.invalidate(f'profile:{instance.user_id}')
+
+
+def is_current(instance, field_name):
+    """True si le manifeste de `instance.<field_name>` correspond au fichier du champ."""
+    fieldfile = getattr(instance, field_name)
+    current = getattr(instance, manifest_field(field_name)) or {}
+    if not fieldfile:
+        return not current
+    return current.get('source') == fieldfile.name
+
+
+def refresh_variants(instance, field_name, force=False):
+    """Met les déclinaisons de `instance.<field_name>` en accord avec le fichier du champ.
+
+    Ne fait rien si le manifeste correspond déjà au fichier (sauf `force`).
+    Les anciennes déclinaisons sont supprimées ; le manifeste (et le nom de
+    l'original s'il a été réécrit) est écrit par un UPDATE, sans déclencher
+    de nouveau post_save.
+    """
+    # Import local : blog.media importe ce module
+    from . import media
+
+    fieldfile = getattr(instance, field_name)
+    attribute = manifest_field(field_name)
+    current = getattr(instance, attribute) or {}
+    source = fieldfile.name if fieldfile else None
+    if not force and is_current(instance, field_name):
+        return current
+
+    manifest = {}
+    if source:
+        try:
+            manifest = build_variants(fieldfile, rendition_for(instance, field_name))
+        except (OSError, ValueError, KeyError):
+            # Fichier absent ou illisible, format non pris en charge : les gabarits affichent l'original
+            logger.exception('Déclinaisons impossibles pour %s', source)
+            manifest = {}
+    delete_variants(fieldfile.storage, {
+        'variants': {
+            extension: [entry for entry in entries if entry not in manifest.get('variants', {}).get(extension, [])]
+            for extension, entries in current.get('variants', {}).items()
+        }
+    })
+    fields = {attribute: manifest}
+    if manifest and manifest['source'] != source:
+        # Original réécrit sans EXIF sous un autre nom
+        fields[field_name] = manifest['source']
+    objects = type(instance).objects.filter(pk=instance.pk)
+    with transaction.atomic():
+        if field_name in fields:
+            # Sauf si le champ a changé entre-temps (une autre tâche suivra)
+            if not objects.filter(**{field_name: source}).update(**fields):
+                return current
+            media.replace(source, manifest['source'])
+            fieldfile.name = manifest['source']
+            media.remember(instance)
+        else:
+            objects.update(**fields)
+    setattr(instance, attribute, manifest)
+    _invalidate_pages(instance)
+    return manifest
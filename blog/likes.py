@@ -0,0 +1,58 @@
+"""Likes des articles : bascule atomique et lecture groupée des likes d'un utilisateur.
+
+toggle_like() décide de l'état par le résultat du DELETE sur la table de
+liaison (1 ligne supprimée = le like existait) : pas de lecture préalable
+qui pourrait se croiser avec un double clic. Les compteurs sont ajustés
+par incrément dans la même transaction, et les pages en cache qui
+affichent l'article sont invalidées.
+
+liked_article_ids() répond à « lesquels de ces articles l'utilisateur
+a-t-il aimés ? » en une requête sur l'index (article, user) de la table de
+liaison, sans charger la liste des utilisateurs qui ont aimé un article.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from . import pagecache
+from .models import Article, AuthorStats
+from .sqlite import serialized_write
+
+Like = Article.likes.through
+
+
+@serialized_write
+def toggle_like(article, user):
+    """Ajoute ou retire le like de `user` sur `article` ; retourne (liked, likes_count)."""
+    with transaction.atomic():
+        deleted, _ = Like.objects.filter(article_id=article.pk, user_id=user.pk).delete()
+        if deleted:
+            liked, delta = False, -1
+        else:
+            liked, delta = True, 1
+            try:
+                with transaction.atomic():
+                    Like.objects.create(article_id=article.pk, user_id=user.pk)
+            except IntegrityError:
+                # Like concurrent déjà enregistré : rien à compter
+                delta = 0
+        if delta:
+            Article.objects.filter(pk=article.pk).update(likes_count=F('likes_count') + delta)
+            pagecache.invalidate(f'article:{article.pk}', f'likes:{user.pk}')
+            if article.status == 'published':
+                AuthorStats.objects.filter(pk=article.author_id).update(
+                    likes_received=F('likes_received') + delta
+                )
+        likes_count = Article.objects.filter(pk=article.pk).values_list('likes_count', flat=True).get()
+    return liked, likes_count
+
+
+def liked_article_ids(user, article_ids):
+    """Le sous-ensemble de `article_ids` aimé par `user` (ensemble vide pour un anonyme)."""
+    if not user.is_authenticated:
+        return set()
+    article_ids = {pk for pk in article_ids if pk is not None}
+    if not article_ids:
+        return set()
+    return set(
+        Like.objects.filter(user_id=user.pk, article_id__in=article_ids).values_list('article_id', flat=True)
+    )
@@ -0,0 +1,223 @@
+"""Test de charge des vues du blog : débit, latences et requêtes SQL par vue.
+
+`manage.py benchmark_views` crée des bases de test temporaires (les bases
+réelles et leur cache ne sont pas touchés), y génère un jeu de données
+(blog.datagen), puis lance `concurrency` clients en parallèle pendant
+`seconds` secondes. Chaque client est un django.test.Client dans son propre
+thread, comme un serveur WSGI multi-thread : tout le chemin Django est
+mesuré (middlewares, compression, cache de pages), sans le réseau.
+
+Le mélange de requêtes (MIX) reprend la navigation du site : liste
+d'articles avec toutes les combinaisons tri / tag / recherche / page, page
+d'article (popularité en loi de puissance), autocomplétion, et pour les
+clients connectés likes et commentaires. Les résultats sont regroupés par
+nom d'URL (suffixe « POST » pour les envois de formulaire).
+
+Une ligne de base (JSON) enregistrée avec --save-baseline sert de référence
+aux exécutions suivantes : un p95 ou un nombre moyen de requêtes SQL
+supérieur de plus de `threshold` à la référence est une régression.
+"""
+import json
+import random
+import statistics
+import threading
+import time
+from collections import defaultdict
+
+from django.contrib.auth.models import User
+from django.db import close_old_connections, connections
+from django.test import Client
+
+from .datagen import WORDS
+from .models import Article, Tag
+from .querybudget import QueryRecorder
+
+SORTS = (None, '-created_at', '-views', '-likes', 'title')
+
+# Nombre minimal de mesures pour comparer des percentiles à la référence
+MIN_SAMPLES = 20
+
+
+def _sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+class Context:
+    """Identifiants tirés au sort par les scénarios, lus une fois avant la mesure."""
+
+    def __init__(self):
+        self.article_ids = list(
+            Article.objects.filter(status='published').order_by('-views', '-pk').values_list('pk', flat=True)
+        )
+        self.tag_slugs = list(Tag.objects.values_list('slug', flat=True))
+        self.usernames = list(User.objects.order_by('pk').values_list('username', flat=True))
+
+    def popular_article(self, rng):
+        # Loi de puissance : les premiers articles reçoivent l'essentiel des visites
+        index = min(int(rng.paretovariate(1.1)) - 1, len(self.article_ids) - 1)
+        return self.article_ids[index]
+
+
+def _article_list(rng, context):
+    params = {}
+    sort = rng.choice(SORTS)
+    if sort:
+        params['sort'] = sort
+    if context.tag_slugs and rng.random() < 0.3:
+        params['tag'] = rng.choice(context.tag_slugs)
+    if rng.random() < 0.2:
+        params['search'] = rng.choice(WORDS)
+    if rng.random() < 0.4:
+        params['page'] = rng.randint(2, 5)
+    return 'get', '/', params
+
+
+def _article_detail(rng, context):
+    return 'get', f'/article/{context.popular_article(rng)}/', {}
+
+
+def _autocomplete(rng, context):
+    word = rng.choice(WORDS)
+    return 'get', '/search/autocomplete/', {'q': word[:rng.randint(2, len(word))]}
+
+
+def _like(rng, context):
+    return 'post', f'/article/{context.popular_article(rng)}/like/', {}
+
+
+def _comment(rng, context):
+    return 'post', f'/article/{context.popular_article(rng)}/', {'body': _sentence(rng, 12)}
+
+
+# (poids, scénario, réservé aux clients connectés)
+MIX = (
+    (40, _article_list, False),
+    (35, _article_detail, False),
+    (15, _autocomplete, False),
+    (7, _like, True),
+    (3, _comment, True),
+)
+
+
+class Result:
+    def __init__(self):
+        self.latencies = []
+        self.queries = []
+        self.errors = 0
+
+    def summary(self, seconds):
+        latencies = sorted(self.latencies)
+        if len(latencies) > 1:
+            cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+            p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+        else:
+            p50 = p95 = p99 = latencies[0] if latencies else 0
+        return {
+            'requests': len(latencies),
+            'throughput': len(latencies) / seconds,
+            'p50': p50 * 1000,
+            'p95': p95 * 1000,
+            'p99': p99 * 1000,
+            'queries': statistics.fmean(self.queries) if self.queries else 0,
+            'max_queries': max(self.queries, default=0),
+            'errors': self.errors,
+        }
+
+
+def _worker(context, seconds, seed, authenticated, results, lock, start):
+    rng = random.Random(seed)
+    mix = [(weight, scenario) for weight, scenario, needs_login in MIX if authenticated or not needs_login]
+    weights = [weight for weight, _ in mix]
+    scenarios = [scenario for _, scenario in mix]
+    client = Client(raise_request_exception=False, HTTP_ACCEPT_ENCODING='gzip, br',
+                    REMOTE_ADDR=f'10.{seed // 250 % 256}.{seed % 250}.1')
+    local = defaultdict(Result)
+    try:
+        try:
+            if authenticated:
+                client.force_login(User.objects.get(username=rng.choice(context.usernames)))
+        except Exception:
+            start.abort()
+            raise
+        start.wait()
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            method, url, data = rng.choices(scenarios, weights)[0](rng, context)
+            recorder = QueryRecorder()
+            began = time.perf_counter()
+            with recorder.record():
+                response = getattr(client, method)(url, data)
+            elapsed = time.perf_counter() - began
+            match = response.resolver_match
+            name = match.url_name if match else url
+            if method == 'post' and name != 'like_article':
+                name += ' POST'
+            result = local[name]
+            result.latencies.append(elapsed)
+            result.queries.append(len(recorder))
+            if response.status_code >= 500:
+                result.errors += 1
+    finally:
+        connections.close_all()
+        with lock:
+            for name, result in local.items():
+                results[name].latencies += result.latencies
+                results[name].queries += result.queries
+                results[name].errors += result.errors
+
+
+def run(concurrency=4, seconds=10.0, seed=0, authenticated_ratio=0.3):
+    """Lance le mélange MIX ; retourne {nom d'URL: résumé} (latences en ms)."""
+    close_old_connections()
+    context = Context()
+    # Index d'autocomplétion et caches de processus construits avant la mesure
+    warmup = Client(raise_request_exception=False)
+    for url in ('/', f'/article/{context.article_ids[0]}/', '/search/autocomplete/?q=de'):
+        warmup.get(url)
+    results = defaultdict(Result)
+    lock = threading.Lock()
+    start = threading.Barrier(concurrency + 1)
+    threads = [
+        threading.Thread(target=_worker, args=(
+            context, seconds, seed * 1000 + index, index < round(concurrency * authenticated_ratio),
+            results, lock, start,
+        ))
+        for index in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    began = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - began
+    return {name: results[name].summary(elapsed) for name in sorted(results)}
+
+
+def load_baseline(path):
+    try:
+        with open(path, encoding='utf-8') as baseline:
+            return json.load(baseline)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(path, summaries, options):
+    with open(path, 'w', encoding='utf-8') as baseline:
+        json.dump({'options': options, 'results': summaries}, baseline, indent=2, sort_keys=True)
+
+
+def regressions(summaries, baseline, threshold):
+    """Écarts au-delà de `threshold` (0.2 = +20 %) sur le p95 et les requêtes SQL par requête."""
+    found = []
+    for name, summary in summaries.items():
+        reference = baseline['results'].get(name)
+        if reference is None:
+            continue
+        if summary['queries'] > reference['queries'] * (1 + threshold) + 0.5:
+            found.append(f"{name} : {summary['queries']:.1f} requêtes SQL (référence {reference['queries']:.1f})")
+        if min(summary['requests'], reference['requests']) < MIN_SAMPLES:
+            continue
+        if summary['p95'] > reference['p95'] * (1 + threshold):
+            found.append(f"{name} : p95 {summary['p95']:.1f} ms (référence {reference['p95']:.1f} ms)")
+    return found
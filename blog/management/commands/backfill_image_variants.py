@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from blog.imagequeue import backfill
+
+
+class Command(BaseCommand):
+    help = "Programme les déclinaisons des images existantes (articles, avatars, couvertures)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help="Régénérer aussi les images dont les déclinaisons sont à jour")
+
+    def handle(self, *args, **options):
+        queued = backfill(force=options['force'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{queued} images programmées ; lancer process_image_jobs pour les traiter'
+        ))
@@ -0,0 +1,103 @@
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from blog.sqlite import DEFAULT_PRAGMAS, apply_pragmas
+
+SCHEMA = """
+CREATE TABLE article (id INTEGER PRIMARY KEY, title TEXT, content TEXT, views INTEGER NOT NULL DEFAULT 0);
+CREATE TABLE article_view (id INTEGER PRIMARY KEY, article_id INTEGER NOT NULL, ip TEXT NOT NULL);
+CREATE INDEX article_view_article ON article_view (article_id);
+"""
+
+
+def _connect(path, pragmas):
+    # isolation_level=None : transactions explicites, comme Django en autocommit
+    connection = sqlite3.connect(path, timeout=5, isolation_level=None)
+    apply_pragmas(connection.cursor(), pragmas)
+    return connection
+
+
+def _worker(role, path, pragmas, seconds, seed):
+    """Boucle de lectures ou d'écritures pendant `seconds` ; retourne (opérations, verrous rencontrés)."""
+    random.seed(seed)
+    connection = _connect(path, pragmas)
+    count = connection.execute('SELECT count(*) FROM article').fetchone()[0]
+    operations = locked = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        article_id = random.randint(1, count)
+        try:
+            if role == 'read':
+                # Page d'article : l'article et son nombre de vues enregistrées
+                connection.execute('SELECT id, title, content, views FROM article WHERE id = ?', (article_id,)).fetchone()
+                connection.execute('SELECT count(*) FROM article_view WHERE article_id = ?', (article_id,)).fetchone()
+            else:
+                # Vidage de vues : lecture puis écriture dans la même transaction
+                connection.execute('BEGIN')
+                connection.execute('SELECT views FROM article WHERE id = ?', (article_id,)).fetchone()
+                connection.execute('INSERT INTO article_view (article_id, ip) VALUES (?, ?)',
+                                   (article_id, f'10.0.{random.randint(0, 255)}.{random.randint(0, 255)}'))
+                connection.execute('UPDATE article SET views = views + 1 WHERE id = ?', (article_id,))
+                connection.execute('COMMIT')
+            operations += 1
+        except sqlite3.OperationalError as exc:
+            if 'locked' not in str(exc):
+                raise
+            locked += 1
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+            time.sleep(random.uniform(0.001, 0.01))
+    connection.close()
+    return role, operations, locked
+
+
+class Command(BaseCommand):
+    help = "Débit de lectures / écritures concurrentes sur SQLite, sans puis avec le profil BLOG_SQLITE_PRAGMAS"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4, help='Processus lecteurs')
+        parser.add_argument('--writers', type=int, default=2, help='Processus écrivains')
+        parser.add_argument('--seconds', type=float, default=5.0, help='Durée de chaque mesure')
+        parser.add_argument('--articles', type=int, default=2000, help="Taille de la table d'articles")
+
+    def handle(self, *args, **options):
+        profiles = (
+            ('SQLite par défaut', {}),
+            ('Profil BLOG_SQLITE_PRAGMAS', getattr(settings, 'BLOG_SQLITE_PRAGMAS', DEFAULT_PRAGMAS)),
+        )
+        self.stdout.write(f"{'Profil':<28} {'Lectures/s':>11} {'Écritures/s':>12} {'Verrous':>8}")
+        for label, pragmas in profiles:
+            reads, writes, locked = self._measure(pragmas, options)
+            self.stdout.write(f'{label:<28} {reads:>11.0f} {writes:>12.0f} {locked:>8}')
+
+    def _measure(self, pragmas, options):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'benchmark.sqlite3')
+            connection = _connect(path, pragmas)
+            connection.executescript(SCHEMA)
+            connection.execute('BEGIN')
+            connection.executemany(
+                'INSERT INTO article (title, content) VALUES (?, ?)',
+                ((f'Article {i}', 'Lorem ipsum ' * 200) for i in range(options['articles'])),
+            )
+            connection.execute('COMMIT')
+            connection.close()
+
+            roles = ['read'] * options['readers'] + ['write'] * options['writers']
+            context = multiprocessing.get_context('spawn')
+            with context.Pool(len(roles)) as pool:
+                results = pool.starmap(_worker, [
+                    (role, path, pragmas, options['seconds'], seed) for seed, role in enumerate(roles)
+                ])
+
+        seconds = options['seconds']
+        reads = sum(ops for role, ops, _ in results if role == 'read') / seconds
+        writes = sum(ops for role, ops, _ in results if role == 'write') / seconds
+        return reads, writes, sum(locked for _, _, locked in results)
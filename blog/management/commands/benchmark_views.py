@@ -0,0 +1,101 @@
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import override_settings, setup_databases, teardown_databases
+
+from blog import loadtest
+from blog.datagen import Generator
+from blog.viewcounter import view_buffer
+
+
+class Command(BaseCommand):
+    help = ("Test de charge des vues (liste, article, likes, commentaires, autocomplétion) sur des bases "
+            "temporaires : débit, p50 / p95 / p99 et requêtes SQL par nom d'URL, comparés à une référence")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--articles', type=int, default=10000, help='Articles du jeu de données')
+        parser.add_argument('--users', type=int, default=1000, help='Utilisateurs du jeu de données')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--concurrency', type=int, default=4, help='Clients simultanés')
+        parser.add_argument('--seconds', type=float, default=10.0, help='Durée de la mesure')
+        parser.add_argument('--authenticated-ratio', type=float, default=0.3,
+                            help='Part des clients connectés (likes et commentaires)')
+        parser.add_argument('--baseline', default=os.path.join(settings.BASE_DIR, 'benchmarks', 'views.json'),
+                            help='Fichier JSON de référence')
+        parser.add_argument('--save-baseline', action='store_true', help='Enregistrer cette mesure comme référence')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Dégradation tolérée par rapport à la référence (0.2 = 20 %%)')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            summaries = self._measure(directory, options)
+
+        self.stdout.write(f"{'Vue':<22} {'Requêtes':>9} {'Req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+                          f"{'p99 ms':>8} {'SQL moy':>8} {'SQL max':>8} {'Erreurs':>8}")
+        for name, summary in summaries.items():
+            self.stdout.write(
+                f"{name:<22} {summary['requests']:>9} {summary['throughput']:>8.1f} {summary['p50']:>8.1f} "
+                f"{summary['p95']:>8.1f} {summary['p99']:>8.1f} {summary['queries']:>8.1f} "
+                f"{summary['max_queries']:>8} {summary['errors']:>8}"
+            )
+        throughput = sum(summary['throughput'] for summary in summaries.values())
+        self.stdout.write(self.style.SUCCESS(f'Débit total : {throughput:.1f} requêtes/s '
+                                             f"({options['concurrency']} clients)"))
+
+        run_options = {key: options[key] for key in ('articles', 'users', 'seed', 'concurrency', 'authenticated_ratio')}
+        baseline = loadtest.load_baseline(options['baseline'])
+        if options['save_baseline']:
+            os.makedirs(os.path.dirname(os.path.abspath(options['baseline'])), exist_ok=True)
+            loadtest.save_baseline(options['baseline'], summaries, run_options)
+            self.stdout.write(f"Référence enregistrée dans {options['baseline']}")
+        elif baseline is None:
+            # Sans référence, aucune régression ne serait jamais détectée
+            raise CommandError(f"Pas de référence {options['baseline']} : relancer avec --save-baseline "
+                               "(paramètres par défaut) pour en créer une")
+        else:
+            if baseline['options'] != run_options:
+                self.stdout.write(self.style.WARNING(f"Référence mesurée avec d'autres paramètres : {baseline['options']}"))
+            found = loadtest.regressions(summaries, baseline, options['threshold'])
+            if found:
+                raise CommandError('Régressions par rapport à la référence :\n' + '\n'.join(found))
+            self.stdout.write(self.style.SUCCESS(f"Pas de régression au-delà de {options['threshold']:.0%}"))
+
+        errors = sum(summary['errors'] for summary in summaries.values())
+        if errors:
+            raise CommandError(f'{errors} réponses en erreur (5xx)')
+
+    def _measure(self, directory, options):
+        # Bases SQLite de test dans un fichier : partagées par les threads clients
+        for alias in connections:
+            if connections[alias].vendor == 'sqlite':
+                connections[alias].settings_dict['TEST']['NAME'] = os.path.join(directory, f'{alias}.sqlite3')
+        isolated = override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': os.path.join(directory, 'cache'),
+            }},
+            MEDIA_ROOT=os.path.join(directory, 'media'),
+            # Les requêtes sont comptées ici, par vue
+            BLOG_QUERY_BUDGET_MODE='off',
+        )
+        with isolated:
+            old_config = setup_databases(verbosity=0, interactive=False, aliases=set(connections),
+                                         serialized_aliases=set())
+            try:
+                started = time.perf_counter()
+                Generator(users=options['users'], articles=options['articles'], tags=max(options['articles'] // 100, 10),
+                          seed=options['seed']).run()
+                self.stdout.write(f"Jeu de données : {options['articles']} articles, {options['users']} utilisateurs "
+                                  f'({time.perf_counter() - started:.1f} s)')
+                return loadtest.run(
+                    concurrency=options['concurrency'], seconds=options['seconds'],
+                    seed=options['seed'], authenticated_ratio=options['authenticated_ratio'],
+                )
+            finally:
+                view_buffer.flush()
+                teardown_databases(old_config, verbosity=0)
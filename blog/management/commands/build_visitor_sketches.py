@@ -0,0 +1,61 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from blog.models import ArticleView, VisitorSketch
+from blog.routers import analytics_db
+from blog.sketches import HyperLogLog
+
+
+class Command(BaseCommand):
+    help = "Convertit les lignes ArticleView en sketches HyperLogLog (VisitorSketch)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--purge', action='store_true',
+                            help="Supprimer les lignes ArticleView une fois converties")
+        parser.add_argument('--keep-days', type=int, default=None,
+                            help="Supprimer les sketches journaliers plus anciens que N jours")
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        sketches = {}
+        rows = (
+            ArticleView.objects.order_by('article_id')
+            .values_list('article_id', 'user_id', 'ip_address', 'timestamp')
+            .iterator(chunk_size=options['chunk_size'])
+        )
+        current_article = None
+        converted = 0
+        for article_id, user_id, ip_address, timestamp in rows:
+            if article_id != current_article:
+                # Les lignes sont triées par article : on écrit au fil de l'eau
+                self._save(sketches)
+                sketches = {}
+                current_article = article_id
+            value = f'{user_id}|{ip_address}'
+            for day in (timezone.localdate(timestamp), None):
+                sketches.setdefault((article_id, day), HyperLogLog()).add(value)
+            converted += 1
+        self._save(sketches)
+        self.stdout.write(self.style.SUCCESS(f'{converted} vues converties en sketches'))
+
+        if options['purge']:
+            deleted, _ = ArticleView.objects.all().delete()
+            self.stdout.write(f'{deleted} lignes ArticleView supprimées')
+
+        if options['keep_days'] is not None:
+            limit = timezone.localdate() - timedelta(days=options['keep_days'])
+            deleted, _ = VisitorSketch.objects.filter(day__lt=limit).delete()
+            self.stdout.write(f'{deleted} sketches journaliers supprimés')
+
+    def _save(self, sketches):
+        with transaction.atomic(using=analytics_db()):
+            for (article_id, day), hll in sketches.items():
+                sketch, created = VisitorSketch.objects.select_for_update().get_or_create(
+                    article_id=article_id, day=day, defaults={'registers': hll.to_bytes()}
+                )
+                if not created:
+                    sketch.registers = hll.merge(sketch.sketch).to_bytes()
+                    sketch.save(update_fields=['registers', 'updated_at'])
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from blog import media
+
+
+class Command(BaseCommand):
+    help = "Recompte les références des médias stockés par contenu et supprime les fichiers inutilisés"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Affiche le bilan sans rien modifier')
+
+    def handle(self, *args, **options):
+        corrected, orphans = media.collect(dry_run=options['dry_run'])
+        verb = 'à supprimer' if options['dry_run'] else 'supprimés'
+        self.stdout.write(self.style.SUCCESS(
+            f'{corrected} compteurs corrigés, {orphans} fichiers inutilisés {verb}'
+        ))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog.datagen import LOOKUP_CHUNK_SIZE
+from blog.transfer import export_blog
+
+
+class Command(BaseCommand):
+    help = ("Exporte utilisateurs, tags, articles, commentaires et likes en JSONL (une ligne par enregistrement), "
+            "compressé en gzip si le fichier finit par .gz")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Fichier de sortie (.jsonl ou .jsonl.gz)')
+        parser.add_argument('--gzip', action='store_true', help='Compresser en gzip (ajoute .gz au nom du fichier)')
+        parser.add_argument('--chunk-size', type=int, default=LOOKUP_CHUNK_SIZE, help='Lignes lues par requête')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if options['gzip'] and not path.endswith('.gz'):
+            path += '.gz'
+        started = time.perf_counter()
+        counts = export_blog(path, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts['user']} utilisateurs, {counts['tag']} tags, {counts['article']} articles, "
+            f"{counts['comment']} commentaires, {counts['like']} likes exportés dans {path} "
+            f'en {time.perf_counter() - started:.1f} s'
+        ))
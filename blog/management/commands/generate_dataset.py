@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from blog.datagen import Generator
+
+
+class Command(BaseCommand):
+    help = ("Génère un jeu de données synthétique (utilisateurs, tags, articles, commentaires, likes, vues) "
+            "par insertions groupées ; --scale 1 = 1 000 utilisateurs et 10 000 articles")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0, help="Facteur d'échelle")
+        parser.add_argument('--users', type=int, help='Utilisateurs (par défaut 1 000 × scale)')
+        parser.add_argument('--articles', type=int, help='Articles (par défaut 10 000 × scale)')
+        parser.add_argument('--tags', type=int, help='Tags (par défaut 100 × scale, au moins 10)')
+        parser.add_argument('--likes', type=float, default=5.0, help='Likes par article, en moyenne')
+        parser.add_argument('--comments', type=float, default=3.0, help='Commentaires par article, en moyenne')
+        parser.add_argument('--views', type=float, default=10.0, help='Vues (ArticleView) par article, en moyenne')
+        parser.add_argument('--days', type=int, default=365, help='Période couverte par les dates')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000, help='Articles par transaction')
+        parser.add_argument('--prefix', default='user', help='Préfixe des noms des utilisateurs')
+        parser.add_argument('--password', help='Mot de passe commun des utilisateurs (par défaut inutilisable)')
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive',
+                            help='Ne pas demander de confirmation')
+
+    def handle(self, *args, **options):
+        database = connection.settings_dict['NAME']
+        if options['interactive']:
+            # Les données s'ajoutent à la base configurée, production comprise
+            confirm = input(f"Ajouter un jeu de données synthétique à la base {database} ?\n"
+                            "Tapez 'oui' pour continuer : ")
+            if confirm.strip().lower() != 'oui':
+                raise CommandError('Génération annulée')
+        self.stdout.write(f'Base : {database}')
+
+        scale = options['scale']
+        generator = Generator(
+            users=options['users'] or max(int(1000 * scale), 1),
+            articles=options['articles'] if options['articles'] is not None else int(10000 * scale),
+            tags=options['tags'] or max(int(100 * scale), 10),
+            likes=options['likes'], comments=options['comments'], views=options['views'],
+            days=options['days'], seed=options['seed'], batch_size=options['batch_size'], prefix=options['prefix'],
+            password=options['password'],
+        )
+        started = time.perf_counter()
+
+        def progress(done, total):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'{done}/{total} articles ({done / elapsed:.0f}/s)')
+
+        created = generator.run(progress=progress)
+        self.stdout.write(self.style.SUCCESS(
+            f"{created['users']} utilisateurs, {created['tags']} tags, {created['articles']} articles, "
+            f"{created['comments']} commentaires, {created['likes']} likes, {created['views']} vues "
+            f'en {time.perf_counter() - started:.1f} s'
+        ))
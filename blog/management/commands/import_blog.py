@@ -0,0 +1,54 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.datagen import LOOKUP_CHUNK_SIZE
+from blog.transfer import Importer, TransferError
+
+
+class Command(BaseCommand):
+    help = ("Importe un export JSONL (export_blog) par lots ; un import interrompu reprend "
+            "au dernier lot enregistré dans le fichier de reprise")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Fichier exporté (.jsonl ou .jsonl.gz)')
+        parser.add_argument('--chunk-size', type=int, default=LOOKUP_CHUNK_SIZE, help='Lignes par transaction')
+        parser.add_argument('--checkpoint', help='Fichier de reprise (par défaut <path>.checkpoint)')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignorer le fichier de reprise existant (les enregistrements déjà importés '
+                                 'de cet export sont reconnus, pas dupliqués)')
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options['path']):
+            raise CommandError(f"Fichier introuvable : {options['path']}")
+        importer = Importer(options['path'], chunk_size=options['chunk_size'], checkpoint=options['checkpoint'])
+        if os.path.exists(importer.checkpoint):
+            if options['restart']:
+                os.remove(importer.checkpoint)
+                self.stdout.write('Reprise ignorée : fichier relu depuis le début')
+            else:
+                self.stdout.write(f'Reprise depuis {importer.checkpoint}')
+        started = time.perf_counter()
+
+        def progress(record_type, done, line):
+            self.stdout.write(f'Ligne {line} : {done} {record_type}')
+
+        try:
+            counts, skipped = importer.run(progress=progress if options['verbosity'] > 1 else None)
+        except (TransferError, json.JSONDecodeError) as exc:
+            raise CommandError(exc)
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts['user']} utilisateurs, {counts['tag']} tags, {counts['article']} articles, "
+            f"{counts['comment']} commentaires, {counts['like']} likes importés "
+            f'en {time.perf_counter() - started:.1f} s'
+        ))
+        if importer.existing:
+            self.stdout.write(self.style.WARNING(
+                f'{importer.existing} enregistrements déjà importés par un import précédent de cet export, ignorés'
+            ))
+        if skipped:
+            self.stdout.write(self.style.WARNING(
+                f'{skipped} enregistrements ignorés (utilisateur inconnu, ou article / parent non importé)'
+            ))
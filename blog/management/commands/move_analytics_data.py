@@ -0,0 +1,95 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+
+from blog.models import Article, ArticleView, VisitorSketch
+from blog.routers import analytics_db
+from blog.sketches import HyperLogLog
+
+# Taille des lots pour les requêtes IN (limite de variables SQLite)
+LOOKUP_CHUNK_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = ("Déplace les vues et sketches de visiteurs de la base principale vers la base d'analyse "
+            "et supprime ceux des articles / utilisateurs disparus")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        target = analytics_db()
+        if target != 'default':
+            tables = connections['default'].introspection.table_names()
+            if ArticleView._meta.db_table in tables:
+                moved = self._move_views(target, options['chunk_size'])
+                self.stdout.write(f'{moved} vues déplacées')
+            if VisitorSketch._meta.db_table in tables:
+                moved = self._move_sketches(target, options['chunk_size'])
+                self.stdout.write(f'{moved} sketches déplacés')
+
+        pruned = self._prune()
+        self.stdout.write(self.style.SUCCESS(f'{pruned} lignes orphelines supprimées'))
+
+    def _move_views(self, target, chunk_size):
+        moved = 0
+        source = ArticleView.objects.using('default')
+        while True:
+            with transaction.atomic(using='default'), transaction.atomic(using=target):
+                rows = list(source.order_by('pk')[:chunk_size])
+                if not rows:
+                    return moved
+                # Nouveaux identifiants : ceux de la base d'analyse ont déjà pu servir
+                ArticleView.objects.using(target).bulk_create([
+                    ArticleView(article_id=row.article_id, user_id=row.user_id,
+                                ip_address=row.ip_address, timestamp=row.timestamp)
+                    for row in rows
+                ], ignore_conflicts=True)
+                source.filter(pk__in=[row.pk for row in rows]).delete()
+            moved += len(rows)
+
+    def _move_sketches(self, target, chunk_size):
+        moved = 0
+        source = VisitorSketch.objects.using('default')
+        while True:
+            with transaction.atomic(using='default'), transaction.atomic(using=target):
+                rows = list(source.order_by('pk')[:chunk_size])
+                if not rows:
+                    return moved
+                for row in rows:
+                    sketch = VisitorSketch.objects.using(target).select_for_update().filter(
+                        article_id=row.article_id, day=row.day
+                    ).first()
+                    if sketch is None:
+                        VisitorSketch.objects.using(target).create(
+                            article_id=row.article_id, day=row.day, registers=row.registers
+                        )
+                    else:
+                        # Sketch déjà commencé dans la base d'analyse : union des visiteurs
+                        sketch.registers = HyperLogLog.from_bytes(row.registers).merge(sketch.sketch).to_bytes()
+                        sketch.save(using=target, update_fields=['registers', 'updated_at'])
+                source.filter(pk__in=[row.pk for row in rows]).delete()
+            moved += len(rows)
+
+    def _prune(self):
+        # Vues enregistrées après la suppression d'un article (tampon de vues)
+        article_ids = set(Article.objects.values_list('pk', flat=True))
+        user_ids = set(User.objects.values_list('pk', flat=True))
+        missing_articles = list(
+            set(ArticleView.objects.values_list('article_id', flat=True).distinct())
+            | set(VisitorSketch.objects.values_list('article_id', flat=True).distinct())
+        )
+        missing_articles = [pk for pk in missing_articles if pk not in article_ids]
+        missing_users = [
+            pk for pk in ArticleView.objects.exclude(user_id=None).values_list('user_id', flat=True).distinct()
+            if pk not in user_ids
+        ]
+        pruned = 0
+        for start in range(0, len(missing_articles), LOOKUP_CHUNK_SIZE):
+            chunk = missing_articles[start:start + LOOKUP_CHUNK_SIZE]
+            pruned += ArticleView.objects.filter(article_id__in=chunk).delete()[0]
+            pruned += VisitorSketch.objects.filter(article_id__in=chunk).delete()[0]
+        for start in range(0, len(missing_users), LOOKUP_CHUNK_SIZE):
+            chunk = missing_users[start:start + LOOKUP_CHUNK_SIZE]
+            pruned += ArticleView.objects.filter(user_id__in=chunk).delete()[0]
+        return pruned
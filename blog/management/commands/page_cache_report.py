@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from blog import pagecache
+from blog import views  # noqa: F401  (enregistre les vues mises en cache)
+
+
+class Command(BaseCommand):
+    help = "Taux de succès et latences du cache de pages anonymes, par vue"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Remettre les compteurs à zéro après le rapport")
+
+    def handle(self, *args, **options):
+        if not getattr(settings, 'BLOG_PAGE_CACHE_STATS', False):
+            self.stdout.write(self.style.WARNING('BLOG_PAGE_CACHE_STATS est désactivé : compteurs non mis à jour'))
+        stats = pagecache.stats()
+        self.stdout.write(f"{'Vue':<20} {'Succès':>8} {'Échecs':>8} {'Taux':>7} {'Succès ms':>10} {'Échec ms':>10}")
+        total_hits = total_misses = 0
+        for name, values in stats.items():
+            hits, misses = values['hit'], values['miss']
+            total_hits += hits
+            total_misses += misses
+            rate = hits / (hits + misses) if hits + misses else 0
+            hit_ms = values['hit_us'] / hits / 1000 if hits else 0
+            miss_ms = values['miss_us'] / misses / 1000 if misses else 0
+            self.stdout.write(f'{name:<20} {hits:>8} {misses:>8} {rate:>7.1%} {hit_ms:>10.2f} {miss_ms:>10.2f}')
+
+        requests = total_hits + total_misses
+        rate = total_hits / requests if requests else 0
+        self.stdout.write(self.style.SUCCESS(f'{requests} requêtes anonymes, taux de succès global {rate:.1%}'))
+
+        if options['reset']:
+            pagecache.reset_stats()
+            self.stdout.write('Compteurs remis à zéro')
@@ -0,0 +1,56 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from blog import imagequeue
+
+
+class Command(BaseCommand):
+    help = "Traite la file des déclinaisons d'images dans un pool de processus"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Nombre de processus (par défaut : un par cœur)")
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Tâches réservées à la fois (par défaut : 4 par processus)")
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help="Attente entre deux consultations d'une file vide, en secondes")
+        parser.add_argument('--once', action='store_true',
+                            help="Vider la file puis s'arrêter")
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        batch_size = options['batch_size'] or workers * 4
+        reclaimed = imagequeue.reclaim_stale()
+        if reclaimed:
+            self.stdout.write(f'{reclaimed} tâches abandonnées remises en attente')
+
+        done = failed = 0
+        # 'spawn' : chaque processus ouvre sa propre connexion à la base
+        connections.close_all()
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=django.setup) as pool:
+            try:
+                while True:
+                    job_ids = imagequeue.claim(batch_size)
+                    if not job_ids:
+                        if options['once']:
+                            break
+                        imagequeue.reclaim_stale()
+                        time.sleep(options['poll_interval'])
+                        continue
+                    for succeeded in pool.map(imagequeue.run_job, job_ids):
+                        if succeeded:
+                            done += 1
+                        else:
+                            failed += 1
+                    self.stdout.write(f'{done} images traitées, {failed} en échec')
+            except KeyboardInterrupt:
+                self.stdout.write('Arrêt demandé ; les tâches en cours seront reprises')
+
+        self.stdout.write(self.style.SUCCESS(f'{done} images traitées, {failed} en échec'))
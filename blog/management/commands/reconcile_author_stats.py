@@ -0,0 +1,34 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from blog.counters import refresh_author_stats
+from blog.models import AuthorStats
+
+STAT_FIELDS = ('article_count', 'likes_received', 'views_received', 'comments_written')
+
+
+class Command(BaseCommand):
+    help = "Recalcule les statistiques d'auteur (AuthorStats) depuis les articles et commentaires"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        missing = User.objects.filter(author_stats__isnull=True).values_list('pk', flat=True)
+        created = AuthorStats.objects.bulk_create(
+            [AuthorStats(user_id=pk) for pk in missing], batch_size=500, ignore_conflicts=True
+        )
+
+        chunk_size = options['chunk_size']
+        user_ids = list(AuthorStats.objects.order_by('pk').values_list('pk', flat=True))
+        corrected = 0
+        for start in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[start:start + chunk_size]
+            before = {row[0]: row[1:] for row in AuthorStats.objects.filter(pk__in=chunk).values_list('pk', *STAT_FIELDS)}
+            refresh_author_stats(chunk)
+            after = AuthorStats.objects.filter(pk__in=chunk).values_list('pk', *STAT_FIELDS)
+            corrected += sum(1 for row in after if before.get(row[0]) != row[1:])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(user_ids)} auteurs vérifiés, {corrected} corrigés, {len(created)} créés'
+        ))
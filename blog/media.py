@@ -0,0 +1,188 @@
+"""Comptage des références des fichiers stockés par contenu (blog.storage).
+
+Chaque champ image (Article.image, UserProfile.avatar, UserProfile.cover_image)
+qui désigne un fichier cas/... lui apporte une référence (MediaBlob.ref_count).
+Les signaux (blog.signals) appellent acquire() / release() quand un champ
+change ou qu'un objet est supprimé ; le fichier et ses déclinaisons sont
+effacés après le commit qui fait tomber le compteur à 0, sauf si un envoi
+du même contenu vient de le réutiliser (sa référence n'est pas encore
+validée) : il reste alors sur le disque jusqu'au prochain collect_media.
+
+Les fichiers nommés à l'ancienne (blog_images/...) ne sont pas comptés et
+jamais supprimés automatiquement. `manage.py collect_media` recompte les
+références depuis la base et efface les fichiers orphelins.
+"""
+import posixpath
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .images import VARIANTS_DIR
+from .models import Article, MediaBlob, UserProfile
+from .storage import CAS_DIR, is_content_addressed
+
+# Un fichier sans ligne MediaBlob plus récent que ce délai peut appartenir
+# à un envoi dont la transaction n'est pas encore validée
+ORPHAN_GRACE = timedelta(hours=1)
+# Un fichier écrit ou réutilisé depuis moins de ce délai n'est pas supprimé
+REUSE_GRACE = timedelta(minutes=5)
+
+# Champs fichier dont les références sont comptées, par modèle
+FILE_FIELDS = {
+    Article: ('image',),
+    UserProfile: ('avatar', 'cover_image'),
+}
+
+
+def file_names(instance):
+    """{champ: nom du fichier} des champs comptés et chargés de `instance`.
+
+    Les champs différés (only() / defer()) sont ignorés plutôt que chargés.
+    """
+    names = {}
+    for field_name in FILE_FIELDS.get(type(instance), ()):
+        if field_name in instance.__dict__:
+            value = instance.__dict__[field_name]
+            names[field_name] = getattr(value, 'name', value) or ''
+    return names
+
+
+def remember(instance):
+    """Mémorise les noms enregistrés en base, comparés au prochain save()."""
+    instance._stored_file_names = file_names(instance)
+
+
+def instance_saved(instance, created):
+    """Transfère les références des champs de `instance` qui ont changé."""
+    previous = {} if created else getattr(instance, '_stored_file_names', {})
+    current = file_names(instance)
+    for field_name, name in current.items():
+        if created:
+            acquire(name)
+        elif field_name in previous:
+            replace(previous[field_name], name)
+    instance._stored_file_names = current
+
+
+def instance_deleted(instance):
+    names = {**file_names(instance), **getattr(instance, '_stored_file_names', {})}
+    for name in names.values():
+        release(name)
+
+
+def acquire(name):
+    """Ajoute une référence au fichier `name` (sans effet hors cas/...)."""
+    if not is_content_addressed(name):
+        return
+    if MediaBlob.objects.filter(name=name).update(ref_count=F('ref_count') + 1):
+        return
+    try:
+        with transaction.atomic():
+            MediaBlob.objects.create(name=name, ref_count=1, size=_size(name))
+    except IntegrityError:
+        # Créé en parallèle par un autre envoi du même contenu
+        MediaBlob.objects.filter(name=name).update(ref_count=F('ref_count') + 1)
+
+
+def release(name):
+    """Retire une référence ; le fichier est supprimé après le commit s'il n'en a plus."""
+    if not is_content_addressed(name):
+        return
+    MediaBlob.objects.filter(name=name, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+    transaction.on_commit(lambda: delete_if_unused(name))
+
+
+def replace(old_name, new_name):
+    """Un champ passe de `old_name` à `new_name`."""
+    if old_name == new_name:
+        return
+    acquire(new_name)
+    release(old_name)
+
+
+def delete_if_unused(name):
+    """Supprime le fichier `name` et ses déclinaisons s'il n'a plus de référence."""
+    deleted, _ = MediaBlob.objects.filter(name=name, ref_count=0).delete()
+    if deleted:
+        delete_files(name)
+    return bool(deleted)
+
+
+def delete_files(name):
+    if not getattr(default_storage, 'content_addressed', False):
+        default_storage.delete(name)
+    elif not default_storage.delete_if_stale(name, REUSE_GRACE.total_seconds()):
+        # Réutilisé par un envoi en cours : gardé, avec ses déclinaisons
+        return
+    # Déclinaisons de ce fichier (blog.images.variant_name)
+    directory = f'{VARIANTS_DIR}/{posixpath.splitext(name)[0]}'
+    try:
+        _, files = default_storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for file_name in files:
+        default_storage.delete(f'{directory}/{file_name}')
+
+
+def _size(name):
+    try:
+        return default_storage.size(name)
+    except OSError:
+        return 0
+
+
+def count_references():
+    """{nom: nombre de champs qui le désignent} calculé depuis la base."""
+    counts = {}
+    for model, field_names in FILE_FIELDS.items():
+        for field_name in field_names:
+            names = model.objects.filter(**{f'{field_name}__startswith': f'{CAS_DIR}/'}).values_list(field_name, flat=True)
+            for name in names.iterator():
+                counts[name] = counts.get(name, 0) + 1
+    return counts
+
+
+def stored_names():
+    """Noms des fichiers présents sous cas/ (hors fichiers temporaires)."""
+    names = []
+    stack = [CAS_DIR]
+    while stack:
+        directory = stack.pop()
+        try:
+            directories, files = default_storage.listdir(directory)
+        except FileNotFoundError:
+            continue
+        stack.extend(f'{directory}/{d}' for d in directories if f'{directory}/{d}' != f'{CAS_DIR}/tmp')
+        names.extend(f'{directory}/{f}' for f in files)
+    return names
+
+
+def collect(dry_run=False):
+    """Recompte les références et supprime les fichiers inutilisés.
+
+    Retourne (compteurs corrigés, fichiers supprimés).
+    """
+    counts = count_references()
+    corrected = 0
+    known = dict(MediaBlob.objects.values_list('name', 'ref_count'))
+    for name, count in counts.items():
+        if known.get(name) != count:
+            corrected += 1
+            if not dry_run:
+                MediaBlob.objects.update_or_create(name=name, defaults={'ref_count': count, 'size': _size(name)})
+    orphans = set(known) - set(counts)
+    limit = timezone.now() - ORPHAN_GRACE
+    orphans.update(
+        name for name in stored_names()
+        if name not in counts and name not in known and default_storage.get_modified_time(name) < limit
+    )
+    if not dry_run:
+        MediaBlob.objects.filter(name__in=orphans).update(ref_count=0)
+        for name in orphans:
+            if not delete_if_unused(name):
+                # Fichier sans ligne MediaBlob
+                delete_files(name)
+    return corrected, len(orphans)
@@ -0,0 +1,239 @@
+"""Service des fichiers de MEDIA_ROOT sans les charger en mémoire.
+
+    GET /media/cas/ab/cd/<sha256>.jpg
+
+- ETag / Last-Modified et réponses 304 (If-None-Match, If-Modified-Since) ;
+  l'ETag d'un fichier stocké par contenu est son empreinte, sans lecture.
+- Requêtes Range (une seule plage, If-Range respecté) : 206 ou 416.
+- Types MIME précalculés par extension (CONTENT_TYPES).
+- Fichier entier : FileResponse, que le serveur WSGI transmet par
+  wsgi.file_wrapper (os.sendfile avec gunicorn / uWSGI).
+- Derrière nginx ou Apache (BLOG_MEDIA_ACCEL), la vue ne fait que valider
+  la requête et délègue l'envoi par X-Accel-Redirect ou X-Sendfile.
+
+serve_static sert de même STATIC_ROOT : copie .br / .gz écrite par
+collectstatic (blog.storage.CompressedManifestStaticFilesStorage) selon
+Accept-Encoding, cache d'un an pour les noms avec empreinte.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+import stat
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotAllowed, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+from . import compression
+from .storage import CAS_DIR, is_immutable
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+CHUNK_SIZE = 64 * 1024
+
+# Extension -> type MIME, calculé une fois (les images AVIF / WebP manquent
+# des tables de certains systèmes)
+CONTENT_TYPES = {
+    extension: content_type
+    for extension, content_type in mimetypes.types_map.items()
+}
+CONTENT_TYPES.update({'.avif': 'image/avif', '.webp': 'image/webp', '.svg': 'image/svg+xml'})
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def content_type(name):
+    return CONTENT_TYPES.get(posixpath.splitext(name)[1].lower(), 'application/octet-stream')
+
+
+def etag(name, stat_result):
+    """Empreinte du nom pour un fichier stocké par contenu, sinon date + taille."""
+    if is_immutable(name):
+        # .../cas/ab/cd/<sha256>[/<largeur>] : l'empreinte suffit, sans lire le fichier
+        stem = posixpath.splitext(name)[0]
+        digest = stem[stem.index(f'{CAS_DIR}/') + len(CAS_DIR) + 7:]
+        return f'"{digest.replace("/", "-")}"'
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+
+def parse_range(header, size):
+    """(début, fin incluse) de l'unique plage demandée ; None si ignorée, False si insatisfiable.
+
+    Les requêtes à plusieurs plages et les plages invalides (`bytes=5-3`)
+    reçoivent le fichier entier (RFC 9110) ; seule une plage qui commence
+    au-delà de la fin du fichier est insatisfiable.
+    """
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    first, last = match.groups()
+    if first == '':
+        # Suffixe : les N derniers octets
+        length = int(last)
+        if length == 0 or size == 0:
+            return False
+        return max(0, size - length), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        return False
+    end = min(int(last), size - 1) if last else size - 1
+    return start, end
+
+
+def _if_range_matches(request, tag, last_modified):
+    value = request.headers.get('If-Range')
+    if value is None:
+        return True
+    if value.startswith(('"', 'W/')):
+        return value == tag
+    return parse_http_date_safe(value) == int(last_modified)
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _accel_response(name, path):
+    mode = _setting('BLOG_MEDIA_ACCEL', None)
+    if mode == 'x-accel-redirect':
+        response = HttpResponse()
+        response['X-Accel-Redirect'] = _setting('BLOG_MEDIA_ACCEL_PREFIX', '/protected-media/') + name
+        return response
+    if mode == 'x-sendfile':
+        response = HttpResponse()
+        response['X-Sendfile'] = path
+        return response
+    return None
+
+
+def _resolve(root, path):
+    """(nom normalisé, chemin complet, stat) du fichier `path` sous `root` ; 404 sinon."""
+    name = posixpath.normpath(path).lstrip('/')
+    try:
+        full_path = safe_join(root, name)
+        stat_result = os.stat(full_path)
+    except (ValueError, OSError):
+        raise Http404('Fichier introuvable')
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise Http404('Fichier introuvable')
+    return name, full_path, stat_result
+
+
+def send_file(request, name, full_path, stat_result, cache_control, headers=None, accel=False):
+    """Réponse GET / HEAD du fichier `full_path` (304, 206, 416 ou 200).
+
+    `name` donne le type MIME et l'ETag ; `headers` s'ajoutent à toutes les
+    réponses sauf 416 (Content-Encoding, Vary...).
+    """
+    tag = etag(name, stat_result)
+    if headers and 'Content-Encoding' in headers:
+        # Chaque codage est une représentation distincte
+        tag = f'{tag[:-1]}-{headers["Content-Encoding"]}"'
+    last_modified = stat_result.st_mtime
+    headers = {
+        'ETag': tag,
+        'Last-Modified': http_date(last_modified),
+        'Cache-Control': cache_control,
+        'Accept-Ranges': 'bytes',
+        **(headers or {}),
+    }
+
+    not_modified = get_conditional_response(request, etag=tag, last_modified=int(last_modified))
+    if not_modified is not None:
+        for header, value in headers.items():
+            not_modified.setdefault(header, value)
+        return not_modified
+
+    # nginx / Apache gèrent eux-mêmes Range et l'envoi du fichier
+    response = _accel_response(name, full_path) if accel else None
+    if response is None:
+        response = _file_response(request, full_path, stat_result.st_size, tag, last_modified)
+        if response.status_code == 416:
+            return response
+    response['Content-Type'] = content_type(name)
+    for header, value in headers.items():
+        response[header] = value
+    return response
+
+
+def serve(request, path):
+    """Vue des médias (GET / HEAD) ; `path` est relatif à MEDIA_ROOT."""
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    name, full_path, stat_result = _resolve(settings.MEDIA_ROOT, path)
+    cache_control = (
+        IMMUTABLE_CACHE_CONTROL if is_immutable(name)
+        else f'public, max-age={_setting("BLOG_MEDIA_MAX_AGE", 3600)}'
+    )
+    return send_file(request, name, full_path, stat_result, cache_control, accel=True)
+
+
+def serve_static(request, path):
+    """Vue des fichiers statiques (GET / HEAD) ; `path` est relatif à STATIC_ROOT."""
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    name, full_path, stat_result = _resolve(settings.STATIC_ROOT, path)
+    is_hashed = getattr(staticfiles_storage, 'is_hashed', None)
+    cache_control = (
+        IMMUTABLE_CACHE_CONTROL if is_hashed and is_hashed(name)
+        else f'public, max-age={_setting("BLOG_STATIC_MAX_AGE", 60)}'
+    )
+    headers = {}
+    if compression.is_compressible(name):
+        headers['Vary'] = 'Accept-Encoding'
+        # Copies précompressées présentes, par ordre de préférence
+        encodings = [
+            encoding for encoding in compression.available_encodings()
+            if os.path.isfile(full_path + compression.SUFFIXES[encoding])
+        ]
+        encoding = compression.negotiate(request.headers.get('Accept-Encoding'), encodings)
+        if encoding:
+            full_path += compression.SUFFIXES[encoding]
+            stat_result = os.stat(full_path)
+            headers['Content-Encoding'] = encoding
+    return send_file(request, name, full_path, stat_result, cache_control, headers)
+
+
+def _file_response(request, full_path, size, tag, last_modified):
+    byte_range = None
+    if 'Range' in request.headers and _if_range_matches(request, tag, last_modified):
+        byte_range = parse_range(request.headers['Range'], size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if byte_range is None:
+        if request.method == 'HEAD':
+            response = HttpResponse()
+        else:
+            response = FileResponse(open(full_path, 'rb'))
+        response['Content-Length'] = size
+        return response
+
+    start, end = byte_range
+    length = end - start + 1
+    if request.method == 'HEAD':
+        response = HttpResponse(status=206)
+    else:
+        # Plage bornée : pas de wsgi.file_wrapper, qui enverrait jusqu'à la fin du fichier
+        response = StreamingHttpResponse(_read_range(full_path, start, length), status=206)
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = length
+    return response
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:39
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Article = apps.get_model('blog', 'Article')
+    Comment = apps.get_model('blog', 'Comment')
+    Likes = Article.likes.through
+
+    def count_of(model):
+        counts = (
+            model.objects.filter(article_id=OuterRef('pk'))
+            .order_by()
+            .values('article_id')
+            .annotate(total=Count('*'))
+            .values('total')
+        )
+        return Coalesce(Subquery(counts), Value(0))
+
+    Article.objects.update(likes_count=count_of(Likes), comments_count=count_of(Comment))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0003_userprofile_cover_image_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0004_article_likes_count_comments_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitorSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(blank=True, null=True)),
+                ('registers', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visitor_sketches', to='blog.article')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('article', 'day'), name='unique_visitor_sketch_per_day'), models.UniqueConstraint(condition=models.Q(('day__isnull', True)), fields=('article',), name='unique_visitor_sketch_all_time')],
+            },
+        ),
+    ]
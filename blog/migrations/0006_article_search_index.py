@@ -0,0 +1,43 @@
+from django.db import OperationalError, migrations
+
+FTS_TABLE = 'blog_article_fts'
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                "title, content, author, "
+                "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            )
+        except OperationalError:
+            # SQLite sans FTS5 : blog.search retombe sur icontains
+            return
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, content, author) "
+            "SELECT a.id, a.title, a.content, u.username FROM blog_article a "
+            "JOIN auth_user u ON u.id = a.author_id WHERE a.status = 'published'"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_visitorsketch'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
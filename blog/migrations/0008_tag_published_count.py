@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:45
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_published_count(apps, schema_editor):
+    Article = apps.get_model('blog', 'Article')
+    Tag = apps.get_model('blog', 'Tag')
+    counts = (
+        Article.tags.through.objects.filter(tag_id=OuterRef('pk'), article__status='published')
+        .order_by()
+        .values('tag_id')
+        .annotate(total=Count('*'))
+        .values('total')
+    )
+    Tag.objects.update(published_count=Coalesce(Subquery(counts), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_article_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='published_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_published_count, migrations.RunPython.noop),
+    ]
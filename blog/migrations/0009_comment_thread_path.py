@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_paths(apps, schema_editor):
+    Comment = apps.get_model('blog', 'Comment')
+    paths, threads, batch = {}, {}, []
+    # Un parent a toujours un id inférieur à ses réponses
+    for comment in Comment.objects.order_by('pk').only('pk', 'parent_id').iterator(chunk_size=2000):
+        parent_path = paths.get(comment.parent_id, '')
+        comment.path = f'{parent_path}{comment.pk:010d}/'
+        comment.thread_id = threads.get(comment.parent_id, comment.pk)
+        paths[comment.pk] = comment.path
+        threads[comment.pk] = comment.thread_id
+        batch.append(comment)
+        if len(batch) >= 1000:
+            Comment.objects.bulk_update(batch, ['path', 'thread'])
+            batch = []
+    if batch:
+        Comment.objects.bulk_update(batch, ['path', 'thread'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_tag_published_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='thread',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='thread_comments', to='blog.comment'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['article', 'path'], name='comment_article_path_idx'),
+        ),
+        migrations.RunPython(backfill_paths, migrations.RunPython.noop),
+    ]
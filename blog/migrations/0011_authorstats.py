@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_author_stats(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Article = apps.get_model('blog', 'Article')
+    Comment = apps.get_model('blog', 'Comment')
+    AuthorStats = apps.get_model('blog', 'AuthorStats')
+    AuthorStats.objects.bulk_create(
+        [AuthorStats(user_id=pk) for pk in User.objects.values_list('pk', flat=True).iterator()],
+        batch_size=500,
+    )
+
+    def total(queryset, aggregate):
+        totals = (
+            queryset.filter(author_id=OuterRef('pk'))
+            .order_by()
+            .values('author_id')
+            .annotate(total=aggregate)
+            .values('total')
+        )
+        return Coalesce(Subquery(totals), Value(0))
+
+    published = Article.objects.filter(status='published')
+    AuthorStats.objects.update(
+        article_count=total(published, Count('*')),
+        likes_received=total(published, Sum('likes_count')),
+        views_received=total(published, Sum('views')),
+        comments_written=total(Comment.objects.all(), Count('*')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('blog', '0010_comment_thread_path_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='author_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('article_count', models.PositiveIntegerField(default=0)),
+                ('likes_received', models.PositiveIntegerField(default=0)),
+                ('views_received', models.PositiveIntegerField(default=0)),
+                ('comments_written', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'author stats',
+            },
+        ),
+        migrations.RunPython(backfill_author_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0016_analytics_without_constraints'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='comment',
+            name='path',
+            field=models.TextField(blank=True, editable=False),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0018_view_count_journal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportedRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('export_id', models.UUIDField()),
+                ('kind', models.CharField(max_length=10)),
+                ('source_id', models.PositiveBigIntegerField()),
+                ('target_id', models.PositiveBigIntegerField()),
+                ('imported_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('export_id', 'kind', 'source_id'), name='importedrecord_unique_source')],
+            },
+        ),
+    ]
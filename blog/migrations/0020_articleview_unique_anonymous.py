@@ -0,0 +1,33 @@
+from django.db import migrations, models
+
+
+def remove_duplicate_anonymous_views(apps, schema_editor):
+    # Doublons déjà écrits : on garde la première vue de chaque visiteur anonyme
+    ArticleView = apps.get_model('blog', 'ArticleView')
+    views = ArticleView.objects.using(schema_editor.connection.alias).filter(user__isnull=True)
+    seen, duplicates = set(), []
+    for pk, article_id, ip_address in views.order_by('pk').values_list('pk', 'article_id', 'ip_address').iterator():
+        if (article_id, ip_address) in seen:
+            duplicates.append(pk)
+        else:
+            seen.add((article_id, ip_address))
+    for start in range(0, len(duplicates), 500):
+        views.filter(pk__in=duplicates[start:start + 500]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0019_imported_record'),
+    ]
+
+    operations = [
+        # model_name : exécutée dans la base des vues (blog.routers)
+        migrations.RunPython(remove_duplicate_anonymous_views, migrations.RunPython.noop,
+                             hints={'model_name': 'articleview'}),
+        migrations.AddConstraint(
+            model_name='articleview',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', True)),
+                                               fields=('article', 'ip_address'), name='articleview_unique_anonymous'),
+        ),
+    ]
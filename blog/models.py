@@ -1,13 +1,18 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.text import slugify
 
+from . import pagecache
+
 class Tag(models.Model):
     name = models.CharField(max_length=50, unique=True)
     slug = models.SlugField(max_length=50, unique=True, blank=True)
     color = models.CharField(max_length=7, default='#6f42c1')  # Couleur hex
     created_at = models.DateTimeField(auto_now_add=True)
+    # Nombre d'articles publiés portant ce tag, maintenu par blog.counters
+    published_count = models.PositiveIntegerField(default=0, editable=False)
     
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -17,6 +22,13 @@ class Tag(models.Model):
     def __str__(self):
         return self.name
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # La page en cours de rendu affiche ce tag (blog.pagecache)
+        pagecache.track(f'tag:{instance.pk}')
+        return instance
+    
     class Meta:
         ordering = ['name']
 
@@ -24,6 +36,8 @@ class Article(models.Model):
     title = models.CharField(max_length=200)
     content = models.TextField()
     image = models.ImageField(upload_to='blog_images/', blank=True, null=True)
+    # Manifeste des déclinaisons AVIF / WebP de l'image (blog.images)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -31,6 +45,9 @@ class Article(models.Model):
     tags = models.ManyToManyField(Tag, blank=True, related_name='articles')
     views = models.PositiveIntegerField(default=0)
     is_featured = models.BooleanField(default=False)
+    # Compteurs dénormalisés, maintenus par blog.counters (voir signals.py)
+    likes_count = models.PositiveIntegerField(default=0, editable=False)
+    comments_count = models.PositiveIntegerField(default=0, editable=False)
     status = models.CharField(max_length=10, choices=[
         ('draft', 'Brouillon'),
         ('published', 'Publié')
@@ -39,23 +56,39 @@ class Article(models.Model):
     def __str__(self):
         return self.title
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Statut lu en base, pour détecter publication / dépublication au save()
+        instance._loaded_status = instance.__dict__.get('status')
+        pagecache.track(f'article:{instance.pk}')
+        return instance
+    
     def get_absolute_url(self):
         return reverse('article_detail', kwargs={'pk': self.pk})
 
     @property
     def total_likes(self):
-        return self.likes.count()
+        return self.likes_count
     
     @property
     def total_comments(self):
-        return self.comments.count()
+        return self.comments_count
     
-    def increment_views(self):
-        self.views += 1
-        self.save(update_fields=['views'])
+    def increment_views(self, count=1):
+        # Incrément atomique côté base : pas de perte de mise à jour en concurrence
+        Article.objects.filter(pk=self.pk).update(views=models.F('views') + count)
+        self.views += count
     
     class Meta:
         ordering = ['-created_at']
+        # Index couvrant les tris de la liste (pagination par curseur : clé + id)
+        indexes = [
+            models.Index(fields=['status', '-created_at', '-id'], name='article_status_created_idx'),
+            models.Index(fields=['status', '-views', '-id'], name='article_status_views_idx'),
+            models.Index(fields=['status', '-likes_count', '-id'], name='article_status_likes_idx'),
+            models.Index(fields=['status', 'title', 'id'], name='article_status_title_idx'),
+        ]
 
 class Comment(models.Model):
     article = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='comments')
@@ -65,22 +98,49 @@ class Comment(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.CASCADE, related_name='replies')
     is_edited = models.BooleanField(default=False)
+    # Commentaire racine du fil et chemin matérialisé ("0000000012/0000000040/") :
+    # trier par path donne le fil complet en profondeur, en une seule requête.
+    # TextField : 11 caractères par niveau, sans limite de profondeur
+    thread = models.ForeignKey('self', null=True, blank=True, on_delete=models.CASCADE,
+                               related_name='thread_comments', editable=False)
+    path = models.TextField(blank=True, editable=False)
+
+    PATH_SEGMENT_WIDTH = 10
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['article', 'path'], name='comment_article_path_idx'),
+            models.Index(fields=['thread', 'path'], name='comment_thread_path_idx'),
+            models.Index(fields=['article', 'updated_at'], name='comment_article_updated_idx'),
+        ]
 
     def __str__(self):
         return f'Comment by {self.author.username} on {self.article}'
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        if not self.path:
+            parent_path = self.parent.path if self.parent_id else ''
+            self.path = f'{parent_path}{self.pk:0{self.PATH_SEGMENT_WIDTH}d}/'
+            self.thread_id = self.parent.thread_id if self.parent_id else self.pk
+            Comment.objects.filter(pk=self.pk).update(path=self.path, thread_id=self.thread_id)
+
     @property
     def is_reply(self):
         return self.parent is not None
 
+    @property
+    def depth(self):
+        return self.path.count('/') - 1 if self.path else 0
+
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     bio = models.TextField(max_length=500, blank=True)
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
     cover_image = models.ImageField(upload_to='covers/', blank=True, null=True)
+    avatar_variants = models.JSONField(default=dict, blank=True, editable=False)
+    cover_image_variants = models.JSONField(default=dict, blank=True, editable=False)
     website = models.URLField(blank=True)
     location = models.CharField(max_length=100, blank=True)
     birth_date = models.DateField(null=True, blank=True)
@@ -101,23 +161,197 @@ class UserProfile(models.Model):
     def full_name(self):
         return f"{self.user.first_name} {self.user.last_name}".strip() or self.user.username
     
+    @property
+    def stats(self):
+        return AuthorStats.for_user(self.user)
+    
     @property
     def article_count(self):
-        return self.user.article_set.filter(status='published').count()
+        return self.stats.article_count
     
     @property
     def total_likes_received(self):
-        return sum(article.total_likes for article in self.user.article_set.filter(status='published'))
+        return self.stats.likes_received
     
     @property
     def total_views_received(self):
-        return sum(article.views for article in self.user.article_set.filter(status='published'))
+        return self.stats.views_received
+    
+    @property
+    def comment_count(self):
+        return self.stats.comments_written
+
+class AuthorStats(models.Model):
+    # Statistiques d'auteur tenues à jour par blog.signals et le vidage des vues
+    # (articles publiés seulement) ; `reconcile_author_stats` corrige toute dérive
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='author_stats')
+    article_count = models.PositiveIntegerField(default=0)
+    likes_received = models.PositiveIntegerField(default=0)
+    views_received = models.PositiveIntegerField(default=0)
+    comments_written = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name_plural = 'author stats'
+    
+    def __str__(self):
+        return f'Stats of {self.user.username}'
+    
+    @classmethod
+    def for_user(cls, user):
+        """Les statistiques de `user`, créées et calculées si la ligne manque."""
+        try:
+            return user.author_stats
+        except cls.DoesNotExist:
+            # Import local : blog.counters importe ce module
+            from .counters import refresh_author_stats
+            cls.objects.get_or_create(user=user)
+            refresh_author_stats([user.pk])
+            user.author_stats = cls.objects.get(user=user)
+            return user.author_stats
 
 class ArticleView(models.Model):
-    article = models.ForeignKey(Article, on_delete=models.CASCADE)
-    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    # Base 'analytics' (blog.routers) : pas de contrainte ni de cascade entre
+    # bases, les lignes sont supprimées par blog.signals
+    article = models.ForeignKey(Article, on_delete=models.DO_NOTHING, db_constraint=False)
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, null=True, blank=True, db_constraint=False)
     ip_address = models.GenericIPAddressField()
     timestamp = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         unique_together = ('article', 'user', 'ip_address')
+        constraints = [
+            # NULL n'est jamais égal à NULL : unique_together laisse passer deux
+            # vues anonymes identiques écrites par deux processus
+            models.UniqueConstraint(fields=['article', 'ip_address'], condition=models.Q(user__isnull=True),
+                                    name='articleview_unique_anonymous'),
+        ]
+
+class VisitorSketch(models.Model):
+    """Sketch HyperLogLog des visiteurs uniques d'un article.
+
+    Une ligne par jour (`day`) plus une ligne cumulée (`day` vide). Stocké
+    dans la base 'analytics' comme ArticleView.
+    """
+    article = models.ForeignKey(Article, on_delete=models.DO_NOTHING, related_name='visitor_sketches',
+                                db_constraint=False)
+    day = models.DateField(null=True, blank=True)
+    registers = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['article', 'day'], name='unique_visitor_sketch_per_day'),
+            models.UniqueConstraint(fields=['article'], condition=models.Q(day__isnull=True),
+                                    name='unique_visitor_sketch_all_time'),
+        ]
+
+    def __str__(self):
+        return f'Visiteurs de {self.article} ({self.day or "total"})'
+
+    @property
+    def sketch(self):
+        from .sketches import HyperLogLog
+        return HyperLogLog.from_bytes(self.registers)
+
+    @property
+    def estimate(self):
+        return self.sketch.count()
+
+    @classmethod
+    def unique_visitors(cls, article, start=None, end=None):
+        """Visiteurs uniques estimés : cumul total, ou fusion des jours [start, end]."""
+        from .sketches import HyperLogLog
+        sketches = cls.objects.filter(article=article)
+        if start is None and end is None:
+            sketches = sketches.filter(day__isnull=True)
+        else:
+            sketches = sketches.filter(day__isnull=False)
+            if start is not None:
+                sketches = sketches.filter(day__gte=start)
+            if end is not None:
+                sketches = sketches.filter(day__lte=end)
+        merged = HyperLogLog()
+        for registers in sketches.values_list('registers', flat=True):
+            merged.merge(HyperLogLog.from_bytes(registers))
+        return merged.count()
+
+class PendingViewCount(models.Model):
+    """Vues d'un lot du tampon pas encore ajoutées aux compteurs.
+
+    Base 'analytics' : écrite dans la transaction des vues (ArticleView ou
+    VisitorSketch) du lot, puis supprimée une fois le lot appliqué
+    (AppliedViewBatch). Un lot resté ici est rejoué (blog.viewcounter).
+    """
+    batch = models.UUIDField(db_index=True)
+    article = models.ForeignKey(Article, on_delete=models.DO_NOTHING, related_name='+', db_constraint=False)
+    views = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+class AppliedViewBatch(models.Model):
+    # Lot du tampon de vues ajouté aux compteurs, dans la même transaction
+    # qu'eux (base par défaut) : un lot n'est jamais compté deux fois
+    batch = models.UUIDField(unique=True)
+    applied_at = models.DateTimeField(auto_now_add=True)
+
+class ImageJob(models.Model):
+    # File d'attente durable des déclinaisons d'images (blog.imagequeue),
+    # traitée hors requête par la commande process_image_jobs
+    STATUS_CHOICES = [
+        ('pending', 'En attente'),
+        ('running', 'En cours'),
+        ('failed', 'Échec'),
+    ]
+    
+    model = models.CharField(max_length=50)  # 'article', 'userprofile'
+    object_id = models.PositiveBigIntegerField()
+    field = models.CharField(max_length=50)
+    force = models.BooleanField(default=False)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=32, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='imagejob_status_available_idx'),
+        ]
+        constraints = [
+            # Une seule tâche en attente par image
+            models.UniqueConstraint(fields=['model', 'object_id', 'field'], condition=models.Q(status='pending'),
+                                    name='imagejob_unique_pending'),
+        ]
+    
+    def __str__(self):
+        return f'{self.model}:{self.object_id}.{self.field} ({self.status})'
+
+class MediaBlob(models.Model):
+    # Fichier stocké par contenu (blog.storage), partagé par les champs image
+    # qui le désignent ; supprimé par blog.media quand ref_count retombe à 0
+    name = models.CharField(max_length=255, primary_key=True)
+    size = models.PositiveBigIntegerField(default=0)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f'{self.name} ({self.ref_count} réf.)'
+
+class ImportedRecord(models.Model):
+    # Correspondance id d'origine -> id attribué d'un import (blog.transfer),
+    # écrite dans la transaction du lot : un lot repris ou rejoué retrouve
+    # ses enregistrements au lieu de les dupliquer
+    export_id = models.UUIDField()
+    kind = models.CharField(max_length=10)  # 'article', 'comment'
+    source_id = models.PositiveBigIntegerField()
+    target_id = models.PositiveBigIntegerField()
+    imported_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['export_id', 'kind', 'source_id'], name='importedrecord_unique_source'),
+        ]
+    
+    def __str__(self):
+        return f'{self.kind} {self.source_id} -> {self.target_id}'
@@ -0,0 +1,254 @@
+"""Cache de pages complètes pour les visiteurs anonymes.
+
+Une page est mise en cache sous une clé construite à partir du chemin et des
+seuls paramètres de requête qui la font varier (tag, search, sort, page...),
+avec la liste de ses dépendances : les objets affichés (« article:12 »,
+« tag:3 ») et les collections dont elle dépend (« articles », « tags »,
+« popular_tags »). Les dépendances sont relevées pendant le rendu :
+Article.from_db et Tag.from_db appellent track(), les vues et blog.counters
+ajoutent les collections.
+
+Chaque dépendance a un jeton de version en cache. invalidate() supprime ce
+jeton après le commit de la transaction : exactement les pages qui avaient
+relevé la dépendance deviennent périmées, sans liste de pages à maintenir.
+BLOG_PAGE_CACHE_TIMEOUT borne ce qui n'est pas suivi (vues, profils auteurs).
+
+Les dépendances ne sont connues qu'après le rendu, leurs jetons sont donc
+lus après les données. Une invalidation validée pendant le rendu ferait
+recréer le jeton supprimé, et la page périmée serait enregistrée comme à
+jour : invalidate() change aussi une génération globale avant de supprimer
+les jetons, relevée avant l'appel de la vue, et la page n'est pas
+enregistrée si elle a changé entre-temps.
+
+Chaque entrée porte un jeton unique (response.page_cache_token) sous lequel
+blog.compression range les versions gzip / brotli du corps.
+"""
+import hashlib
+import time
+import uuid
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe, urlencode
+
+PAGE_PREFIX = 'blog:page:'
+DEPENDENCY_PREFIX = 'blog:pagedep:'
+STATS_PREFIX = 'blog:pagestats:'
+GENERATION_KEY = 'blog:pagegen'
+COMPRESSED_PREFIX = 'blog:pagez:'
+
+# En-têtes propres à une réponse, jamais rejoués depuis le cache
+SKIPPED_HEADERS = {'set-cookie', 'x-page-cache'}
+
+_dependencies = ContextVar('blog_page_dependencies', default=None)
+_registered_views = []
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _cache():
+    return caches[_setting('BLOG_PAGE_CACHE_ALIAS', 'default')]
+
+
+def track(*dependencies):
+    """Déclare que la page en cours de rendu dépend de `dependencies`."""
+    tracked = _dependencies.get()
+    if tracked is not None:
+        tracked.update(dependencies)
+
+
+def invalidate(*dependencies):
+    """Rend périmées les pages qui dépendent de `dependencies` (au commit de la transaction)."""
+    keys = [DEPENDENCY_PREFIX + dependency for dependency in dependencies]
+    if keys:
+        transaction.on_commit(lambda: _expire(keys))
+
+
+def _expire(keys):
+    cache = _cache()
+    # Génération d'abord : un rendu qui lirait un jeton recréé la verra changer
+    cache.set(GENERATION_KEY, uuid.uuid4().hex, None)
+    cache.delete_many(keys)
+
+
+def versions(*dependencies):
+    """Jetons de version {clé: jeton} des dépendances, créés s'ils manquent.
+
+    Sert aussi de « version de collection » pour les validateurs HTTP : le
+    jeton change à chaque invalidate().
+    """
+    cache = _cache()
+    keys = [DEPENDENCY_PREFIX + dependency for dependency in dependencies]
+    found = cache.get_many(keys)
+    missing = [k for k in keys if k not in found]
+    if missing:
+        for k in missing:
+            cache.add(k, uuid.uuid4().hex, None)
+        found.update(cache.get_many(missing))
+    return found
+
+
+def page_key(request, params):
+    """Clé de la page : chemin + paramètres `params` non vides, triés."""
+    query = sorted(
+        (name, request.GET[name].strip()) for name in params if request.GET.get(name, '').strip()
+    )
+    raw = f'{request.path}?{urlencode(query)}'
+    return PAGE_PREFIX + hashlib.md5(raw.encode()).hexdigest()
+
+
+def _cacheable_request(request):
+    return (
+        _setting('BLOG_PAGE_CACHE_ENABLED', True)
+        and request.method in ('GET', 'HEAD')
+        and not request.user.is_authenticated
+        # Messages en attente ou appel AJAX : réponse propre à ce visiteur
+        and 'messages' not in request.COOKIES
+        and request.headers.get('X-Requested-With') != 'XMLHttpRequest'
+    )
+
+
+def _cacheable_response(response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and 'private' not in response.get('Cache-Control', '')
+    )
+
+
+def _cached_response(key):
+    cache = _cache()
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    stored = entry['dependencies']
+    if stored and cache.get_many(list(stored)) != stored:
+        return None
+    response = HttpResponse(entry['content'], status=entry['status'])
+    for header, value in entry['headers']:
+        response[header] = value
+    response.page_cache_token = entry.get('token')
+    return response
+
+
+def _store(key, response, dependencies, generation):
+    """Enregistre la page, sauf si une invalidation a eu lieu depuis `generation` (relevée avant le rendu)."""
+    cache = _cache()
+    tokens = versions(*dependencies)
+    if cache.get(GENERATION_KEY) != generation:
+        return
+    token = uuid.uuid4().hex
+    cache.set(key, {
+        'content': response.content,
+        'status': response.status_code,
+        'headers': [(h, v) for h, v in response.items() if h.lower() not in SKIPPED_HEADERS],
+        'dependencies': tokens,
+        'token': token,
+    }, _setting('BLOG_PAGE_CACHE_TIMEOUT', 300))
+    response.page_cache_token = token
+
+
+def compressed_body(token, encoding):
+    """Corps compressé (`encoding`) de l'entrée `token`, ou None."""
+    return _cache().get(f'{COMPRESSED_PREFIX}{token}:{encoding}')
+
+
+def store_compressed_body(token, encoding, body):
+    # Même durée que l'entrée : une entrée remplacée a un autre jeton
+    _cache().set(f'{COMPRESSED_PREFIX}{token}:{encoding}', body, _setting('BLOG_PAGE_CACHE_TIMEOUT', 300))
+
+
+def _incr(cache, key, delta):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.add(key, delta, None)
+
+
+def _record(name, outcome, started):
+    # Désactivé par défaut : deux écritures en cache par requête, et incr() n'est
+    # pas atomique sur tous les backends (comptes approximatifs en concurrence)
+    if not _setting('BLOG_PAGE_CACHE_STATS', False):
+        return
+    cache = _cache()
+    _incr(cache, f'{STATS_PREFIX}{name}:{outcome}', 1)
+    _incr(cache, f'{STATS_PREFIX}{name}:{outcome}_us', int((time.perf_counter() - started) * 1e6))
+
+
+def cache_page_for_anonymous(name, params=(), on_hit=None):
+    """Sert la vue depuis le cache de pages pour les GET anonymes.
+
+    `params` liste les paramètres de requête qui font varier la page, les
+    autres sont ignorés. `on_hit(request, *args, **kwargs)` est appelé quand
+    la page vient du cache (comptage des vues, par exemple).
+    """
+    _registered_views.append(name)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not _cacheable_request(request):
+                return view(request, *args, **kwargs)
+            started = time.perf_counter()
+            key = page_key(request, params)
+
+            response = _cached_response(key)
+            if response is not None:
+                if on_hit is not None:
+                    on_hit(request, *args, **kwargs)
+                _record(name, 'hit', started)
+                response['X-Page-Cache'] = 'hit'
+                # Validateurs enregistrés avec la page : 304 sans rien recalculer
+                return get_conditional_response(
+                    request,
+                    etag=response.get('ETag'),
+                    last_modified=parse_http_date_safe(response.get('Last-Modified', '')),
+                    response=response,
+                )
+
+            generation = _cache().get(GENERATION_KEY)
+            token = _dependencies.set(set())
+            try:
+                response = view(request, *args, **kwargs)
+                dependencies = _dependencies.get()
+            finally:
+                _dependencies.reset(token)
+            if _cacheable_response(response):
+                _store(key, response, dependencies, generation)
+            _record(name, 'miss', started)
+            response['X-Page-Cache'] = 'miss'
+            return response
+        return wrapper
+    return decorator
+
+
+def registered_views():
+    return list(_registered_views)
+
+
+def stats(names=None):
+    """Compteurs {vue: {'hit', 'miss', 'hit_us', 'miss_us'}} lus dans le cache."""
+    names = names or registered_views()
+    fields = ('hit', 'miss', 'hit_us', 'miss_us')
+    keys = {f'{STATS_PREFIX}{name}:{field}': (name, field) for name in names for field in fields}
+    values = _cache().get_many(list(keys))
+    result = {name: dict.fromkeys(fields, 0) for name in names}
+    for key, value in values.items():
+        name, field = keys[key]
+        result[name][field] = value
+    return result
+
+
+def reset_stats(names=None):
+    names = names or registered_views()
+    _cache().delete_many([
+        f'{STATS_PREFIX}{name}:{field}' for name in names for field in ('hit', 'miss', 'hit_us', 'miss_us')
+    ])
@@ -0,0 +1,133 @@
+"""Pagination par curseur (keyset) et comptage approximatif mis en cache.
+
+Le curseur encode la valeur de la clé de tri et l'id du dernier article
+affiché : la page suivante est lue avec `WHERE (clé, id) < (valeur, id)`
+sur un index, sans OFFSET, donc la page N coûte autant que la page 1.
+"""
+import base64
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+# tri -> (champ, décroissant)
+SORT_KEYS = {
+    '-created_at': ('created_at', True),
+    '-views': ('views', True),
+    '-likes': ('likes_count', True),
+    'title': ('title', False),
+}
+
+COUNT_CACHE_TIMEOUT = 60
+
+
+def encode_cursor(sort_by, value, pk):
+    if hasattr(value, 'isoformat'):
+        value = value.isoformat()
+    payload = json.dumps([sort_by, value, pk], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort_by):
+    """Retourne (valeur, pk), ou None si le curseur est invalide ou d'un autre tri."""
+    if not cursor or sort_by not in SORT_KEYS:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_sort, value, pk = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        return None
+    if cursor_sort != sort_by or not _is_int(pk):
+        return None
+    field = SORT_KEYS[sort_by][0]
+    if field == 'created_at':
+        try:
+            value = parse_datetime(value) if isinstance(value, str) else None
+        except ValueError:
+            return None
+        if value is None:
+            return None
+    elif field == 'title':
+        if not isinstance(value, str):
+            return None
+    elif not _is_int(value):
+        return None
+    return value, pk
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def keyset_ordering(sort_by):
+    field, descending = SORT_KEYS[sort_by]
+    return (f'-{field}', '-pk') if descending else (field, 'pk')
+
+
+class KeysetPage:
+
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def next_cursor_for(sort_by, last_item):
+    field, _ = SORT_KEYS[sort_by]
+    return encode_cursor(sort_by, getattr(last_item, field), last_item.pk)
+
+
+def keyset_page(queryset, sort_by, cursor=None, per_page=6):
+    """Page de `per_page` éléments suivant `cursor` (première page si None)."""
+    field, descending = SORT_KEYS[sort_by]
+    queryset = queryset.order_by(*keyset_ordering(sort_by))
+    position = decode_cursor(cursor, sort_by)
+    if position is not None:
+        value, pk = position
+        op = 'lt' if descending else 'gt'
+        queryset = queryset.filter(
+            Q(**{f'{field}__{op}': value}) | Q(**{field: value, f'pk__{op}': pk})
+        )
+    items = list(queryset[:per_page + 1])
+    if len(items) > per_page:
+        items = items[:per_page]
+        return KeysetPage(items, next_cursor_for(sort_by, items[-1]))
+    return KeysetPage(items, None)
+
+
+def cached_count(queryset, timeout=COUNT_CACHE_TIMEOUT):
+    """COUNT(*) du queryset, mis en cache quelques instants (valeur approximative)."""
+    try:
+        sql, params = queryset.order_by().query.sql_with_params()
+    except EmptyResultSet:
+        # queryset.none() : aucune requête à compter
+        return 0
+    key = 'blog:count:' + hashlib.md5(f'{sql}|{params}'.encode()).hexdigest()
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, timeout)
+    return count
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator dont le total vient de cached_count() au lieu d'un COUNT par requête."""
+
+    @cached_property
+    def count(self):
+        # Résultats classés par pertinence (blog.search.RankedArticles) : même total que leur queryset
+        return cached_count(getattr(self.object_list, 'queryset', self.object_list))
@@ -0,0 +1,180 @@
+"""Budget de requêtes SQL par vue et détection des N+1.
+
+QueryBudgetMiddleware enregistre les requêtes SQL de chaque requête HTTP
+(toutes les bases, par connection.execute_wrapper) et les compare au budget
+de la vue (BLOG_QUERY_BUDGETS, par nom d'URL, sinon
+BLOG_QUERY_BUDGET_DEFAULT ou DEFAULT_BUDGET). Les requêtes de même
+structure (mêmes SQL aux paramètres près, listes IN comprises) répétées au
+moins BLOG_QUERY_N_PLUS_ONE_THRESHOLD fois sont signalées comme N+1.
+
+En production, seuls le SQL et la durée sont relevés ; la recherche de la
+ligne de gabarit (ou de code) qui a déclenché chaque requête parcourt la
+pile d'appels et n'est active qu'avec BLOG_QUERY_BUDGET_TRACE (DEBUG et
+tests). BLOG_QUERY_BUDGET_MODE : 'log' (avertissement), 'raise' (exception,
+pour les tests) ou 'off'.
+
+Dans les tests : `with query_budget(8): client.get(...)` échoue avec le
+rapport des requêtes si le budget est dépassé ou si un N+1 apparaît.
+"""
+import logging
+import os
+import re
+import sys
+import time
+from collections import Counter, namedtuple
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Budget des vues absentes de BLOG_QUERY_BUDGETS, sauf BLOG_QUERY_BUDGET_DEFAULT
+DEFAULT_BUDGET = 20
+
+RecordedQuery = namedtuple('RecordedQuery', 'sql duration location')
+QueryGroup = namedtuple('QueryGroup', 'fingerprint count locations')
+
+_IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+# Réglages de connexion et contrôle de transaction : pas des requêtes de la vue
+_IGNORED_RE = re.compile(r'\s*(?:PRAGMA|BEGIN|SAVEPOINT|RELEASE|COMMIT|ROLLBACK)\b', re.IGNORECASE)
+
+_BLOG_DIR = os.path.dirname(os.path.abspath(__file__)) + os.sep
+_PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_THIS_FILE = os.path.abspath(__file__)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def fingerprint(sql):
+    """Structure de la requête : listes IN et littéraux remplacés."""
+    return _LITERAL_RE.sub('?', _IN_LIST_RE.sub('IN (...)', sql))
+
+
+def query_location():
+    """« gabarit:ligne » du nœud de gabarit en cours de rendu, sinon « fichier:ligne » du code du blog."""
+    frame = sys._getframe(2)
+    code_location = None
+    while frame is not None:
+        if frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            token = getattr(node, 'token', None)
+            origin = getattr(node, 'origin', None)
+            if token is not None and origin is not None:
+                return f'{origin.template_name or origin.name}:{token.lineno}'
+        filename = frame.f_code.co_filename
+        if code_location is None and filename.startswith(_BLOG_DIR) and filename != _THIS_FILE:
+            code_location = f'{os.path.relpath(filename, _PROJECT_DIR)}:{frame.f_lineno}'
+        frame = frame.f_back
+    return code_location
+
+
+class QueryRecorder:
+    """Relève les requêtes SQL exécutées sur toutes les connexions pendant record()."""
+
+    def __init__(self, trace=False):
+        self.trace = trace
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if not _IGNORED_RE.match(sql):
+                location = query_location() if self.trace else None
+                self.queries.append(RecordedQuery(sql, time.perf_counter() - started, location))
+
+    @contextmanager
+    def record(self):
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(self))
+            yield self
+
+    def __len__(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(query.duration for query in self.queries)
+
+    def n_plus_one(self, threshold=None):
+        """Groupes de requêtes de même structure répétées au moins `threshold` fois."""
+        threshold = threshold or _setting('BLOG_QUERY_N_PLUS_ONE_THRESHOLD', 5)
+        if len(self.queries) < threshold:
+            return []
+        # Le SQL exact se répète déjà (paramètres à part) : empreinte par SQL distinct
+        fingerprints = {sql: fingerprint(sql) for sql in {query.sql for query in self.queries}}
+        counts = Counter(fingerprints[query.sql] for query in self.queries)
+        groups = []
+        for print_, count in counts.most_common():
+            if count < threshold:
+                break
+            locations = Counter(
+                query.location for query in self.queries
+                if fingerprints[query.sql] == print_ and query.location
+            )
+            groups.append(QueryGroup(print_, count, locations))
+        return groups
+
+    def report(self, limit=None, threshold=None):
+        lines = [f'{len(self.queries)} requêtes SQL ({self.duration * 1000:.1f} ms)'
+                 + (f', budget {limit}' if limit is not None else '')]
+        for group in self.n_plus_one(threshold):
+            where = ', '.join(f'{location} ×{n}' for location, n in group.locations.most_common(3))
+            lines.append(f'  N+1 ×{group.count} : {group.fingerprint[:200]}' + (f'  [{where}]' if where else ''))
+        if self.trace:
+            for index, query in enumerate(self.queries, 1):
+                lines.append(f'  {index:>3}. {query.sql[:160]}' + (f'  [{query.location}]' if query.location else ''))
+        return '\n'.join(lines)
+
+
+def budget_for(view_name):
+    budgets = _setting('BLOG_QUERY_BUDGETS', {})
+    return budgets.get(view_name, _setting('BLOG_QUERY_BUDGET_DEFAULT', DEFAULT_BUDGET))
+
+
+@contextmanager
+def query_budget(limit, n_plus_one_threshold=None, trace=True):
+    """Échoue (QueryBudgetExceeded) si le bloc dépasse `limit` requêtes ou contient un N+1."""
+    recorder = QueryRecorder(trace=trace)
+    with recorder.record():
+        yield recorder
+    if len(recorder) > limit or recorder.n_plus_one(n_plus_one_threshold):
+        raise QueryBudgetExceeded(recorder.report(limit, n_plus_one_threshold))
+
+
+class QueryBudgetMiddleware:
+    """Compare les requêtes SQL de chaque requête HTTP au budget de sa vue."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = _setting('BLOG_QUERY_BUDGET_MODE', 'log')
+        if mode == 'off':
+            return self.get_response(request)
+        recorder = QueryRecorder(trace=_setting('BLOG_QUERY_BUDGET_TRACE', settings.DEBUG))
+        with recorder.record():
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.url_name if match else None
+        if view_name is None:
+            return response
+        limit = budget_for(view_name)
+        groups = recorder.n_plus_one()
+        if len(recorder) > limit or groups:
+            message = f'Budget de requêtes dépassé pour {view_name} ({request.path})\n' + recorder.report(limit)
+            if mode == 'raise':
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
@@ -0,0 +1,67 @@
+"""Routage des tables d'analyse vers leur propre base SQLite.
+
+Les vues d'articles (ArticleView), les sketches de visiteurs
+(VisitorSketch) et le journal des lots de vues (PendingViewCount) sont
+écrits en continu : dans un fichier à part, ils ne prennent plus le verrou
+d'écriture des commentaires, likes et articles.
+
+La base d'analyse n'est utilisée que si BLOG_ANALYTICS_DB nomme un alias
+de DATABASES, à définir après `manage.py migrate --database=<alias>` : un
+simple `migrate` ne crée pas ses tables. Sinon tout reste dans 'default'. Les
+clés étrangères vers Article / User n'ont pas de contrainte en base
+(db_constraint=False) et pas de suppression en cascade : blog.signals
+supprime les lignes concernées après la suppression d'un article ou d'un
+utilisateur. Les jointures entre les deux bases sont impossibles
+(select_related / filtre sur article__... depuis ces modèles).
+"""
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+ANALYTICS_MODELS = {'blog.articleview', 'blog.visitorsketch', 'blog.pendingviewcount'}
+
+
+def analytics_db():
+    """Alias de la base des tables d'analyse ('default' si elle n'est pas configurée)."""
+    alias = getattr(settings, 'BLOG_ANALYTICS_DB', None)
+    if not alias:
+        return 'default'
+    if alias not in settings.DATABASES:
+        raise ImproperlyConfigured(f"BLOG_ANALYTICS_DB : base {alias!r} absente de DATABASES")
+    return alias
+
+
+def is_analytics_model(model):
+    """`model` : modèle ou instance (request.user est un objet paresseux, pas un User)."""
+    return model._meta.label_lower in ANALYTICS_MODELS
+
+
+class AnalyticsRouter:
+    def db_for_read(self, model, **hints):
+        if is_analytics_model(model):
+            return analytics_db()
+        # view.article : sans routeur, Django chercherait l'article dans la base de la vue
+        instance = hints.get('instance')
+        if instance is not None and is_analytics_model(instance):
+            return 'default'
+        return None
+
+    def db_for_write(self, model, **hints):
+        return self.db_for_read(model, **hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Vue -> article / utilisateur : relation logique, sans contrainte en base
+        if is_analytics_model(obj1) or is_analytics_model(obj2):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        target = analytics_db()
+        if target == 'default':
+            return None
+        is_analytics = f'{app_label}.{model_name}' in ANALYTICS_MODELS
+        if db == target:
+            # Seules les tables d'analyse (et pas les RunPython sans modèle)
+            return is_analytics
+        if is_analytics:
+            return False
+        return None
@@ -0,0 +1,240 @@
+"""Moteur de recherche plein texte basé sur SQLite FTS5.
+
+L'index `blog_article_fts` contient le titre, le contenu et l'auteur des
+articles publiés (rowid = id de l'article). Il est tenu à jour par les
+signaux de blog.signals et reconstruit par `manage.py rebuild_search_index`.
+Le tokenizer unicode61 avec remove_diacritics rend la recherche insensible
+aux accents (« ete » trouve « été ») ; le dernier mot est cherché en préfixe.
+
+Sans FTS5 (autre base que SQLite, ou SQLite compilé sans FTS5), les
+fonctions retombent sur l'ancienne recherche `icontains`.
+"""
+import re
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Article
+
+FTS_TABLE = 'blog_article_fts'
+# Poids BM25 des colonnes : titre, contenu, auteur
+BM25_WEIGHTS = (10.0, 1.0, 5.0)
+SNIPPET_TOKENS = 24
+
+_HIGHLIGHT_START = '\x02'
+_HIGHLIGHT_END = '\x03'
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+CREATE_TABLE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "title, content, author, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+)
+
+_available = None
+
+
+def fts_available():
+    """True si la base par défaut est SQLite et que l'index FTS5 existe."""
+    global _available
+    if _available is None:
+        if connection.vendor != 'sqlite':
+            _available = False
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+                _available = cursor.fetchone() is not None
+    return _available
+
+
+def reset_availability_cache():
+    global _available
+    _available = None
+
+
+def build_match_query(query):
+    """Transforme la saisie utilisateur en requête MATCH FTS5 sûre.
+
+    Chaque mot est cité (aucune syntaxe FTS5 n'est interprétée) ; tous les
+    mots sont requis et le dernier est cherché en préfixe.
+    """
+    tokens = _TOKEN_RE.findall(query or '')
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def index_article(article):
+    """Ajoute ou met à jour un article dans l'index (le retire s'il n'est pas publié)."""
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [article.pk])
+        if article.status == 'published':
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, content, author) VALUES (%s, %s, %s, %s)",
+                [article.pk, article.title, article.content, article.author.username],
+            )
+
+
+def remove_article(article_id):
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [article_id])
+
+
+def rebuild_index(chunk_size=2000):
+    """Reconstruit entièrement l'index ; retourne le nombre d'articles indexés."""
+    if connection.vendor != 'sqlite':
+        return 0
+    reset_availability_cache()
+    rows = (
+        Article.objects.filter(status='published')
+        .order_by()
+        .values_list('pk', 'title', 'content', 'author__username')
+        .iterator(chunk_size=chunk_size)
+    )
+    indexed = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+        cursor.execute(CREATE_TABLE_SQL)
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                cursor.executemany(
+                    f"INSERT INTO {FTS_TABLE} (rowid, title, content, author) VALUES (%s, %s, %s, %s)", batch
+                )
+                indexed += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, content, author) VALUES (%s, %s, %s, %s)", batch
+            )
+            indexed += len(batch)
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+    reset_availability_cache()
+    return indexed
+
+
+def filter_articles(queryset, query):
+    """Restreint un queryset d'articles à ceux qui correspondent à la recherche."""
+    match = build_match_query(query)
+    if match is None:
+        # Aucun mot cherchable (« !!! ») : aucun résultat, pas toute la liste
+        return queryset.none()
+    if not fts_available():
+        return queryset.filter(
+            Q(title__icontains=query) |
+            Q(content__icontains=query) |
+            Q(author__username__icontains=query)
+        )
+    return queryset.filter(
+        pk__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", (match,))
+    )
+
+
+class RankedArticles:
+    """Articles d'un queryset triés par score BM25, paginables comme un queryset.
+
+    Chaque tranche lit son classement dans l'index (ORDER BY bm25 avec
+    LIMIT / OFFSET, restreint aux ids du queryset par une sous-requête non
+    corrélée), puis les articles de la page par clé primaire : le tri porte
+    sur tous les résultats, sans plafond. Une sous-requête corrélée ou une
+    jointure relançait la recherche pour chaque article, d'un coût
+    quadratique sur un mot fréquent.
+    """
+    ordered = True
+
+    def __init__(self, queryset, match):
+        self.queryset = queryset
+        self.match = match
+        self._pages = {}
+
+    def count(self):
+        return self.queryset.count()
+
+    def __len__(self):
+        return self.count()
+
+    def _ranked_ids(self, offset, limit):
+        # Mémorisé : les validateurs HTTP et la vue lisent la même page
+        if (offset, limit) not in self._pages:
+            weights = ', '.join(str(w) for w in BM25_WEIGHTS)
+            subquery, params = self.queryset.order_by().values('pk').query.sql_with_params()
+            # +rowid : la contrainte n'est pas transmise à FTS5, qui relancerait
+            # la recherche pour chaque id de la sous-requête
+            sql = (
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND +rowid IN ({subquery}) "
+                f"ORDER BY bm25({FTS_TABLE}, {weights}), rowid DESC LIMIT %s OFFSET %s"
+            )
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [self.match, *params, -1 if limit is None else limit, offset])
+                self._pages[offset, limit] = [row[0] for row in cursor.fetchall()]
+        return self._pages[offset, limit]
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        offset = key.start or 0
+        limit = None if key.stop is None else max(key.stop - offset, 0)
+        ids = self._ranked_ids(offset, limit)
+        # Rang = position de l'id dans la liste ",12,7,...," (une seule valeur liée)
+        ranking = ',' + ','.join(map(str, ids)) + ','
+        rank = RawSQL(f"instr(%s, ',' || {Article._meta.db_table}.id || ',')", (ranking,))
+        return self.queryset.filter(pk__in=ids).annotate(search_rank=rank).order_by('search_rank')
+
+
+def order_by_relevance(queryset, query):
+    """Trie par score BM25 (les meilleurs résultats d'abord) ; voir RankedArticles."""
+    match = build_match_query(query)
+    if match is None or not fts_available():
+        return queryset.order_by('-created_at')
+    return RankedArticles(queryset, match)
+
+
+def _highlighted(text):
+    html = escape(text)
+    return mark_safe(html.replace(_HIGHLIGHT_START, '<mark>').replace(_HIGHLIGHT_END, '</mark>'))
+
+
+def highlight_articles(articles, query):
+    """Ajoute `search_title` et `search_snippet` (HTML surligné) aux articles donnés.
+
+    Une seule requête FTS pour toute la page de résultats.
+    """
+    articles = list(articles)
+    match = build_match_query(query)
+    for article in articles:
+        article.search_title = None
+        article.search_snippet = None
+    if match is None or not articles or not fts_available():
+        return articles
+
+    by_id = {article.pk: article for article in articles}
+    placeholders = ', '.join(['%s'] * len(by_id))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, highlight({FTS_TABLE}, 0, %s, %s), "
+            f"snippet({FTS_TABLE}, 1, %s, %s, '…', {SNIPPET_TOKENS}) "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid IN ({placeholders})",
+            [_HIGHLIGHT_START, _HIGHLIGHT_END, _HIGHLIGHT_START, _HIGHLIGHT_END, match, *by_id],
+        )
+        for article_id, title, snippet in cursor.fetchall():
+            article = by_id[article_id]
+            article.search_title = _highlighted(title)
+            article.search_snippet = _highlighted(snippet)
+    return articles
+
+
+def search_articles(query, limit=10):
+    """Articles publiés les plus pertinents, surlignés, en deux requêtes."""
+    articles = Article.objects.filter(status='published').select_related('author').prefetch_related('tags')
+    articles = order_by_relevance(filter_articles(articles, query), query)[:limit]
+    return highlight_articles(articles, query)
@@ -1,16 +1,263 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_init, post_save, post_delete, pre_delete, m2m_changed
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserProfile
+from django.db import transaction
+from .models import Article, ArticleView, AuthorStats, Comment, Tag, UserProfile, VisitorSketch
+from .counters import (
+    article_authors, invalidate_popular_tags, popular_tags_contain, refresh_article_counters,
+    refresh_author_stats, refresh_tag_counts,
+)
+from . import autocomplete, imagequeue, images, media, pagecache, search
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
         UserProfile.objects.create(user=instance)
 
+@receiver(post_save, sender=User)
+def create_author_stats(sender, instance, created, **kwargs):
+    if created:
+        AuthorStats.objects.get_or_create(user=instance)
+
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
     if hasattr(instance, 'profile'):
         instance.profile.save()
     else:
-        UserProfile.objects.create(user=instance)
\ No newline at end of file
+        UserProfile.objects.create(user=instance)
+
+# Compteurs dénormalisés de l'article (likes_count / comments_count)
+
+def _liked_article_ids(instance, reverse, pk_set):
+    if reverse:
+        return pk_set or set()
+    return {instance.pk}
+
+@receiver(m2m_changed, sender=Article.likes.through)
+def update_likes_count(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        # Mémoriser les articles concernés avant que le lien ne disparaisse
+        if reverse:
+            instance._cleared_like_ids = set(instance.blog_posts.values_list('pk', flat=True))
+        else:
+            instance._cleared_like_ids = {instance.pk}
+    elif action == 'post_clear':
+        _refresh_likes(getattr(instance, '_cleared_like_ids', ()))
+    elif action in ('post_add', 'post_remove'):
+        _refresh_likes(_liked_article_ids(instance, reverse, pk_set))
+
+def _refresh_likes(article_ids):
+    refresh_article_counters(article_ids, comments=False)
+    refresh_author_stats(article_authors(article_ids), comments=False)
+
+@receiver(m2m_changed, sender=Article.likes.through)
+def invalidate_liked_lists(sender, instance, action, reverse, pk_set, **kwargs):
+    # Liste « articles aimés » du profil des utilisateurs concernés
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        user_ids = (instance.pk,) if reverse else (pk_set or ())
+        pagecache.invalidate(*(f'likes:{pk}' for pk in user_ids))
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        refresh_article_counters([instance.article_id], likes=False)
+        refresh_author_stats([instance.author_id], articles=False)
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    refresh_article_counters([instance.article_id], likes=False)
+    refresh_author_stats([instance.author_id], articles=False)
+
+@receiver(pre_delete, sender=User)
+def remember_user_likes(sender, instance, **kwargs):
+    # Les lignes de la table de liaison sont supprimées en cascade sans signal
+    instance._liked_article_ids = set(instance.blog_posts.values_list('pk', flat=True))
+
+@receiver(post_delete, sender=User)
+def refresh_likes_after_user_delete(sender, instance, **kwargs):
+    _refresh_likes(getattr(instance, '_liked_article_ids', ()))
+
+# Index de recherche plein texte
+
+@receiver(post_save, sender=Article)
+def index_article_for_search(sender, instance, **kwargs):
+    search.index_article(instance)
+
+@receiver(post_delete, sender=Article)
+def remove_article_from_search(sender, instance, **kwargs):
+    search.remove_article(instance.pk)
+
+# Index d'autocomplétion (mis à jour seulement s'il est déjà construit)
+
+@receiver(post_save, sender=Article)
+def update_autocomplete_article(sender, instance, **kwargs):
+    if not autocomplete.is_built():
+        return
+    if instance.status == 'published':
+        autocomplete.index.add(autocomplete.article_suggestion(
+            instance.pk, instance.title, instance.author.username, instance.views, instance.likes_count
+        ))
+        autocomplete.index.add(autocomplete.author_suggestion(instance.author_id, instance.author.username))
+    else:
+        autocomplete.index.remove(autocomplete.ARTICLE, instance.pk)
+
+@receiver(post_delete, sender=Article)
+def remove_autocomplete_article(sender, instance, **kwargs):
+    if autocomplete.is_built():
+        autocomplete.index.remove(autocomplete.ARTICLE, instance.pk)
+
+@receiver(post_save, sender=Tag)
+def update_autocomplete_tag(sender, instance, **kwargs):
+    if autocomplete.is_built():
+        autocomplete.index.add(autocomplete.tag_suggestion(instance.pk, instance.name, instance.slug))
+
+@receiver(post_delete, sender=Tag)
+def remove_autocomplete_tag(sender, instance, **kwargs):
+    if autocomplete.is_built():
+        autocomplete.index.remove(autocomplete.TAG, instance.pk)
+
+@receiver(post_delete, sender=User)
+def remove_autocomplete_author(sender, instance, **kwargs):
+    if autocomplete.is_built():
+        autocomplete.index.remove(autocomplete.AUTHOR, instance.pk)
+
+# Compteurs des tags (published_count), statistiques d'auteur et bloc des tags populaires
+
+@receiver(m2m_changed, sender=Article.tags.through)
+def update_tag_counts(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        if reverse:
+            instance._cleared_tag_ids = {instance.pk}
+        else:
+            instance._cleared_tag_ids = set(instance.tags.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        refresh_tag_counts(getattr(instance, '_cleared_tag_ids', ()))
+    elif action in ('post_add', 'post_remove'):
+        refresh_tag_counts({instance.pk} if reverse else (pk_set or ()))
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        # Les cartes d'articles affichent leurs tags
+        article_ids = (pk_set or ()) if reverse else (instance.pk,)
+        pagecache.invalidate(*(f'article:{pk}' for pk in article_ids))
+
+@receiver(post_save, sender=Article)
+def update_counts_on_status_change(sender, instance, created, **kwargs):
+    previous_status = getattr(instance, '_loaded_status', None)
+    instance._loaded_status = instance.status
+    if created:
+        # Un nouvel article n'a pas encore de tags
+        if instance.status == 'published':
+            refresh_author_stats([instance.author_id], comments=False)
+            pagecache.invalidate('articles')
+    elif previous_status != instance.status:
+        refresh_tag_counts(instance.tags.values_list('pk', flat=True))
+        refresh_author_stats([instance.author_id], comments=False)
+        # L'article entre dans les listes ou en sort
+        pagecache.invalidate('articles')
+
+@receiver(pre_delete, sender=Article)
+def remember_article_tags(sender, instance, **kwargs):
+    instance._deleted_tag_ids = set(instance.tags.values_list('pk', flat=True))
+
+@receiver(post_delete, sender=Article)
+def update_counts_after_delete(sender, instance, **kwargs):
+    refresh_tag_counts(getattr(instance, '_deleted_tag_ids', ()))
+    refresh_author_stats([instance.author_id], comments=False)
+
+@receiver(post_save, sender=Tag)
+def invalidate_popular_tags_on_save(sender, instance, created, **kwargs):
+    # Nom / couleur affichés, ou nouveau tag pouvant compléter un bloc incomplet
+    if created or popular_tags_contain(instance.pk):
+        invalidate_popular_tags()
+
+@receiver(post_delete, sender=Tag)
+def invalidate_popular_tags_on_delete(sender, instance, **kwargs):
+    if popular_tags_contain(instance.pk):
+        invalidate_popular_tags()
+
+# Cache des pages anonymes (les compteurs invalident eux-mêmes leurs pages)
+
+@receiver(post_save, sender=Article)
+def invalidate_article_pages(sender, instance, **kwargs):
+    pagecache.invalidate(f'article:{instance.pk}')
+
+@receiver(post_delete, sender=Article)
+def invalidate_article_pages_on_delete(sender, instance, **kwargs):
+    pagecache.invalidate(f'article:{instance.pk}', 'articles')
+
+@receiver(post_save, sender=Comment)
+def invalidate_pages_on_comment_edit(sender, instance, created, **kwargs):
+    # Création et suppression passent par refresh_article_counters
+    if not created:
+        pagecache.invalidate(f'article:{instance.article_id}')
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=UserProfile)
+def invalidate_profile_version(sender, instance, **kwargs):
+    user_id = instance.pk if sender is User else instance.user_id
+    pagecache.invalidate(f'profile:{user_id}')
+
+@receiver(post_save, sender=Tag)
+def invalidate_tag_pages(sender, instance, created, **kwargs):
+    # 'tags' : liste des tags, et version des validateurs HTTP des pages qui les affichent
+    pagecache.invalidate(f'tag:{instance.pk}', 'tags')
+
+@receiver(post_delete, sender=Tag)
+def invalidate_tag_pages_on_delete(sender, instance, **kwargs):
+    pagecache.invalidate(f'tag:{instance.pk}', 'tags')
+
+# Références des fichiers stockés par contenu (avant les déclinaisons, qui
+# peuvent repointer le champ vers l'original réécrit)
+
+@receiver(post_init, sender=Article)
+@receiver(post_init, sender=UserProfile)
+def remember_media_names(sender, instance, **kwargs):
+    media.remember(instance)
+
+@receiver(post_save, sender=Article)
+@receiver(post_save, sender=UserProfile)
+def update_media_references(sender, instance, created, **kwargs):
+    media.instance_saved(instance, created)
+
+@receiver(post_delete, sender=Article)
+@receiver(post_delete, sender=UserProfile)
+def release_media_references(sender, instance, **kwargs):
+    media.instance_deleted(instance)
+
+# Déclinaisons des images (AVIF / WebP) : programmées quand le fichier change
+
+@receiver(post_save, sender=Article)
+def refresh_article_image_variants(sender, instance, raw=False, **kwargs):
+    if not raw:
+        imagequeue.schedule(instance, 'image')
+
+@receiver(post_save, sender=UserProfile)
+def refresh_profile_image_variants(sender, instance, raw=False, **kwargs):
+    if not raw:
+        imagequeue.schedule(instance, 'avatar')
+        imagequeue.schedule(instance, 'cover_image')
+
+@receiver(post_delete, sender=Article)
+def delete_article_image_variants(sender, instance, **kwargs):
+    images.delete_variants(instance.image.storage, instance.image_variants)
+
+@receiver(post_delete, sender=UserProfile)
+def delete_profile_image_variants(sender, instance, **kwargs):
+    images.delete_variants(instance.avatar.storage, instance.avatar_variants)
+    images.delete_variants(instance.cover_image.storage, instance.cover_image_variants)
+
+# Données d'analyse (base séparée, sans cascade) : supprimées après le commit
+# de la suppression, qui peut encore être annulée jusque-là
+
+@receiver(post_delete, sender=Article)
+def delete_article_analytics(sender, instance, **kwargs):
+    article_id = instance.pk
+    transaction.on_commit(lambda: _delete_analytics(article_id=article_id))
+
+@receiver(post_delete, sender=User)
+def delete_user_analytics(sender, instance, **kwargs):
+    user_id = instance.pk
+    transaction.on_commit(lambda: ArticleView.objects.filter(user_id=user_id).delete())
+
+def _delete_analytics(article_id):
+    ArticleView.objects.filter(article_id=article_id).delete()
+    VisitorSketch.objects.filter(article_id=article_id).delete()
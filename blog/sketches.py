@@ -0,0 +1,156 @@
+"""Structures probabilistes pour le comptage des visiteurs uniques.
+
+- HyperLogLog : cardinalité approchée à mémoire fixe (2**precision octets),
+  erreur standard 1.04 / sqrt(2**precision) (~1,6 % pour precision=12).
+- RotatingBloomFilter : « ce visiteur a-t-il déjà été compté récemment ? »
+  sur une fenêtre glissante, sans faux négatifs.
+"""
+import hashlib
+import math
+import time
+import zlib
+
+HLL_DEFAULT_PRECISION = 12
+
+
+def _hash64(value):
+    digest = hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+class HyperLogLog:
+    """Sketch HyperLogLog sur un hachage 64 bits."""
+
+    def __init__(self, precision=HLL_DEFAULT_PRECISION, registers=None):
+        if not 4 <= precision <= 16:
+            raise ValueError('precision doit être comprise entre 4 et 16')
+        self.precision = precision
+        self.size = 1 << precision
+        if registers is None:
+            registers = bytearray(self.size)
+        elif len(registers) != self.size:
+            raise ValueError('Nombre de registres incompatible avec la précision')
+        self.registers = bytearray(registers)
+
+    @property
+    def standard_error(self):
+        return 1.04 / math.sqrt(self.size)
+
+    def add(self, value):
+        x = _hash64(value)
+        index = x >> (64 - self.precision)
+        remaining = x & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remaining.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return True
+        return False
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError('Impossible de fusionner des sketches de précisions différentes')
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        m = self.size
+        if m == 16:
+            alpha = 0.673
+        elif m == 32:
+            alpha = 0.697
+        elif m == 64:
+            alpha = 0.709
+        else:
+            alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Correction petites cardinalités (linear counting)
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def __len__(self):
+        return self.count()
+
+    def to_bytes(self):
+        """Sérialisation compacte : précision + registres compressés."""
+        return bytes([self.precision]) + zlib.compress(bytes(self.registers))
+
+    @classmethod
+    def from_bytes(cls, data):
+        if not data:
+            return cls()
+        data = bytes(data)
+        return cls(precision=data[0], registers=zlib.decompress(data[1:]))
+
+
+class BloomFilter:
+    """Filtre de Bloom classique (double hachage)."""
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = capacity
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(str(value).encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:], 'big') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, value):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(value))
+
+    def add(self, value):
+        """Ajoute value ; retourne False si elle était (probablement) déjà présente."""
+        added = False
+        for p in self._positions(value):
+            mask = 1 << (p & 7)
+            if not self.bits[p >> 3] & mask:
+                self.bits[p >> 3] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+
+class RotatingBloomFilter:
+    """Deux générations de filtres de Bloom couvrant une fenêtre de `window` secondes.
+
+    Une valeur ajoutée reste reconnue pendant au moins `window` secondes et au
+    plus 2 * `window` secondes ; la mémoire est bornée par la capacité.
+    """
+
+    def __init__(self, window=1800, capacity=100000, error_rate=0.01, clock=time.monotonic):
+        self.window = window
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._clock = clock
+        self._rotated_at = clock()
+        self._current = BloomFilter(capacity, error_rate)
+        self._previous = BloomFilter(capacity, error_rate)
+
+    def _rotate_if_needed(self):
+        now = self._clock()
+        if now - self._rotated_at >= self.window or self._current.count >= self.capacity:
+            self._previous = self._current
+            self._current = BloomFilter(self.capacity, self.error_rate)
+            self._rotated_at = now
+
+    def __contains__(self, value):
+        self._rotate_if_needed()
+        return value in self._current or value in self._previous
+
+    def add(self, value):
+        """Ajoute value ; retourne False si elle a déjà été vue dans la fenêtre."""
+        self._rotate_if_needed()
+        if value in self._previous:
+            self._current.add(value)
+            return False
+        return self._current.add(value)
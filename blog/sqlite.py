@@ -0,0 +1,90 @@
+"""Profil SQLite de production : pragmas à chaque connexion, écritures sérialisées.
+
+À l'ouverture d'une connexion SQLite (connexions persistantes : CONN_MAX_AGE),
+BLOG_SQLITE_PRAGMAS est appliqué. Le profil par défaut passe en WAL : les
+lectures ne bloquent plus l'écrivain ni l'inverse, seuls deux écrivains
+s'attendent (busy_timeout). BLOG_SQLITE_PRAGMAS = {} rend le comportement
+d'origine (WAL est déconseillé sur un système de fichiers réseau). En WAL,
+SQLite écrit à côté de la base les fichiers -wal et -shm (non versionnés,
+comme la base elle-même).
+
+En WAL, une transaction qui lit puis écrit peut encore échouer aussitôt
+(« database is locked ») si un autre processus a écrit entre-temps :
+serialized_write() fait passer les écritures fréquentes (vues, likes, file
+des images) une à une par processus et rejoue la transaction dans ce cas.
+
+`manage.py benchmark_sqlite` compare les débits avec et sans ce profil.
+"""
+import logging
+import random
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'wal',
+    # Sûr en WAL : seule une coupure de courant peut perdre les derniers commits
+    'synchronous': 'normal',
+    'busy_timeout': 5000,  # ms d'attente du verrou d'écriture
+    'mmap_size': 128 * 1024 * 1024,
+    'cache_size': -32000,  # négatif : en Kio, par connexion
+    'temp_store': 'memory',
+}
+
+_write_lock = threading.RLock()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def apply_pragmas(cursor, pragmas):
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(connection_created)
+def configure_connection(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        apply_pragmas(cursor, _setting('BLOG_SQLITE_PRAGMAS', DEFAULT_PRAGMAS))
+
+
+def is_locked_error(exc):
+    return isinstance(exc, OperationalError) and 'locked' in str(exc)
+
+
+def serialized_write(func=None, *, using=DEFAULT_DB_ALIAS):
+    """Décorateur : `func` s'exécute dans sa propre transaction, une écriture
+    à la fois par processus, et est rejouée si la base est verrouillée.
+
+    Appelée dans une transaction englobante, `func` s'exécute telle quelle
+    (on ne peut pas rejouer une partie de transaction).
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            connection = connections[using]
+            if connection.vendor != 'sqlite' or connection.in_atomic_block:
+                return func(*args, **kwargs)
+            retries = _setting('BLOG_SQLITE_WRITE_RETRIES', 5)
+            for attempt in range(retries + 1):
+                try:
+                    with _write_lock, transaction.atomic(using=using):
+                        return func(*args, **kwargs)
+                except OperationalError as exc:
+                    if not is_locked_error(exc) or attempt == retries:
+                        raise
+                    logger.info('Base verrouillée, nouvel essai de %s (%d)', func.__qualname__, attempt + 1)
+                    # Attente croissante, dispersée pour désynchroniser les processus
+                    time.sleep(min(0.05 * 2 ** attempt, 1.0) * random.uniform(0.5, 1.5))
+        return wrapper
+    return decorator(func) if func is not None else decorator
@@ -0,0 +1,153 @@
+"""Stockage des médias par contenu (empreinte SHA-256).
+
+Un fichier envoyé est enregistré sous cas/ab/cd/<sha256>.<ext>, quels que
+soient son nom et son upload_to : deux envois identiques partagent le même
+fichier sur le disque, et une URL désigne un contenu qui ne changera jamais
+(servie avec Cache-Control: immutable, voir is_immutable()).
+
+Le partage interdit de supprimer un fichier dès qu'un article ou un profil
+le quitte : blog.media compte les références (modèle MediaBlob) et supprime
+le fichier, avec ses déclinaisons, quand plus personne ne l'utilise. Un
+envoi qui retrouve un contenu déjà présent rafraîchit sa date de
+modification : delete_if_stale() garde un fichier réutilisé récemment, dont
+la référence n'est peut-être pas encore validée.
+
+Les déclinaisons (blog.images) gardent le nom qu'on leur donne : il est
+déjà dérivé de l'empreinte de leur source.
+
+CompressedManifestStaticFilesStorage (fichiers statiques) ajoute au nommage
+par empreinte de Django des copies .gz / .br écrites par collectstatic,
+servies par blog.mediaserve.serve_static.
+"""
+import hashlib
+import os
+import posixpath
+import time
+import uuid
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+
+from .compression import SUFFIXES, available_encodings, compress, is_compressible
+
+CAS_DIR = 'cas'
+# Répertoires écrits sous leur nom exact (fichiers dérivés d'un fichier CAS)
+PASSTHROUGH_DIRS = ('variants',)
+
+
+def content_name(digest, extension=''):
+    """Nom d'un contenu d'empreinte `digest` : cas/ab/cd/<digest><extension>."""
+    return f'{CAS_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+
+def is_content_addressed(name):
+    return bool(name) and name.startswith(f'{CAS_DIR}/')
+
+
+def is_immutable(name):
+    """True si le contenu derrière `name` ne peut pas changer (cache HTTP illimité)."""
+    return is_content_addressed(name) or name.startswith(tuple(f'{d}/{CAS_DIR}/' for d in PASSTHROUGH_DIRS))
+
+
+def file_digest(content):
+    """Empreinte SHA-256 d'un fichier Django, lu par morceaux ; le fichier est rembobiné."""
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage qui nomme les fichiers d'après leur contenu."""
+
+    content_addressed = True
+
+    def _passthrough(self, name):
+        return name.split('/', 1)[0] in PASSTHROUGH_DIRS
+
+    def _save(self, name, content):
+        if self._passthrough(name):
+            return super()._save(name, content)
+        extension = posixpath.splitext(name)[1].lower()
+        target = content_name(file_digest(content), extension)
+        if self._touch(target):
+            # Contenu déjà présent : rien à écrire (s'il vient d'être supprimé,
+            # le toucher échoue et le contenu est réécrit)
+            return target
+        # Écriture sous un nom temporaire puis renommage atomique : deux envois
+        # simultanés du même contenu produisent le même fichier, sans erreur
+        temporary = super()._save(f'{CAS_DIR}/tmp/{uuid.uuid4().hex}{extension}', content)
+        os.makedirs(os.path.dirname(self.path(target)), exist_ok=True)
+        os.replace(self.path(temporary), self.path(target))
+        return target
+
+    def _touch(self, name):
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def delete_if_stale(self, name, max_age):
+        """Supprime `name` s'il n'a été ni écrit ni réutilisé depuis `max_age` secondes.
+
+        Le fichier est d'abord écarté par un renommage atomique : un envoi du
+        même contenu l'a touché avant (il est remis en place) ou le réécrit
+        après. Retourne False si le fichier, récent, a été gardé.
+        """
+        path = self.path(name)
+        removed = self.path(f'{CAS_DIR}/tmp/{uuid.uuid4().hex}')
+        os.makedirs(os.path.dirname(removed), exist_ok=True)
+        try:
+            os.rename(path, removed)
+        except FileNotFoundError:
+            return True
+        if time.time() - os.path.getmtime(removed) < max_age:
+            os.replace(removed, path)
+            return False
+        os.remove(removed)
+        return True
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Noms avec empreinte (manifeste staticfiles.json) et copies gzip / brotli.
+
+    Une copie n'est gardée que si elle fait gagner au moins
+    MIN_COMPRESSION_GAIN de la taille : le serveur sert alors l'original.
+    """
+
+    MIN_COMPRESSION_GAIN = 0.05
+    # Fichier absent du manifeste (collectstatic pas encore relancé) : nom
+    # calculé à la volée plutôt qu'une erreur 500
+    manifest_strict = False
+
+    def post_process(self, paths, dry_run=False, **options):
+        names = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if not isinstance(processed, Exception):
+                names.update(n for n in (name, hashed_name) if n)
+            yield name, hashed_name, processed
+        if not dry_run:
+            for name in sorted(names):
+                if is_compressible(name):
+                    self._write_compressed(name)
+
+    def _write_compressed(self, name):
+        with self.open(name) as f:
+            data = f.read()
+        for encoding in available_encodings():
+            compressed_name = name + SUFFIXES[encoding]
+            if self.exists(compressed_name):
+                self.delete(compressed_name)
+            compressed = compress(data, encoding)
+            if len(compressed) <= len(data) * (1 - self.MIN_COMPRESSION_GAIN):
+                self._save(compressed_name, ContentFile(compressed))
+
+    def is_hashed(self, name):
+        """True si `name` est un nom avec empreinte connu du manifeste."""
+        if getattr(self, '_hashed_names', None) is None:
+            self._hashed_names = set(self.hashed_files.values())
+        return name in self._hashed_names
@@ -0,0 +1,67 @@
+"""Images responsives à partir des manifestes de blog.images.
+
+    {% load blog_images %}
+    {% picture article.image sizes="(max-width: 768px) 100vw, 50vw" class="card-img-top" %}
+    <img srcset="{{ article.image|srcset:'webp' }}" ...>
+
+Sans déclinaisons prêtes (ou si le manifeste ne correspond plus au fichier),
+picture rend simplement l'original.
+"""
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from blog.images import FORMATS, MIME_TYPES, manifest_field
+
+register = template.Library()
+
+
+def _manifest(fieldfile):
+    if not fieldfile:
+        return {}
+    manifest = getattr(fieldfile.instance, manifest_field(fieldfile.field.name), None) or {}
+    return manifest if manifest.get('source') == fieldfile.name else {}
+
+
+def _srcset(fieldfile, manifest, extension):
+    entries = manifest.get('variants', {}).get(extension, [])
+    return ', '.join(f'{fieldfile.storage.url(name)} {width}w' for width, _, name in entries)
+
+
+@register.filter
+def srcset(fieldfile, extension='webp'):
+    """Attribut srcset des déclinaisons `extension` ('avif' ou 'webp') de l'image."""
+    return _srcset(fieldfile, _manifest(fieldfile), extension)
+
+
+@register.simple_tag
+def picture(fieldfile, sizes='100vw', **attrs):
+    """<picture> AVIF / WebP avec repli sur l'original ; `attrs` va sur la balise <img>.
+
+    width / height sont ceux de l'original (réservation de la place, pas de
+    décalage de mise en page) sauf s'ils sont fournis ; loading="lazy" par défaut.
+    """
+    if not fieldfile:
+        return ''
+    manifest = _manifest(fieldfile)
+    if manifest:
+        attrs.setdefault('width', manifest['width'])
+        attrs.setdefault('height', manifest['height'])
+    attrs.setdefault('loading', 'lazy')
+    attrs.setdefault('decoding', 'async')
+    img = format_html(
+        '<img src="{}" {}>',
+        fieldfile.url,
+        format_html_join(' ', '{}="{}"', sorted(attrs.items())),
+    )
+    sources = [
+        (MIME_TYPES[extension], _srcset(fieldfile, manifest, extension), sizes)
+        for extension, _, _ in FORMATS
+        if manifest.get('variants', {}).get(extension)
+    ]
+    if not sources:
+        return img
+    return format_html(
+        '<picture>{}{}</picture>',
+        format_html_join('', '<source type="{}" srcset="{}" sizes="{}">', sources),
+        img,
+    )
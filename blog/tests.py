@@ -1,3 +1,1046 @@
-from django.test import TestCase
+import gzip
+import io
+import os
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, OperationalError, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from PIL import Image
+
+from . import autocomplete, compression, images, media, mediaserve, pagecache, search, viewcounter
+from .models import (
+    AppliedViewBatch, Article, ArticleView, AuthorStats, Comment, MediaBlob, PendingViewCount, Tag, VisitorSketch,
+)
+from .pagination import decode_cursor, encode_cursor, keyset_page
+from .datagen import Generator, _free_name
+from .likes import Like, liked_article_ids, toggle_like
+from .querybudget import DEFAULT_BUDGET, QueryBudgetExceeded, QueryRecorder, budget_for, fingerprint, query_budget
+from .routers import AnalyticsRouter
+from .sketches import HyperLogLog, RotatingBloomFilter
+from .sqlite import serialized_write
+from .transfer import Importer, export_blog
+
+# Plus de lignes par page que le seuil N+1 : une requête par article se voit
+ARTICLES = 12
+
+# Cache propre aux tests : ni entrées du serveur de développement, ni écritures
+# dans le répertoire partagé BASE_DIR/cache
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(
+    BLOG_PAGE_CACHE_ENABLED=False,
+    BLOG_VIEW_BUFFER_ENABLED=False,
+    BLOG_QUERY_BUDGET_MODE='off',
+    CACHES=TEST_CACHES,
+)
+class QueryBudgetTests(TestCase):
+    """Chaque vue reste dans son budget (BLOG_QUERY_BUDGETS), sans N+1."""
+    databases = {'default', 'analytics'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f'lecteur{i}', password='secret') for i in range(4)]
+        cls.tags = [Tag.objects.create(name=f'Tag {i}') for i in range(3)]
+        cls.articles = []
+        for i in range(ARTICLES):
+            article = Article.objects.create(
+                title=f'Article {i}', content='Lorem ipsum dolor sit amet ' * 30,
+                author=cls.users[i % 4], status='published',
+            )
+            article.tags.set(cls.tags[:1 + i % 3])
+            article.likes.set(cls.users[:i % 4])
+            root = Comment.objects.create(article=article, author=cls.users[0], body='Premier')
+            for j in range(3):
+                Comment.objects.create(article=article, author=cls.users[j], body=f'Réponse {j}', parent=root)
+            cls.articles.append(article)
+        cls.article = cls.articles[0]
+        cls.root_comment = cls.article.comments.get(parent=None)
+        # Favoris du profil consulté
+        for article in cls.articles:
+            article.likes.add(cls.users[0])
+
+    def setUp(self):
+        cache.clear()
+        self.client.login(username='lecteur0', password='secret')
+
+    def assertWithinBudget(self, view_name, url, method='get', **kwargs):
+        with query_budget(budget_for(view_name)):
+            response = getattr(self.client, method)(url, **kwargs)
+        self.assertLess(response.status_code, 400)
+        return response
+
+    def test_article_list(self):
+        for query in ('', '?sort=popular', '?tag=tag-1', '?search=Lorem&page=2'):
+            with self.subTest(query=query):
+                self.assertWithinBudget('article_list', '/' + query)
+
+    def test_article_list_anonymous(self):
+        self.client.logout()
+        self.assertWithinBudget('article_list', '/')
+
+    def test_article_list_more(self):
+        self.assertWithinBudget('article_list_more', '/articles/more/?page=2')
+
+    def test_article_detail(self):
+        self.assertWithinBudget('article_detail', f'/article/{self.article.pk}/')
+
+    def test_article_comments(self):
+        self.assertWithinBudget('article_comments', f'/article/{self.article.pk}/comments/')
+
+    def test_comment_replies(self):
+        self.assertWithinBudget('comment_replies', f'/comments/{self.root_comment.pk}/replies/')
+
+    def test_like_article(self):
+        self.assertWithinBudget('like_article', f'/article/{self.article.pk}/like/', method='post',
+                                HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    def test_comment_post(self):
+        self.assertWithinBudget('article_detail', f'/article/{self.article.pk}/', method='post',
+                                data={'body': 'Nouveau commentaire'})
+
+    def test_tag_list(self):
+        self.assertWithinBudget('tag_list', '/tags/')
+
+    def test_search(self):
+        self.assertWithinBudget('search_articles', '/search/?q=Lorem')
+        self.assertWithinBudget('search_autocomplete', '/search/autocomplete/?q=Art')
+
+    def test_user_profile(self):
+        self.assertWithinBudget('user_profile', '/profile/lecteur0/')
+
+    def test_account_pages(self):
+        self.assertWithinBudget('account_settings', '/account-settings/')
+        self.assertWithinBudget('edit_profile', '/edit-profile/')
+
+    def test_article_forms(self):
+        self.assertWithinBudget('article_create', '/article/new/')
+        self.assertWithinBudget('article_update', f'/article/{self.article.pk}/edit/')
+
+
+@override_settings(CACHES=TEST_CACHES)
+class QueryRecorderTests(TestCase):
+    def test_fingerprint_collapses_parameters(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x' LIMIT 21"),
+            fingerprint("SELECT * FROM t WHERE id IN (%s) AND name = 'y' LIMIT 21"),
+        )
+
+    def test_n_plus_one_reports_location(self):
+        users = [User.objects.create_user(f'auteur{i}') for i in range(6)]
+        for user in users:
+            Article.objects.create(title=user.username, content='...', author=user)
+        recorder = QueryRecorder(trace=True)
+        with recorder.record():
+            for article in Article.objects.all():
+                article.author.username
+        [group] = recorder.n_plus_one(threshold=5)
+        self.assertEqual(group.count, 6)
+        self.assertTrue(all(location.startswith('blog/tests.py:') for location in group.locations))
+
+    def test_budget_exceeded(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            with query_budget(0):
+                User.objects.count()
+
+    def test_budget_for(self):
+        with self.settings(BLOG_QUERY_BUDGETS={'tag_list': 3}):
+            self.assertEqual(budget_for('tag_list'), 3)
+            self.assertEqual(budget_for('inconnue'), DEFAULT_BUDGET)
+            with self.settings(BLOG_QUERY_BUDGET_DEFAULT=7):
+                self.assertEqual(budget_for('inconnue'), 7)
+
+    @override_settings(BLOG_QUERY_BUDGET_MODE='raise', BLOG_QUERY_BUDGETS={'tag_list': 0},
+                       BLOG_PAGE_CACHE_ENABLED=False)
+    def test_middleware_raises(self):
+        Tag.objects.create(name='Django')
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get('/tags/')
+
+
+@override_settings(BLOG_PAGE_CACHE_ENABLED=False, CACHES=TEST_CACHES)
+class KeysetCursorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('auteur')
+        cls.articles = [
+            Article.objects.create(title=f'Article {i % 3}', content='...', author=author, status='published', views=i % 4)
+            for i in range(9)
+        ]
+
+    def test_round_trip(self):
+        article = self.articles[0]
+        for sort_by, value in (('-created_at', article.created_at), ('-views', 3), ('-likes', 0), ('title', 'Été')):
+            with self.subTest(sort_by=sort_by):
+                self.assertEqual(decode_cursor(encode_cursor(sort_by, value, article.pk), sort_by), (value, article.pk))
+
+    def test_rejects_mistyped_values(self):
+        for sort_by, value, pk in (
+            ('-views', 'x', 1), ('-views', True, 1), ('-likes', '3', 1), ('-likes', 2.5, 1), ('title', 3, 1),
+            ('title', None, 1), ('-created_at', 5, 1), ('-created_at', '2024-13-45T00:00:00', 1),
+            ('-views', 3, '1'), ('-views', 3, True),
+        ):
+            with self.subTest(sort_by=sort_by, value=value, pk=pk):
+                self.assertIsNone(decode_cursor(encode_cursor(sort_by, value, pk), sort_by))
+        self.assertIsNone(decode_cursor(encode_cursor('-views', 3, 1), 'title'))
+        self.assertIsNone(decode_cursor('pas du base64 !', '-views'))
+
+    def test_pages_cover_every_article_once(self):
+        published = Article.objects.filter(status='published')
+        for sort_by in ('-created_at', '-views', '-likes', 'title'):
+            with self.subTest(sort_by=sort_by):
+                seen, cursor = [], None
+                while True:
+                    page = keyset_page(published, sort_by, cursor, per_page=4)
+                    seen += [article.pk for article in page]
+                    if not page.has_next:
+                        break
+                    cursor = page.next_cursor
+                self.assertEqual(sorted(seen), sorted(article.pk for article in self.articles))
+                self.assertEqual(len(seen), len(set(seen)))
+
+    def test_crafted_cursor_is_ignored(self):
+        cursor = encode_cursor('-views', 'x', 1)
+        response = self.client.get('/articles/more/', {'sort': '-views', 'cursor': cursor})
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CommentThreadTests(TestCase):
+    def test_deep_thread_keeps_its_order(self):
+        author = User.objects.create_user('auteur')
+        article = Article.objects.create(title='Fil', content='...', author=author, status='published')
+        parent = None
+        for depth in range(40):
+            parent = Comment.objects.create(article=article, author=author, body=f'Niveau {depth}', parent=parent)
+        thread = list(Comment.objects.filter(article=article).order_by('path'))
+        self.assertEqual([comment.depth for comment in thread], list(range(40)))
+        self.assertEqual(parent.depth, 39)
+        self.assertEqual({comment.thread_id for comment in thread}, {thread[0].pk})
+
+
+@override_settings(CACHES=TEST_CACHES)
+class PageCacheTests(SimpleTestCase):
+    def setUp(self):
+        pagecache._cache().clear()
+        self.renders = 0
+        self.during_render = None
+
+        @pagecache.cache_page_for_anonymous('test_page')
+        def view(request):
+            self.renders += 1
+            pagecache.track('article:1')
+            if self.during_render:
+                self.during_render()
+            return HttpResponse(f'rendu {self.renders}')
+
+        self.view = view
+
+    def get(self):
+        request = RequestFactory().get('/page/')
+        request.user = AnonymousUser()
+        return self.view(request)
+
+    def test_page_is_served_from_cache(self):
+        self.get()
+        self.assertEqual(self.get()['X-Page-Cache'], 'hit')
+        self.assertEqual(self.renders, 1)
+
+    def test_invalidation_expires_page(self):
+        self.get()
+        pagecache._expire([pagecache.DEPENDENCY_PREFIX + 'article:1'])
+        self.assertEqual(self.get().content, b'rendu 2')
+
+    def test_invalidation_during_render_is_not_stored(self):
+        # Invalidation validée par un autre processus pendant le rendu
+        self.during_render = lambda: pagecache._expire([pagecache.DEPENDENCY_PREFIX + 'article:1'])
+        self.get()
+        self.during_render = None
+        self.assertEqual(self.get()['X-Page-Cache'], 'miss')
+        self.assertEqual(self.get()['X-Page-Cache'], 'hit')
+
+
+@override_settings(BLOG_PAGE_CACHE_ENABLED=False, BLOG_QUERY_BUDGET_MODE='off', CACHES=TEST_CACHES)
+class ConditionalGetTests(TestCase):
+    databases = {'default', 'analytics'}
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('auteur')
+        cls.article = Article.objects.create(title='Article', content='...', author=author, status='published')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_revalidated_detail_counts_a_view(self):
+        url = f'/article/{self.article.pk}/'
+        with mock.patch('blog.views.record_article_view') as record:
+            etag = self.client.get(url)['ETag']
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(record.call_count, 2)
+
+    def test_list_page_is_read_once(self):
+        self.client.get('/')
+        # Total lu dans le cache des comptes : page d'articles et tags de la page,
+        # partagés par les validateurs et la vue
+        with self.assertNumQueries(2):
+            self.client.get('/?sort=title')
+
+
+@override_settings(BLOG_ANALYTICS_DB='analytics', BLOG_VIEW_BUFFER_ENABLED=False, BLOG_VIEW_COUNTING='exact')
+class AnalyticsTests(TestCase):
+    """Tables d'analyse dans leur propre base, comptage des vues rejouable."""
+    databases = {'default', 'analytics'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('auteur')
+        cls.article = Article.objects.create(title='Article', content='...', author=cls.author, status='published')
+
+    def test_router(self):
+        router = AnalyticsRouter()
+        self.assertEqual(router.db_for_write(ArticleView), 'analytics')
+        self.assertEqual(router.db_for_read(PendingViewCount), 'analytics')
+        self.assertIsNone(router.db_for_read(Article))
+        self.assertEqual(router.db_for_read(Article, instance=ArticleView()), 'default')
+        self.assertFalse(router.allow_migrate('default', 'blog', 'articleview'))
+        self.assertFalse(router.allow_migrate('analytics', 'blog', 'article'))
+        self.assertTrue(router.allow_migrate('analytics', 'blog', 'visitorsketch'))
+        with self.settings(BLOG_ANALYTICS_DB=None):
+            self.assertEqual(router.db_for_write(ArticleView), 'default')
+            self.assertIsNone(router.allow_migrate('default', 'blog', 'articleview'))
+
+    def test_views_are_counted_once(self):
+        buffer = viewcounter.ViewBuffer()
+        buffer.record(self.article.pk, None, '127.0.0.1')
+        buffer.record(self.article.pk, None, '127.0.0.2')
+        self.assertEqual(ArticleView.objects.using('analytics').count(), 2)
+        self.assertFalse(ArticleView.objects.using('default').exists())
+        self.assertFalse(PendingViewCount.objects.exists())
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.views, 2)
+
+    def test_failed_counter_update_is_replayed_once(self):
+        buffer = viewcounter.ViewBuffer()
+        with mock.patch('blog.viewcounter.add_author_views', side_effect=RuntimeError), \
+                self.assertLogs('blog.viewcounter', 'ERROR'):
+            buffer.record(self.article.pk, None, '127.0.0.1')
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.views, 0)
+        self.assertEqual(ArticleView.objects.count(), 1)
+
+        # Prochain vidage, même sans nouvelle vue
+        self.assertEqual(buffer.flush(), 0)
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.views, 1)
+        self.assertEqual(viewcounter.apply_pending_views(), 0)
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.views, 1)
+
+    def test_batch_applied_elsewhere_is_skipped(self):
+        batch = viewcounter.uuid.uuid4()
+        PendingViewCount.objects.create(batch=batch, article=self.article, views=3)
+        AppliedViewBatch.objects.create(batch=batch)
+        self.assertEqual(viewcounter.apply_pending_views(), 0)
+        self.assertFalse(PendingViewCount.objects.exists())
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.views, 0)
+
+    def test_deletes_cascade_after_commit(self):
+        other = Article.objects.create(title='Autre', content='...', author=self.author, status='published')
+        reader = User.objects.create_user('lecteur')
+        ArticleView.objects.create(article=self.article, ip_address='127.0.0.1')
+        ArticleView.objects.create(article=other, user=reader, ip_address='127.0.0.1')
+        VisitorSketch.objects.create(article=self.article, registers=b'')
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.article.delete()
+            self.assertEqual(ArticleView.objects.count(), 2)
+        self.assertTrue(callbacks)
+        self.assertFalse(ArticleView.objects.filter(article_id=self.article.pk).exists())
+        self.assertFalse(VisitorSketch.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reader.delete()
+        self.assertFalse(ArticleView.objects.exists())
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TransferTests(TestCase):
+    """Import d'un export : ids attribués par la base, reprise et rejeu sans doublon."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('auteur')
+        reader = User.objects.create_user('lecteur')
+        article = Article.objects.create(title='Source', content='...', author=author, status='published')
+        article.tags.add(Tag.objects.create(name='Django'))
+        parent = Comment.objects.create(article=article, author=reader, body='Question')
+        Comment.objects.create(article=article, author=author, body='Réponse', parent=parent)
+        article.likes.add(reader)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'export.jsonl')
+        export_blog(self.path)
+
+    def assertImportedOnce(self):
+        copy = Article.objects.filter(title='Source').order_by('-pk').first()
+        self.assertEqual(Article.objects.filter(title='Source').count(), 2)
+        self.assertEqual([tag.slug for tag in copy.tags.all()], ['django'])
+        self.assertEqual((copy.comments_count, copy.likes_count), (2, 1))
+        parent, reply = copy.comments.order_by('path')
+        self.assertEqual(reply.parent_id, parent.pk)
+        self.assertEqual(reply.thread_id, parent.pk)
+        self.assertTrue(reply.path.startswith(parent.path))
+
+    def test_ids_are_assigned_around_concurrent_inserts(self):
+        author = User.objects.get(username='auteur')
+
+        def concurrent_insert(record_type, done, line):
+            # Un autre processus crée un article entre deux lots (dates explicites :
+            # l'import désactive auto_now_add dans ce processus)
+            now = timezone.now()
+            Article.objects.create(title='Concurrent', content='...', author=author, created_at=now, updated_at=now)
+
+        Importer(self.path, chunk_size=1).run(progress=concurrent_insert)
+        self.assertImportedOnce()
+
+    def test_interrupted_import_resumes(self):
+        class Interrupted(Exception):
+            pass
+
+        def interrupt(record_type, done, line):
+            if record_type == 'comment':
+                raise Interrupted
+
+        with self.assertRaises(Interrupted):
+            Importer(self.path, chunk_size=1).run(progress=interrupt)
+        self.assertTrue(os.path.exists(f'{self.path}.checkpoint'))
+        counts, skipped = Importer(self.path, chunk_size=1).run()
+        self.assertEqual((counts['article'], counts['comment'], counts['like'], skipped), (1, 2, 1, 0))
+        self.assertImportedOnce()
+
+    def test_replayed_import_adds_nothing(self):
+        Importer(self.path).run()
+        # Point de reprise perdu (ou --restart) : tout est relu
+        importer = Importer(self.path)
+        counts, _ = importer.run()
+        self.assertEqual(sum(counts.values()), 0)
+        self.assertEqual(importer.existing, 4)
+        self.assertImportedOnce()
+
+    def test_empty_export(self):
+        # Export d'une base vide : la seule ligne meta
+        with open(self.path, encoding='utf-8') as source:
+            meta = source.readline()
+        with open(self.path, 'w', encoding='utf-8') as output:
+            output.write(meta)
+        counts, skipped = Importer(self.path).run()
+        self.assertEqual((sum(counts.values()), skipped), (0, 0))
+        self.assertFalse(os.path.exists(f'{self.path}.checkpoint'))
+
+
+class ImageFormatTests(SimpleTestCase):
+    def test_declared_formats_can_be_encoded(self):
+        # Un format absent de ce Pillow (AVIF avant 11.2) n'est pas déclaré
+        image = Image.new('RGB', (8, 8))
+        for extension, image_format, options in images.FORMATS:
+            with self.subTest(extension):
+                self.assertTrue(images._encode(image, image_format, options))
+
+    def test_missing_encoder_is_skipped(self):
+        with mock.patch.object(images.features, 'modules', {}):
+            self.assertFalse(images._encoder_available('avif'))
+
+
+@override_settings(BLOG_COMPRESSION_ENABLED=True, BLOG_COMPRESSION_MIN_SIZE=512)
+class CompressionTests(SimpleTestCase):
+    BODY = '<p>Lorem ipsum dolor sit amet</p>' * 50
+
+    def respond(self, response, accept='gzip, br'):
+        middleware = compression.CompressionMiddleware(lambda request: response)
+        return middleware(RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept))
+
+    def test_html_length_is_randomised(self):
+        lengths = set()
+        for _ in range(20):
+            response = self.respond(HttpResponse(self.BODY))
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(gzip.decompress(response.content).decode(), self.BODY)
+            lengths.add(len(response.content))
+        self.assertGreater(len(lengths), 1)
+
+    def test_streamed_html_is_padded(self):
+        response = self.respond(StreamingHttpResponse(iter([self.BODY.encode()] * 3)))
+        body = b''.join(response.streaming_content)
+        self.assertTrue(body[3] & gzip.FNAME)
+        self.assertEqual(gzip.decompress(body).decode(), self.BODY * 3)
+
+    def test_html_is_never_brotli(self):
+        # brotli (facultatif) simulé : le HTML reste en gzip, le JSON peut l'utiliser
+        with mock.patch.object(compression, 'brotli', mock.Mock(compress=lambda data, quality: b'br')):
+            html = self.respond(HttpResponse(self.BODY))
+            json = self.respond(HttpResponse(self.BODY, content_type='application/json'))
+        self.assertEqual(html['Content-Encoding'], 'gzip')
+        self.assertEqual(json['Content-Encoding'], 'br')
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CounterTests(TestCase):
+    """Compteurs dénormalisés (likes, commentaires, statistiques d'auteur) tenus par les signaux."""
+
+    def setUp(self):
+        self.author = User.objects.create_user('auteur')
+        self.readers = [User.objects.create_user(f'lecteur{i}') for i in range(3)]
+        self.article = Article.objects.create(title='Article', content='...', author=self.author, status='published')
+        self.other = Article.objects.create(title='Autre', content='...', author=self.author, status='published')
+
+    def assertCounts(self, likes, comments, likes_received, comments_written=None):
+        self.article.refresh_from_db()
+        self.assertEqual((self.article.total_likes, self.article.total_comments), (likes, comments))
+        self.assertEqual(self.article.likes.count(), likes)
+        self.assertEqual(self.article.comments.count(), comments)
+        stats = AuthorStats.objects.get(user=self.author)
+        self.assertEqual((stats.article_count, stats.likes_received), (2, likes_received))
+        if comments_written is not None:
+            self.assertEqual(stats.comments_written, comments_written)
+
+    def test_likes_from_the_article_side(self):
+        self.article.likes.add(*self.readers)
+        self.assertCounts(3, 0, 3)
+        self.article.likes.remove(self.readers[0])
+        self.assertCounts(2, 0, 2)
+        self.article.likes.clear()
+        self.assertCounts(0, 0, 0)
+
+    def test_likes_from_the_user_side(self):
+        reader = self.readers[0]
+        reader.blog_posts.add(self.article, self.other)
+        self.assertCounts(1, 0, 2)
+        reader.blog_posts.remove(self.other)
+        self.assertCounts(1, 0, 1)
+        reader.blog_posts.clear()
+        self.assertCounts(0, 0, 0)
+
+    def test_comment_deletion(self):
+        parent = Comment.objects.create(article=self.article, author=self.author, body='Question')
+        Comment.objects.create(article=self.article, author=self.readers[0], body='Réponse', parent=parent)
+        self.assertCounts(0, 2, 0, comments_written=1)
+        # Les réponses partent en cascade avec leur parent
+        parent.delete()
+        self.assertCounts(0, 0, 0, comments_written=0)
+        self.assertEqual(AuthorStats.objects.get(user=self.readers[0]).comments_written, 0)
+
+    def test_user_deletion(self):
+        reader = self.readers[0]
+        self.article.likes.add(reader, self.readers[1])
+        Comment.objects.create(article=self.article, author=reader, body='Bonjour')
+        self.assertCounts(2, 1, 2)
+        reader.delete()
+        self.assertCounts(1, 0, 1)
+
+
+@override_settings(BLOG_VIEW_BUFFER_ENABLED=False, BLOG_VIEW_COUNTING='exact', CACHES=TEST_CACHES)
+class AnonymousViewTests(TestCase):
+    databases = {'default', 'analytics'}
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('auteur')
+        cls.article = Article.objects.create(title='Article', content='...', author=author, status='published')
+
+    def test_anonymous_view_is_unique_per_address(self):
+        ArticleView.objects.create(article=self.article, ip_address='127.0.0.1')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ArticleView.objects.create(article=self.article, ip_address='127.0.0.1')
+
+    def test_view_written_by_another_process_is_not_counted_twice(self):
+        buffer = viewcounter.ViewBuffer()
+        # Vue écrite par un autre processus après la recherche des doublons de ce lot
+        ArticleView.objects.create(article=self.article, ip_address='127.0.0.1')
+        stale = mock.Mock(values_list=lambda *fields: [])
+        with mock.patch.object(ArticleView.objects, 'filter', return_value=stale), \
+                self.assertLogs('blog.viewcounter', 'ERROR'):
+            buffer.record(self.article.pk, None, '127.0.0.1')
+        self.assertEqual(ArticleView.objects.count(), 1)
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.views, 0)
+        # Vue remise en attente : reconnue comme déjà écrite au vidage suivant
+        self.assertEqual(buffer.flush(), 0)
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.views, 0)
+
+
+class SketchTests(SimpleTestCase):
+    def test_estimate_within_error_bound(self):
+        for cardinality in (10, 1000, 50000):
+            with self.subTest(cardinality=cardinality):
+                hll = HyperLogLog()
+                hll.update(f'visiteur-{i}' for i in range(cardinality))
+                # Doublons sans effet
+                hll.update(f'visiteur-{i}' for i in range(cardinality // 2))
+                # 4 erreurs standard : un échec n'est pas un hasard
+                tolerance = max(4 * hll.standard_error * cardinality, 1)
+                self.assertAlmostEqual(hll.count(), cardinality, delta=tolerance)
+
+    def test_merge_is_the_union(self):
+        first, second, union = HyperLogLog(), HyperLogLog(), HyperLogLog()
+        first.update(range(0, 3000))
+        second.update(range(2000, 5000))
+        union.update(range(0, 5000))
+        self.assertEqual(first.merge(second).registers, union.registers)
+        with self.assertRaises(ValueError):
+            first.merge(HyperLogLog(precision=10))
+
+    def test_bytes_round_trip(self):
+        hll = HyperLogLog(precision=10)
+        hll.update(range(5000))
+        restored = HyperLogLog.from_bytes(hll.to_bytes())
+        self.assertEqual((restored.precision, restored.registers), (10, hll.registers))
+        self.assertEqual(restored.count(), hll.count())
+        # Champ vide : sketch vide ; précision hors bornes refusée
+        self.assertEqual(HyperLogLog.from_bytes(b'').count(), 0)
+        with self.assertRaises(ValueError):
+            HyperLogLog(precision=17)
+
+    def test_bloom_window_rotation(self):
+        now = [0.0]
+        seen = RotatingBloomFilter(window=60, capacity=1000, clock=lambda: now[0])
+        self.assertTrue(seen.add('visiteur'))
+        self.assertFalse(seen.add('visiteur'))
+        # Génération précédente : encore reconnu pendant la fenêtre suivante
+        now[0] = 61
+        self.assertFalse(seen.add('visiteur'))
+        self.assertIn('visiteur', seen)
+        # Revu à t=61 : recopié dans la génération courante
+        now[0] = 122
+        self.assertIn('visiteur', seen)
+        # Plus vu pendant deux fenêtres complètes : oublié
+        now[0] = 183
+        self.assertNotIn('visiteur', seen)
+        self.assertTrue(seen.add('visiteur'))
+
+    def test_bloom_rotates_when_full(self):
+        seen = RotatingBloomFilter(window=3600, capacity=100, clock=lambda: 0.0)
+        for i in range(250):
+            seen.add(i)
+        # Mémoire bornée : les premières valeurs sont sorties des deux générations
+        self.assertLessEqual(seen._current.count, 100)
+        self.assertTrue(seen.add(0))
+
+
+@override_settings(BLOG_PAGE_CACHE_ENABLED=False, BLOG_QUERY_BUDGET_MODE='off', CACHES=TEST_CACHES)
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        search.reset_availability_cache()
+        cls.author = User.objects.create_user('auteur')
+        cls.summer = Article.objects.create(
+            title='Un été à Marseille', content='Plages et calanques.', author=cls.author, status='published'
+        )
+        cls.mention = Article.objects.create(
+            title='Carnet de voyage', content='Souvenirs de Marseille en hiver.', author=cls.author, status='published'
+        )
+        cls.draft = Article.objects.create(
+            title='Marseille (brouillon)', content='...', author=cls.author, status='draft'
+        )
+
+    def setUp(self):
+        search.reset_availability_cache()
+        self.assertTrue(search.fts_available())
+
+    def found(self, query):
+        published = Article.objects.filter(status='published')
+        return set(search.filter_articles(published, query).values_list('pk', flat=True))
+
+    def test_accent_folding(self):
+        self.assertEqual(self.found('ete'), {self.summer.pk})
+        self.assertEqual(self.found('ÉTÉ'), {self.summer.pk})
+
+    def test_last_word_is_a_prefix(self):
+        self.assertEqual(self.found('marsei'), {self.summer.pk, self.mention.pk})
+        self.assertEqual(self.found('calan'), {self.summer.pk})
+        # Seul le dernier mot est un préfixe
+        self.assertEqual(self.found('calan plages'), set())
+
+    def test_no_searchable_word_finds_nothing(self):
+        self.assertEqual(self.found('!!!'), set())
+        response = self.client.get('/', {'search': '!!!'})
+        self.assertEqual(list(response.context['page_obj'].object_list), [])
+
+    def test_relevance_order(self):
+        # Le titre pèse plus que le contenu (BM25_WEIGHTS)
+        results = search.search_articles('marseille')
+        self.assertEqual([article.pk for article in results], [self.summer.pk, self.mention.pk])
+        self.assertIn('<mark>', results[0].search_title)
+        response = self.client.get('/', {'search': 'marseille', 'sort': 'relevance'})
+        ranked = [article.pk for article in response.context['page_obj'].object_list]
+        self.assertEqual(ranked, [self.summer.pk, self.mention.pk])
+
+    def test_index_follows_edits(self):
+        self.mention.title = 'Carnet de Lyon'
+        self.mention.content = 'Souvenirs de Lyon.'
+        self.mention.save()
+        self.assertEqual(self.found('marseille'), {self.summer.pk})
+        self.assertEqual(self.found('lyon'), {self.mention.pk})
+        self.draft.status = 'published'
+        self.draft.save()
+        self.assertIn(self.draft.pk, self.found('brouillon'))
+        self.summer.delete()
+        self.assertEqual(self.found('calanques'), set())
+
+
+class PrefixIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = autocomplete.PrefixIndex()
+        self.index.load([
+            autocomplete.Suggestion(autocomplete.ARTICLE, 1, 'Un été à Marseille', '/1/', 5, {}),
+            autocomplete.Suggestion(autocomplete.ARTICLE, 2, 'Marseille en hiver', '/2/', 9, {}),
+            autocomplete.Suggestion(autocomplete.TAG, 1, 'Voyage', '/?tag=voyage', 0, {}),
+        ])
+
+    def ids(self, query, **kwargs):
+        return [(s.kind, s.id) for s in self.index.search(query, **kwargs)]
+
+    def test_prefix_match(self):
+        # Classées par poids ; accents et casse ignorés
+        self.assertEqual(self.ids('mars'), [('article', 2), ('article', 1)])
+        self.assertEqual(self.ids('ETE'), [('article', 1)])
+        self.assertEqual(self.ids('hiv mar'), [('article', 2)])
+        self.assertEqual(self.ids('voy'), [('tag', 1)])
+        self.assertEqual(self.ids('mars', kinds={autocomplete.TAG}), [])
+        self.assertEqual(self.ids('arseille'), [])
+        self.assertEqual(self.ids('!!!'), [])
+
+    def test_top_k_cache(self):
+        self.index.load([
+            autocomplete.Suggestion(autocomplete.ARTICLE, i, f'Article {i}', f'/{i}/', i, {})
+            for i in range(autocomplete.TOP_K * 2)
+        ])
+        best = autocomplete.TOP_K * 2 - 1
+        self.assertEqual(self.ids('a', limit=2), [('article', best), ('article', best - 1)])
+        self.assertEqual(len(self.index._top['a']), autocomplete.TOP_K)
+        # Aucune des TOP_K meilleures ne répond à « 1 » : recherche complète
+        self.assertEqual(self.ids('a 1', limit=2), [('article', 19), ('article', 18)])
+        # Une modification qui touche le préfixe invalide son classement
+        self.index.add(autocomplete.Suggestion(autocomplete.ARTICLE, 0, 'Article phare', '/0/', 1000, {}))
+        self.assertNotIn('a', self.index._top)
+        self.assertEqual(self.ids('a', limit=1), [('article', 0)])
+        self.index.remove(autocomplete.ARTICLE, 0)
+        self.assertEqual(self.ids('a', limit=1), [('article', best)])
+
+
+@override_settings(BLOG_PAGE_CACHE_ENABLED=False, BLOG_QUERY_BUDGET_MODE='off', CACHES=TEST_CACHES)
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        autocomplete.index.clear()
+        self.addCleanup(autocomplete.index.clear)
+        self.author = User.objects.create_user('auteur')
+        self.article = Article.objects.create(title='Un été à Marseille', content='...', author=self.author)
+        autocomplete.get_index()
+
+    def labels(self, query, limit=8):
+        response = self.client.get('/search/autocomplete/', {'q': query, 'limit': limit})
+        return [result['label'] for result in response.json()['results']]
+
+    def test_index_follows_saves_and_deletes(self):
+        self.assertEqual(self.labels('mars'), ['Un été à Marseille'])
+        self.article.title = 'Un hiver à Lyon'
+        self.article.save()
+        self.assertEqual(self.labels('mars'), [])
+        self.assertEqual(self.labels('lyon'), ['Un hiver à Lyon'])
+        tag = Tag.objects.create(name='Lyonnais', slug='lyonnais')
+        self.assertEqual(self.labels('lyon'), ['Un hiver à Lyon', 'Lyonnais'])
+        tag.delete()
+        self.article.status = 'draft'
+        self.article.save()
+        self.assertEqual(self.labels('lyon'), [])
+        self.assertEqual(self.labels('aut'), ['auteur'])
+        self.author.delete()
+        self.assertEqual(self.labels('aut'), [])
+
+    def test_limit_is_clamped(self):
+        for i in range(30):
+            Article.objects.create(title=f'Marseille {i}', content='...', author=self.author)
+        self.assertEqual(len(self.labels('mars', limit=0)), 1)
+        self.assertEqual(len(self.labels('mars', limit=-3)), 1)
+        self.assertEqual(len(self.labels('mars', limit=100)), 20)
+        self.assertEqual(len(self.labels('mars', limit='x')), 8)
+
+
+@override_settings(BLOG_PAGE_CACHE_ENABLED=False, BLOG_QUERY_BUDGET_MODE='off', CACHES=TEST_CACHES)
+class LikeTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('auteur')
+        self.reader = User.objects.create_user('lecteur', password='secret')
+        self.article = Article.objects.create(title='Article', content='...', author=self.author, status='published')
+
+    def likes_received(self):
+        return AuthorStats.objects.get(user=self.author).likes_received
+
+    def test_toggle(self):
+        self.assertEqual(toggle_like(self.article, self.reader), (True, 1))
+        self.assertEqual(self.likes_received(), 1)
+        self.assertEqual(toggle_like(self.article, self.reader), (False, 0))
+        self.assertEqual(self.likes_received(), 0)
+        self.assertFalse(Like.objects.exists())
+
+    def test_count_is_a_delta(self):
+        # Compteur déjà incrémenté par un autre processus : l'instance en mémoire est périmée
+        Article.objects.filter(pk=self.article.pk).update(likes_count=5)
+        self.assertEqual(toggle_like(self.article, self.reader), (True, 6))
+        self.assertEqual(toggle_like(self.article, self.reader), (False, 5))
+
+    def test_concurrent_like_is_counted_once(self):
+        Like.objects.create(article_id=self.article.pk, user_id=self.reader.pk)
+        # DELETE lu avant le like concurrent : l'insertion échoue sur la contrainte d'unicité
+        stale = mock.Mock(delete=lambda: (0, {}))
+        with mock.patch.object(Like.objects, 'filter', return_value=stale):
+            # Le like concurrent est compté par son propre appel, pas une seconde fois ici
+            self.assertEqual(toggle_like(self.article, self.reader), (True, 0))
+        self.assertEqual(self.likes_received(), 0)
+        self.assertEqual(Like.objects.count(), 1)
+
+    def test_draft_does_not_count_for_the_author(self):
+        draft = Article.objects.create(title='Brouillon', content='...', author=self.author, status='draft')
+        self.assertEqual(toggle_like(draft, self.reader), (True, 1))
+        self.assertEqual(self.likes_received(), 0)
+
+    def test_liked_article_ids(self):
+        other = Article.objects.create(title='Autre', content='...', author=self.author, status='published')
+        toggle_like(self.article, self.reader)
+        ids = [self.article.pk, other.pk, None]
+        self.assertEqual(liked_article_ids(self.reader, ids), {self.article.pk})
+        self.assertEqual(liked_article_ids(self.author, ids), set())
+        self.assertEqual(liked_article_ids(AnonymousUser(), ids), set())
+        with self.assertNumQueries(0):
+            liked_article_ids(self.reader, [None])
+
+    def test_like_view(self):
+        self.client.force_login(self.reader)
+        url = f'/article/{self.article.pk}/like/'
+        response = self.client.post(url, headers={'X-Requested-With': 'XMLHttpRequest'})
+        self.assertEqual(response.json(), {'liked': True, 'total_likes': 1})
+        response = self.client.post(url)
+        self.assertRedirects(response, f'/article/{self.article.pk}/', fetch_redirect_response=False)
+        self.assertFalse(liked_article_ids(self.reader, [self.article.pk]))
+
+
+class MediaTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings = override_settings(MEDIA_ROOT=media_root.name, CACHES=TEST_CACHES)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.author = User.objects.create_user('auteur')
+
+    def png(self, color='red'):
+        buffer = io.BytesIO()
+        Image.new('RGB', (8, 8), color).save(buffer, 'PNG')
+        return ContentFile(buffer.getvalue())
+
+    def age(self, name):
+        # Fichier écrit il y a une heure
+        past = timezone.now().timestamp() - 3600
+        os.utime(default_storage.path(name), (past, past))
+
+    def test_identical_uploads_share_a_file(self):
+        first = default_storage.save('blog_images/a.PNG', self.png())
+        second = default_storage.save('covers/b.png', self.png())
+        self.assertEqual(first, second)
+        self.assertTrue(first.startswith('cas/') and first.endswith('.png'))
+        self.assertNotEqual(default_storage.save('blog_images/c.png', self.png('blue')), first)
+
+    def test_file_is_deleted_with_its_last_reference(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = Article.objects.create(title='Un', content='...', author=self.author)
+            first.image.save('a.png', self.png())
+            second = Article.objects.create(title='Deux', content='...', author=self.author)
+            second.image.save('b.png', self.png())
+        name = first.image.name
+        self.assertEqual(second.image.name, name)
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 2)
+        self.age(name)
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 1)
+        self.assertTrue(default_storage.exists(name))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.image.save('c.png', self.png('blue'))
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+        self.assertFalse(default_storage.exists(name))
+
+    def test_reused_file_survives_a_pending_delete(self):
+        name = default_storage.save('blog_images/a.png', self.png())
+        MediaBlob.objects.create(name=name, ref_count=0)
+        self.age(name)
+        # Nouvel envoi du même contenu, pas encore validé, pendant la suppression
+        self.assertEqual(default_storage.save('blog_images/b.png', self.png()), name)
+        self.assertTrue(media.delete_if_unused(name))
+        self.assertTrue(default_storage.exists(name))
+        # Resté orphelin : supprimé par collect_media une fois le délai passé
+        self.age(name)
+        self.assertEqual(media.collect(), (0, 1))
+        self.assertFalse(default_storage.exists(name))
+
+
+class MediaServeTests(SimpleTestCase):
+    BODY = b'0123456789'
+    DIGEST = 'abcd' + 'e' * 60
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings = override_settings(MEDIA_ROOT=media_root.name, BLOG_MEDIA_ACCEL=None)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.immutable = f'cas/ab/cd/{self.DIGEST}.txt'
+        for name in (self.immutable, 'blog_images/ancien.txt'):
+            os.makedirs(os.path.dirname(os.path.join(media_root.name, name)), exist_ok=True)
+            with open(os.path.join(media_root.name, name), 'wb') as f:
+                f.write(self.BODY)
+        self.factory = RequestFactory()
+
+    def get(self, name=None, method='get', **headers):
+        request = getattr(self.factory, method)('/media/', headers=headers)
+        response = mediaserve.serve(request, name or self.immutable)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return response, body
+
+    def test_parse_range(self):
+        cases = {
+            'bytes=2-5': (2, 5), 'bytes=7-': (7, 9), 'bytes=-3': (7, 9), 'bytes=-30': (0, 9),
+            'bytes=8-100': (8, 9), 'bytes=5-3': None, 'bytes=0-1,4-5': None, 'items=0-1': None,
+            'bytes=-': None, 'bytes=10-': False, 'bytes=-0': False,
+        }
+        for header, expected in cases.items():
+            with self.subTest(header):
+                self.assertEqual(mediaserve.parse_range(header, len(self.BODY)), expected)
+        self.assertIs(mediaserve.parse_range('bytes=-5', 0), False)
+
+    def test_full_response_headers(self):
+        response, body = self.get()
+        self.assertEqual((response.status_code, body), (200, self.BODY))
+        self.assertEqual(response['ETag'], f'"{self.DIGEST}"')
+        self.assertEqual(response['Cache-Control'], mediaserve.IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Type'], 'text/plain')
+        response, _ = self.get('blog_images/ancien.txt')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=3600')
+        self.assertNotEqual(response['ETag'], f'"{self.DIGEST}"')
+        response, body = self.get(method='head')
+        self.assertEqual((response.status_code, body, response['Content-Length']), (200, b'', '10'))
+
+    def test_range(self):
+        response, body = self.get(Range='bytes=2-5')
+        self.assertEqual((response.status_code, body), (206, b'2345'))
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(response['Cache-Control'], mediaserve.IMMUTABLE_CACHE_CONTROL)
+        response, body = self.get(Range='bytes=-3')
+        self.assertEqual((response.status_code, body), (206, b'789'))
+        # Plage invalide : ignorée
+        response, body = self.get(Range='bytes=5-3')
+        self.assertEqual((response.status_code, body), (200, self.BODY))
+        response, body = self.get(Range='bytes=10-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */10'))
+
+    def test_if_range(self):
+        response, body = self.get(Range='bytes=0-1', If_Range=f'"{self.DIGEST}"')
+        self.assertEqual((response.status_code, body), (206, b'01'))
+        # Représentation changée depuis : fichier entier
+        response, body = self.get(Range='bytes=0-1', If_Range='"autre"')
+        self.assertEqual((response.status_code, body), (200, self.BODY))
+        last_modified = self.get()[0]['Last-Modified']
+        response, body = self.get(Range='bytes=0-1', If_Range=last_modified)
+        self.assertEqual((response.status_code, body), (206, b'01'))
+
+    def test_not_modified(self):
+        response, body = self.get(If_None_Match=f'"{self.DIGEST}"')
+        self.assertEqual((response.status_code, body), (304, b''))
+        self.assertEqual(response['ETag'], f'"{self.DIGEST}"')
+        self.assertEqual(response['Cache-Control'], mediaserve.IMMUTABLE_CACHE_CONTROL)
+        response, _ = self.get(If_None_Match='"autre"')
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(BLOG_SQLITE_WRITE_RETRIES=2)
+@mock.patch('blog.sqlite.time.sleep')
+class SerializedWriteTests(TransactionTestCase):
+    # Hors TestCase : dans une transaction englobante, rien n'est rejoué
+
+    def flaky(self, *errors):
+        """Fonction décorée qui crée un tag puis lève les erreurs données, une par appel."""
+        errors = list(errors)
+
+        @serialized_write
+        def write():
+            Tag.objects.create(name=f'Tag {len(errors)}', slug=f'tag-{len(errors)}')
+            if errors:
+                raise errors.pop(0)
+            return 'ok'
+        return write
+
+    def test_retried_while_locked(self, sleep):
+        locked = OperationalError('database is locked')
+        self.assertEqual(self.flaky(locked, locked)(), 'ok')
+        self.assertEqual(sleep.call_count, 2)
+        # Les essais ratés sont annulés
+        self.assertEqual(list(Tag.objects.values_list('slug', flat=True)), ['tag-0'])
+
+    def test_gives_up_after_the_retries(self, sleep):
+        locked = OperationalError('database is locked')
+        with self.assertRaises(OperationalError):
+            self.flaky(locked, locked, locked)()
+        self.assertEqual(sleep.call_count, 2)
+        self.assertFalse(Tag.objects.exists())
+
+    def test_other_errors_are_not_retried(self, sleep):
+        with self.assertRaisesMessage(OperationalError, 'no such table'):
+            self.flaky(OperationalError('no such table: x'))()
+        sleep.assert_not_called()
+
+    def test_runs_as_is_inside_a_transaction(self, sleep):
+        write = self.flaky(OperationalError('database is locked'))
+        with self.assertRaises(OperationalError), transaction.atomic():
+            write()
+        sleep.assert_not_called()
+
+
+@override_settings(BLOG_PAGE_CACHE_ENABLED=False, CACHES=TEST_CACHES)
+class GeneratorTests(TestCase):
+    def test_generated_data_is_consistent(self):
+        # Compte existant au nom que recevrait le deuxième utilisateur généré
+        User.objects.create_user('user3')
+        Tag.objects.create(name='Existant')
+        created = Generator(users=4, articles=30, tags=3, seed=1).run()
+        self.assertEqual((created['users'], created['tags'], created['articles']), (4, 3, 30))
+        generated = list(User.objects.filter(pk__gt=1).values_list('username', flat=True))
+        self.assertEqual(generated, ['user2', 'user3_2', 'user4', 'user5'])
+        self.assertFalse(User.objects.get(username='user2').has_usable_password())
+        for article in Article.objects.all():
+            self.assertEqual(article.likes_count, article.likes.count())
+            self.assertEqual(article.comments_count, article.comments.count())
+        for tag in Tag.objects.all():
+            self.assertEqual(tag.published_count, tag.articles.filter(status='published').count())
+        for stats in AuthorStats.objects.all():
+            self.assertEqual(stats.article_count, Article.objects.filter(author=stats.user, status='published').count())
+        self.assertEqual(Comment.objects.count(), created['comments'])
+
+    def test_free_name(self):
+        taken = {'user7', 'user7_2'}
+        self.assertEqual(_free_name('user7', taken), 'user7_3')
+        self.assertEqual(_free_name('user8', taken), 'user8')
+        self.assertIn('user7_3', taken)
@@ -0,0 +1,374 @@
+"""Export / import du contenu du blog en JSONL (gzip si le fichier finit par .gz).
+
+Une ligne par enregistrement, dans l'ordre où l'import en a besoin :
+utilisateurs, tags, articles (avec les slugs de leurs tags), commentaires
+(parents avant réponses) puis likes. Les utilisateurs et tags sont
+désignés par nom / slug, les articles et commentaires par leur id
+d'origine. L'export lit la base par iterator(chunk_size=...) : la mémoire
+reste constante quelle que soit la taille du blog. Les fichiers images, les
+mots de passe et les tables d'analyse ne sont pas exportés.
+
+À l'import, les utilisateurs et tags existants (même nom / slug) sont
+réutilisés ; les articles et commentaires reçoivent un id attribué par la
+base, noté dans ImportedRecord (id d'origine -> id attribué, par export)
+dans la transaction du lot. Les commentaires d'un lot sont insérés niveau
+par niveau (parents avant réponses), puis leurs chemins et fils calculés
+d'après les ids attribués. Les lignes sont insérées par lots (bulk_create,
+une transaction par lot) et les compteurs (likes_count, comments_count,
+AuthorStats, Tag.published_count) recalculés pour chaque lot ; un lot
+compte au plus LOOKUP_CHUNK_SIZE lignes par défaut, pour rester sous la
+limite de variables SQLite des requêtes IN.
+
+Après chaque lot, le numéro de ligne est écrit dans un fichier de reprise :
+un import interrompu reprend au lot suivant. Un enregistrement déjà noté
+dans ImportedRecord (lot rejoué après une interruption entre le commit et
+l'écriture du point de reprise, import relancé avec --restart) est ignoré
+et compté comme déjà importé : rejouer un export ne duplique rien.
+"""
+import gzip
+import json
+import os
+import uuid
+from contextlib import suppress
+from datetime import datetime
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from . import pagecache, search
+from .counters import article_authors, refresh_article_counters, refresh_author_stats, refresh_tag_counts
+from .datagen import LOOKUP_CHUNK_SIZE, manual_timestamps
+from .models import Article, AuthorStats, Comment, ImportedRecord, Tag, UserProfile
+
+# 2 : identifiant d'export (export_id) dans la ligne meta
+FORMAT_VERSION = 2
+RECORD_TYPES = ('user', 'tag', 'article', 'comment', 'like')
+
+
+class _Encoder(DjangoJSONEncoder):
+    """Dates à la microseconde (DjangoJSONEncoder les tronque à la milliseconde)."""
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def open_jsonl(path, mode):
+    """Fichier texte UTF-8, compressé en gzip si `path` finit par .gz ; mode 'r' ou 'w'."""
+    if str(path).endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+# Export
+
+def _chunks(rows, size):
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def export_records(chunk_size=LOOKUP_CHUNK_SIZE):
+    """Enregistrements à écrire, un dict par ligne, lus par lots de `chunk_size`."""
+    # Identifiant propre à cet export : un réimport reconnaît ses enregistrements
+    yield {'type': 'meta', 'version': FORMAT_VERSION, 'export_id': uuid.uuid4().hex}
+
+    users = User.objects.order_by('pk').values_list(
+        'username', 'first_name', 'last_name', 'email', 'date_joined', 'is_active'
+    )
+    for username, first_name, last_name, email, date_joined, is_active in users.iterator(chunk_size=chunk_size):
+        yield {'type': 'user', 'username': username, 'first_name': first_name, 'last_name': last_name,
+               'email': email, 'date_joined': date_joined, 'is_active': is_active}
+
+    for tag in Tag.objects.order_by('pk').values('name', 'slug', 'color', 'created_at').iterator(chunk_size=chunk_size):
+        yield {'type': 'tag', **tag}
+
+    articles = Article.objects.order_by('pk').values_list(
+        'pk', 'title', 'content', 'author__username', 'created_at', 'updated_at', 'status', 'views', 'is_featured'
+    )
+    for rows in _chunks(articles.iterator(chunk_size=chunk_size), chunk_size):
+        # Tags du lot en une requête : pas d'instances ni de prefetch_related, dont les
+        # références circulaires attendent le ramasse-miettes et font grossir la mémoire
+        tags = {}
+        links = Article.tags.through.objects.filter(article_id__in=[row[0] for row in rows]).order_by('tag__slug')
+        for article_id, slug in links.values_list('article_id', 'tag__slug'):
+            tags.setdefault(article_id, []).append(slug)
+        for pk, title, content, author, created_at, updated_at, status, views, is_featured in rows:
+            yield {'type': 'article', 'id': pk, 'title': title, 'content': content, 'author': author,
+                   'created_at': created_at, 'updated_at': updated_at, 'status': status, 'views': views,
+                   'is_featured': is_featured, 'tags': tags.get(pk, [])}
+
+    # Trié par chemin dans chaque article : un parent précède toujours ses réponses
+    comments = Comment.objects.order_by('article_id', 'path').values_list(
+        'pk', 'article_id', 'author__username', 'body', 'created_at', 'updated_at', 'is_edited', 'parent_id',
+        'path',
+    )
+    for pk, article_id, author, body, created_at, updated_at, is_edited, parent_id, path in comments.iterator(
+            chunk_size=chunk_size):
+        yield {'type': 'comment', 'id': pk, 'article': article_id, 'author': author, 'body': body,
+               'created_at': created_at, 'updated_at': updated_at, 'is_edited': is_edited,
+               'parent': parent_id, 'path': path}
+
+    likes = Article.likes.through.objects.order_by('pk').values_list('article_id', 'user__username')
+    for article_id, username in likes.iterator(chunk_size=chunk_size):
+        yield {'type': 'like', 'article': article_id, 'user': username}
+
+
+def export_blog(path, chunk_size=LOOKUP_CHUNK_SIZE):
+    """Écrit l'export dans `path` ; retourne le nombre d'enregistrements par type."""
+    counts = dict.fromkeys(RECORD_TYPES, 0)
+    with open_jsonl(path, 'w') as output:
+        for record in export_records(chunk_size):
+            output.write(json.dumps(record, cls=_Encoder, ensure_ascii=False))
+            output.write('\n')
+            if record['type'] in counts:
+                counts[record['type']] += 1
+    return counts
+
+
+# Import
+
+class TransferError(ValueError):
+    """Fichier d'export illisible ou d'une version non prise en charge."""
+
+
+class Importer:
+    """Import par lots de `chunk_size` lignes, repris depuis `checkpoint` s'il existe."""
+
+    def __init__(self, path, chunk_size=LOOKUP_CHUNK_SIZE, checkpoint=None):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.checkpoint = checkpoint or f'{path}.checkpoint'
+        self.counts = dict.fromkeys(RECORD_TYPES, 0)
+        self.skipped = 0
+        # Articles, commentaires et likes déjà présents (import précédent du même export)
+        self.existing = 0
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint, encoding='utf-8') as state:
+                return json.load(state)
+        except FileNotFoundError:
+            return None
+
+    def _save_checkpoint(self, line):
+        state = {'line': line, 'export_id': str(self.export_id), 'counts': self.counts, 'skipped': self.skipped,
+                 'existing': self.existing, 'tags': sorted(self.tag_ids)}
+        temporary = f'{self.checkpoint}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as output:
+            json.dump(state, output)
+        os.replace(temporary, self.checkpoint)
+
+    def _read_meta(self, text):
+        record = json.loads(text) if text.strip() else {}
+        if record.get('type') != 'meta':
+            raise TransferError("Ligne 1 : ligne meta attendue")
+        if record.get('version') != FORMAT_VERSION:
+            raise TransferError(f"Version d'export non prise en charge : {record.get('version')}")
+        try:
+            return uuid.UUID(record['export_id'])
+        except (KeyError, TypeError, ValueError):
+            raise TransferError('Ligne 1 : identifiant d\'export manquant ou invalide')
+
+    def run(self, progress=None):
+        """Importe le fichier ; retourne (enregistrements importés par type, enregistrements ignorés)."""
+        if not connection.features.can_return_rows_from_bulk_insert:
+            # Ids attribués lus dans le retour de bulk_create (SQLite 3.35+, PostgreSQL)
+            raise TransferError("Import impossible : la base ne retourne pas les ids des insertions groupées")
+        state = self._load_checkpoint()
+        done = 0
+        self.tag_ids = set()
+        if state is not None:
+            done = state['line']
+            self.counts.update(state['counts'])
+            self.skipped = state['skipped']
+            self.existing = state['existing']
+            self.tag_ids = set(state['tags'])
+
+        with manual_timestamps(), open_jsonl(self.path, 'r') as source:
+            # Ligne meta lue aussi à la reprise : elle désigne l'export
+            self.export_id = self._read_meta(next(source, ''))
+            if state is not None and state['export_id'] != str(self.export_id):
+                raise TransferError(f"{self.checkpoint} : point de reprise d'un autre export")
+            batch, batch_type, line = [], None, 1
+            for line, text in enumerate(source, 2):
+                if line <= done or not text.strip():
+                    continue
+                record = json.loads(text)
+                record_type = record.pop('type')
+                if record_type not in RECORD_TYPES:
+                    raise TransferError(f'Ligne {line} : type inconnu {record_type!r}')
+                if batch and (record_type != batch_type or len(batch) >= self.chunk_size):
+                    self._flush(batch_type, batch, line - 1, progress)
+                    batch = []
+                batch_type = record_type
+                batch.append(record)
+            if batch:
+                self._flush(batch_type, batch, line, progress)
+
+        refresh_tag_counts(self.tag_ids)
+        search.rebuild_index()
+        pagecache.invalidate('articles', 'tags')
+        # Export sans enregistrement (base vide) : aucun lot, pas de point de reprise
+        with suppress(FileNotFoundError):
+            os.remove(self.checkpoint)
+        return self.counts, self.skipped
+
+    def _flush(self, record_type, records, line, progress):
+        with transaction.atomic():
+            getattr(self, f'_import_{record_type}s')(records)
+        self._save_checkpoint(line)
+        if progress:
+            progress(record_type, self.counts[record_type], line)
+
+    def _user_ids(self, usernames):
+        return dict(User.objects.filter(username__in=set(usernames)).values_list('username', 'pk'))
+
+    def _imported(self, kind, source_ids):
+        """{id d'origine: id attribué} des enregistrements `kind` déjà importés de cet export."""
+        return dict(ImportedRecord.objects.filter(
+            export_id=self.export_id, kind=kind, source_id__in=set(source_ids),
+        ).values_list('source_id', 'target_id'))
+
+    def _remember(self, kind, pairs):
+        ImportedRecord.objects.bulk_create([
+            ImportedRecord(export_id=self.export_id, kind=kind, source_id=source_id, target_id=target_id)
+            for source_id, target_id in pairs
+        ])
+
+    def _import_users(self, records):
+        existing = set(User.objects.filter(username__in=[r['username'] for r in records])
+                       .values_list('username', flat=True))
+        new_users = []
+        for record in records:
+            if record['username'] in existing:
+                continue
+            user = User(**{**record, 'date_joined': parse_datetime(record['date_joined'])})
+            user.set_unusable_password()
+            new_users.append(user)
+        User.objects.bulk_create(new_users)
+        # Profils et statistiques créés d'ordinaire par les signaux post_save
+        user_ids = self._user_ids(user.username for user in new_users)
+        UserProfile.objects.bulk_create([
+            UserProfile(user_id=user_ids[user.username], created_at=user.date_joined) for user in new_users
+        ])
+        AuthorStats.objects.bulk_create([AuthorStats(user_id=pk) for pk in user_ids.values()])
+        self.counts['user'] += len(new_users)
+
+    def _import_tags(self, records):
+        existing = set(Tag.objects.filter(slug__in=[r['slug'] for r in records]).values_list('slug', flat=True))
+        tags = [
+            Tag(**{**record, 'created_at': parse_datetime(record['created_at'])})
+            for record in records if record['slug'] not in existing
+        ]
+        Tag.objects.bulk_create(tags)
+        self.counts['tag'] += len(tags)
+
+    def _import_articles(self, records):
+        imported = self._imported('article', (r['id'] for r in records))
+        user_ids = self._user_ids(r['author'] for r in records)
+        tag_ids = dict(Tag.objects.filter(slug__in={slug for r in records for slug in r['tags']})
+                       .values_list('slug', 'pk'))
+        articles, sources = [], []
+        for record in records:
+            if record['id'] in imported:
+                self.existing += 1
+                continue
+            author_id = user_ids.get(record['author'])
+            if author_id is None:
+                self.skipped += 1
+                continue
+            articles.append(Article(
+                title=record['title'], content=record['content'], author_id=author_id,
+                created_at=parse_datetime(record['created_at']), updated_at=parse_datetime(record['updated_at']),
+                status=record['status'], views=record['views'], is_featured=record['is_featured'],
+            ))
+            sources.append(record)
+        # Ids attribués par la base (retournés par l'INSERT)
+        Article.objects.bulk_create(articles)
+        self._remember('article', ((record['id'], article.pk) for record, article in zip(sources, articles)))
+        links = [
+            Article.tags.through(article_id=article.pk, tag_id=tag_ids[slug])
+            for record, article in zip(sources, articles) for slug in record['tags'] if slug in tag_ids
+        ]
+        Article.tags.through.objects.bulk_create(links)
+        self.tag_ids.update(link.tag_id for link in links)
+        refresh_author_stats({article.author_id for article in articles}, comments=False)
+        self.counts['article'] += len(articles)
+
+    def _import_comments(self, records):
+        imported = self._imported('comment', (r['id'] for r in records))
+        article_ids = self._imported('article', (r['article'] for r in records))
+        # Parents importés par un lot précédent : id attribué, puis chemin et fil
+        parent_ids = self._imported('comment', (r['parent'] for r in records if r['parent']))
+        parents = {
+            pk: (path, thread_id) for pk, path, thread_id in
+            Comment.objects.filter(pk__in=parent_ids.values()).values_list('pk', 'path', 'thread_id')
+        }
+        parents = {source: parents[target] for source, target in parent_ids.items() if target in parents}
+        user_ids = self._user_ids(r['author'] for r in records)
+        width = Comment.PATH_SEGMENT_WIDTH
+
+        # Par profondeur : les ids des parents sont attribués avant l'insertion des réponses
+        levels = {}
+        for record in records:
+            levels.setdefault(record['path'].count('/'), []).append(record)
+        comments = []
+        for depth in sorted(levels):
+            level, sources = [], []
+            for record in levels[depth]:
+                if record['id'] in imported:
+                    self.existing += 1
+                    continue
+                author_id = user_ids.get(record['author'])
+                article_id = article_ids.get(record['article'])
+                # Auteur inconnu, ou article / parent non importé : ignoré
+                if author_id is None or article_id is None or (record['parent'] and record['parent'] not in parents):
+                    self.skipped += 1
+                    continue
+                level.append(Comment(
+                    article_id=article_id, author_id=author_id, body=record['body'],
+                    created_at=parse_datetime(record['created_at']), updated_at=parse_datetime(record['updated_at']),
+                    is_edited=record['is_edited'],
+                    parent_id=parent_ids[record['parent']] if record['parent'] else None,
+                ))
+                sources.append(record)
+            Comment.objects.bulk_create(level)
+            for record, comment in zip(sources, level):
+                parent_path, thread_id = parents.get(record['parent'], ('', comment.pk))
+                comment.path = f'{parent_path}{comment.pk:0{width}d}/'
+                comment.thread_id = thread_id
+                parents[record['id']] = (comment.path, comment.thread_id)
+                parent_ids[record['id']] = comment.pk
+            self._remember('comment', ((record['id'], comment.pk) for record, comment in zip(sources, level)))
+            comments += level
+        Comment.objects.bulk_update(comments, ['path', 'thread'])
+        refresh_article_counters({comment.article_id for comment in comments}, likes=False)
+        refresh_author_stats({comment.author_id for comment in comments}, articles=False)
+        self.counts['comment'] += len(comments)
+
+    def _import_likes(self, records):
+        article_ids = self._imported('article', (r['article'] for r in records))
+        user_ids = self._user_ids(r['user'] for r in records)
+        Like = Article.likes.through
+        pairs = set()
+        for record in records:
+            user_id = user_ids.get(record['user'])
+            article_id = article_ids.get(record['article'])
+            if user_id is None or article_id is None:
+                self.skipped += 1
+                continue
+            pairs.add((article_id, user_id))
+        existing = set(Like.objects.filter(
+            article_id__in={article_id for article_id, _ in pairs}, user_id__in={user_id for _, user_id in pairs},
+        ).values_list('article_id', 'user_id'))
+        self.existing += len(pairs & existing)
+        likes = [Like(article_id=article_id, user_id=user_id) for article_id, user_id in pairs - existing]
+        Like.objects.bulk_create(likes)
+        article_ids = {like.article_id for like in likes}
+        refresh_article_counters(article_ids, comments=False)
+        refresh_author_stats(article_authors(article_ids), comments=False)
+        self.counts['like'] += len(likes)
@@ -5,11 +5,14 @@ from django.contrib.auth import views as auth_views
 urlpatterns = [
     # Articles
     path('', views.article_list, name='article_list'),
+    path('articles/more/', views.article_list_more, name='article_list_more'),
     path('article/<int:pk>/', views.article_detail, name='article_detail'),
     path('article/new/', views.article_create, name='article_create'),
     path('article/<int:pk>/edit/', views.article_update, name='article_update'),
     path('article/<int:pk>/delete/', views.article_delete, name='article_delete'),
     path('article/<int:pk>/like/', views.like_article, name='like_article'),
+    path('article/<int:pk>/comments/', views.article_comments, name='article_comments'),
+    path('comments/<int:pk>/replies/', views.comment_replies, name='comment_replies'),
     
     # Authentification
     path('signup/', views.signup, name='signup'),
@@ -26,4 +29,5 @@ urlpatterns = [
     
     # Recherche
     path('search/', views.search_articles, name='search_articles'),
+    path('search/autocomplete/', views.search_autocomplete, name='search_autocomplete'),
 ]
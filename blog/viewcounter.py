@@ -0,0 +1,329 @@
+"""Comptage des vues en écriture différée (write-behind).
+
+Chaque lecture d'article enregistre la vue dans un tampon propre au
+processus ; un thread de fond vide ce tampon par lots (toutes les
+BLOG_VIEW_BUFFER_FLUSH_INTERVAL secondes ou dès que
+BLOG_VIEW_BUFFER_MAX_PENDING vues sont en attente) avec un bulk insert des
+ArticleView et des UPDATE atomiques `views = views + n` (articles et
+statistiques de leurs auteurs).
+
+Les vues et les compteurs peuvent être dans deux bases (blog.routers) :
+aucune transaction ne couvre les deux. Chaque lot est donc journalisé avec
+ses vues, puis appliqué aux compteurs une seule fois (apply_pending_views).
+
+Avec BLOG_VIEW_COUNTING = 'sketch', aucune ligne ArticleView n'est créée :
+les visiteurs sont agrégés dans des sketches HyperLogLog par article et par
+jour (VisitorSketch), un filtre de Bloom à fenêtre glissante évitant de
+retraiter un visiteur déjà compté récemment.
+"""
+import atexit
+import logging
+import threading
+import uuid
+from collections import OrderedDict, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .counters import add_author_views
+from .models import AppliedViewBatch, Article, ArticleView, PendingViewCount, VisitorSketch
+from .routers import analytics_db
+from .sketches import HyperLogLog, RotatingBloomFilter
+from .sqlite import serialized_write
+
+logger = logging.getLogger(__name__)
+
+# Taille des lots pour les requêtes IN (limite de variables SQLite)
+LOOKUP_CHUNK_SIZE = 300
+
+# Durée de conservation des marqueurs de lots appliqués
+MARKER_RETENTION = timedelta(days=1)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class ViewBuffer:
+    """Tampon de vues dédupliquées, vidé par lots."""
+
+    def __init__(self, recent_size=20000):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._pending_per_article = defaultdict(int)
+        # Clés déjà écrites récemment : évite de les ré-enregistrer à chaque visite
+        self._recent = OrderedDict()
+        self._recent_size = recent_size
+        self._seen = RotatingBloomFilter(
+            window=_setting('BLOG_VIEW_SKETCH_WINDOW', 1800),
+            capacity=_setting('BLOG_VIEW_SKETCH_BLOOM_CAPACITY', 100000),
+        )
+        self._wakeup = threading.Event()
+        self._thread = None
+        # Journal à rejouer (lots non ajoutés aux compteurs) : vérifié au
+        # premier vidage
+        self._journal_pending = True
+
+    @property
+    def enabled(self):
+        return _setting('BLOG_VIEW_BUFFER_ENABLED', True)
+
+    @property
+    def sketch_mode(self):
+        return _setting('BLOG_VIEW_COUNTING', 'exact') == 'sketch'
+
+    def record(self, article_id, user_id, ip_address):
+        """Enregistre une vue ; retourne True si elle est nouvelle pour ce processus."""
+        key = (article_id, user_id, ip_address)
+        with self._lock:
+            if self.sketch_mode:
+                if not self._seen.add(key):
+                    return False
+            elif key in self._pending or key in self._recent:
+                return False
+            self._pending[key] = None
+            self._pending_per_article[article_id] += 1
+            pending = len(self._pending)
+
+        if not self.enabled:
+            self.flush()
+        elif pending >= _setting('BLOG_VIEW_BUFFER_MAX_PENDING', 500):
+            self._ensure_thread()
+            self._wakeup.set()
+        else:
+            self._ensure_thread()
+        return True
+
+    def pending_for(self, article_id):
+        """Nombre de vues en attente d'écriture pour un article."""
+        with self._lock:
+            return self._pending_per_article.get(article_id, 0)
+
+    def flush(self):
+        """Écrit toutes les vues en attente ; retourne le nombre de vues nouvelles."""
+        with self._lock:
+            batch = list(self._pending)
+            self._pending = {}
+            self._pending_per_article = defaultdict(int)
+        if not batch:
+            self._apply_journal()
+            return 0
+
+        try:
+            if self.sketch_mode:
+                written = self._write_sketches(batch)
+            else:
+                written = self._write(batch)
+        except Exception:
+            logger.exception("Échec de l'écriture de %d vues, nouvel essai au prochain vidage", len(batch))
+            with self._lock:
+                for key in batch:
+                    if key not in self._pending:
+                        self._pending[key] = None
+                        self._pending_per_article[key[0]] += 1
+            return 0
+
+        if self.sketch_mode:
+            return written
+        with self._lock:
+            for key in batch:
+                self._recent[key] = None
+                self._recent.move_to_end(key)
+            while len(self._recent) > self._recent_size:
+                self._recent.popitem(last=False)
+        return written
+
+    def _write(self, batch):
+        return sum(self._commit(lambda: _insert_views(batch)).values())
+
+    def _write_sketches(self, batch):
+        return sum(self._commit(lambda: _update_sketches(batch)).values())
+
+    def _commit(self, write):
+        """Exécute `write()` (écrit les vues, retourne {article_id: n}) et ajoute n aux compteurs."""
+        using = analytics_db()
+        if using == 'default':
+            # Une seule base : vues et compteurs dans la même transaction
+            return _write_with_counters(write)
+        batch_id = uuid.uuid4()
+        with transaction.atomic(using=using):
+            per_article = write()
+            PendingViewCount.objects.bulk_create(
+                [PendingViewCount(batch=batch_id, article_id=a, views=n) for a, n in per_article.items()],
+                batch_size=500,
+            )
+        self._apply_journal(batch_id, per_article)
+        return per_article
+
+    def _apply_journal(self, batch_id=None, per_article=None):
+        # Vues déjà validées dans la base d'analyse : un échec ici ne les
+        # remet pas en attente, le journal est rejoué au prochain vidage (et
+        # au premier vidage du processus, pour les lots d'un processus arrêté)
+        if analytics_db() == 'default':
+            return
+        try:
+            if per_article:
+                apply_batch(batch_id, per_article)
+            if self._journal_pending:
+                apply_pending_views()
+        except Exception:
+            logger.exception('Échec de la mise à jour des compteurs de vues, nouvel essai au prochain vidage')
+            self._journal_pending = True
+        else:
+            self._journal_pending = False
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='blog-view-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(_setting('BLOG_VIEW_BUFFER_FLUSH_INTERVAL', 5))
+            self._wakeup.clear()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+
+def _insert_views(batch):
+    new_keys = []
+    for start in range(0, len(batch), LOOKUP_CHUNK_SIZE):
+        chunk = batch[start:start + LOOKUP_CHUNK_SIZE]
+        existing = set(
+            ArticleView.objects.filter(
+                article_id__in={key[0] for key in chunk},
+                ip_address__in={key[2] for key in chunk},
+            ).values_list('article_id', 'user_id', 'ip_address')
+        )
+        new_keys.extend(key for key in chunk if key not in existing)
+    # Sans ignore_conflicts : une vue insérée entre-temps par un autre
+    # processus (contraintes uniques, vues anonymes comprises) fait échouer
+    # le lot (réessayé au prochain vidage) au lieu d'être comptée deux fois
+    ArticleView.objects.bulk_create(
+        [ArticleView(article_id=a, user_id=u, ip_address=ip) for a, u, ip in new_keys],
+        batch_size=500,
+    )
+    per_article = defaultdict(int)
+    for article_id, _, _ in new_keys:
+        per_article[article_id] += 1
+    return per_article
+
+
+def _update_sketches(batch):
+    visitors = defaultdict(set)
+    for article_id, user_id, ip_address in batch:
+        visitors[article_id].add(f'{user_id}|{ip_address}')
+    today = timezone.localdate()
+
+    existing = {
+        (sketch.article_id, sketch.day): sketch
+        for sketch in VisitorSketch.objects.select_for_update().filter(
+            Q(day=today) | Q(day__isnull=True), article_id__in=visitors.keys()
+        )
+    }
+    to_create, to_update = [], []
+    per_article = {}
+    for article_id, values in visitors.items():
+        for day in (today, None):
+            sketch = existing.get((article_id, day))
+            hll = HyperLogLog.from_bytes(sketch.registers) if sketch else HyperLogLog()
+            before = hll.count()
+            hll.update(values)
+            if sketch is None:
+                to_create.append(VisitorSketch(article_id=article_id, day=day, registers=hll.to_bytes()))
+            else:
+                sketch.registers = hll.to_bytes()
+                sketch.updated_at = timezone.now()
+                to_update.append(sketch)
+            if day is None:
+                # Les vues suivent la progression de l'estimation cumulée
+                increment = max(hll.count() - before, 0)
+                if increment:
+                    per_article[article_id] = increment
+
+    VisitorSketch.objects.bulk_create(to_create)
+    VisitorSketch.objects.bulk_update(to_update, ['registers', 'updated_at'])
+    return per_article
+
+
+def _add_views(per_article):
+    # Regrouper les articles par incrément pour limiter le nombre d'UPDATE
+    by_increment = defaultdict(list)
+    for article_id, increment in per_article.items():
+        by_increment[increment].append(article_id)
+    for increment, article_ids in by_increment.items():
+        Article.objects.filter(pk__in=article_ids).update(views=F('views') + increment)
+    add_author_views(per_article)
+
+
+@serialized_write
+def _write_with_counters(write):
+    # Point de sauvegarde : une vue écrite en parallèle (IntegrityError, lot
+    # remis en attente) laisse une transaction englobante utilisable
+    with transaction.atomic():
+        per_article = write()
+        _add_views(per_article)
+    return per_article
+
+
+@serialized_write
+def _count_batch(batch_id, per_article):
+    # Le marqueur est validé avec les compteurs ; unique : un lot appliqué
+    # en parallèle par un autre processus lève IntegrityError. Point de
+    # sauvegarde : appelée dans une transaction englobante, elle reste utilisable
+    with transaction.atomic():
+        AppliedViewBatch.objects.create(batch=batch_id)
+        _add_views(per_article)
+
+
+def apply_batch(batch_id, per_article):
+    """Ajoute aux compteurs le lot journalisé `batch_id` ; retourne False s'il l'était déjà."""
+    try:
+        _count_batch(batch_id, per_article)
+        counted = True
+    except IntegrityError:
+        counted = False  # appliqué entre-temps par un autre processus
+    PendingViewCount.objects.filter(batch=batch_id).delete()
+    return counted
+
+
+def apply_pending_views():
+    """Rejoue les lots de vues journalisés non appliqués ; retourne le nombre de vues ajoutées.
+
+    Avec une base d'analyse, les vues et leur journal (PendingViewCount)
+    sont validés d'abord, puis les compteurs et le marqueur du lot
+    (AppliedViewBatch) ensemble dans la base par défaut. Un échec entre les
+    deux laisse le lot dans le journal : il est rejoué ici, une seule fois.
+    Le marqueur est gardé MARKER_RETENTION pour qu'un processus qui aurait
+    lu le journal avant sa suppression ne rejoue pas le lot.
+    """
+    pending = defaultdict(dict)
+    rows = PendingViewCount.objects.order_by('pk').values_list('batch', 'article_id', 'views')
+    for batch_id, article_id, views in rows:
+        pending[batch_id][article_id] = views
+    applied = set(AppliedViewBatch.objects.filter(batch__in=list(pending)).values_list('batch', flat=True))
+    applied_views = 0
+    for batch_id, per_article in pending.items():
+        if batch_id in applied:
+            PendingViewCount.objects.filter(batch=batch_id).delete()
+        elif apply_batch(batch_id, per_article):
+            applied_views += sum(per_article.values())
+    AppliedViewBatch.objects.filter(applied_at__lt=timezone.now() - MARKER_RETENTION).delete()
+    return applied_views
+
+
+view_buffer = ViewBuffer()
+atexit.register(view_buffer.flush)
+
+
+def record_article_view(article_id, user_id, ip_address):
+    return view_buffer.record(article_id, user_id, ip_address)
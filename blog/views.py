@@ -1,14 +1,21 @@
+import hashlib
+from functools import wraps
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login, authenticate
 from django.contrib.auth.models import User
-from .models import Article, Comment, Tag, UserProfile, ArticleView
+from .models import Article, AuthorStats, Comment, Tag, UserProfile
 from .forms import ArticleForm, CommentForm, SignUpForm, UserProfileForm
+from .viewcounter import record_article_view, view_buffer
+from . import autocomplete, counters, pagecache, search
+from .comments import reply_page, serialize_comment, thread_page
+from .likes import liked_article_ids, toggle_like
+from .pagination import SORT_KEYS, CachedCountPaginator, keyset_ordering, keyset_page, next_cursor_for
 from django.contrib import messages
-from django.db.models import Count, Q
-from django.core.paginator import Paginator
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST
+from django.db.models import OuterRef, Subquery
+from django.http import HttpResponseBadRequest, JsonResponse
+from django.views.decorators.http import condition, require_POST
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.views.generic import ListView
@@ -39,62 +46,181 @@ def signup(request):
         form = SignUpForm()
     return render(request, 'registration/signup.html', {'form': form})
 
-def article_list(request):
-    articles = Article.objects.filter(status='published').select_related('author').prefetch_related('tags', 'likes')
+def _filtered_articles(request):
+    """Articles publiés filtrés et triés selon les paramètres tag / search / sort
+
+    Mémorisé sur la requête : les validateurs HTTP et la vue partagent le
+    même queryset (et le classement par pertinence, lu une seule fois).
+    """
+    if not hasattr(request, '_filtered_articles'):
+        request._filtered_articles = _filter_articles(request)
+    return request._filtered_articles
+
+def _filter_articles(request):
+    articles = Article.objects.filter(status='published').select_related('author__profile').prefetch_related('tags')
     
     # Filtrage par tag
     tag_slug = request.GET.get('tag')
     if tag_slug:
         articles = articles.filter(tags__slug=tag_slug)
     
-    # Recherche
+    # Recherche (index plein texte FTS5)
     search_query = request.GET.get('search')
     if search_query:
-        articles = articles.filter(
-            Q(title__icontains=search_query) | 
-            Q(content__icontains=search_query) |
-            Q(author__username__icontains=search_query)
-        )
+        articles = search.filter_articles(articles, search_query)
+    
+    # Tri (par pertinence par défaut lors d'une recherche)
+    sort_by = request.GET.get('sort', 'relevance' if search_query else '-created_at')
+    if sort_by == 'relevance' and search_query:
+        articles = search.order_by_relevance(articles, search_query)
+    elif sort_by in SORT_KEYS:
+        articles = articles.order_by(*keyset_ordering(sort_by))
     
-    # Tri
-    sort_by = request.GET.get('sort', '-created_at')
-    if sort_by in ['-created_at', '-views', '-likes', 'title']:
-        if sort_by == '-likes':
-            articles = articles.annotate(likes_count=Count('likes')).order_by('-likes_count')
+    return articles, tag_slug, search_query, sort_by
+
+# Validateurs HTTP (ETag / Last-Modified) : calculés depuis quelques colonnes
+# indexées et les jetons de version de blog.pagecache, sans rendre la page.
+# Le résultat est mémorisé sur la requête, partagé par etag_func et
+# last_modified_func de @condition.
+
+def _validators(request, compute):
+    if not hasattr(request, '_validators'):
+        if 'messages' in request.COOKIES:
+            # Messages à afficher : la page doit être rendue
+            request._validators = (None, None)
         else:
-            articles = articles.order_by(sort_by)
+            viewer = request.user.pk if request.user.is_authenticated else 0
+            state, last_modified = compute()
+            etag = hashlib.md5(repr((viewer, state)).encode()).hexdigest()
+            request._validators = (etag, last_modified)
+    return request._validators
+
+def _article_list_page(request):
+    """Page demandée de la liste, mémorisée sur la requête : les validateurs et la vue lisent les mêmes lignes"""
+    if not hasattr(request, '_article_list_page'):
+        articles, *_ = _filtered_articles(request)
+        # Pagination (total approximatif mis en cache, pas de COUNT à chaque page)
+        page = CachedCountPaginator(articles, 6).get_page(request.GET.get('page'))
+        page.object_list = list(page.object_list)
+        request._article_list_page = page
+    return request._article_list_page
+
+def _article_list_validators(request):
+    def compute():
+        page = _article_list_page(request)
+        rows = [(a.pk, a.updated_at, a.likes_count, a.comments_count) for a in page.object_list]
+        tokens = pagecache.versions('articles', 'popular_tags', 'tags')
+        last_modified = max((row[1] for row in rows), default=None)
+        return (rows, page.paginator.count, sorted(tokens.items())), last_modified
+    return _validators(request, compute)
+
+def _article_detail_validators(request, pk):
+    def compute():
+        last_comment = Comment.objects.filter(article=OuterRef('pk')).order_by('-updated_at').values('updated_at')[:1]
+        row = Article.objects.filter(pk=pk).annotate(last_comment=Subquery(last_comment)).values_list(
+            'updated_at', 'likes_count', 'comments_count', 'last_comment'
+        ).first()
+        if row is None:
+            return None, None
+        tokens = pagecache.versions('tags')
+        return (row, sorted(tokens.items())), max(row[0], row[3] or row[0])
+    return _validators(request, compute)
+
+def _tag_list_validators(request):
+    return _validators(request, lambda: (sorted(pagecache.versions('tags').items()), None))
+
+def _user_profile_validators(request, username):
+    def compute():
+        stats = AuthorStats.objects.filter(user__username=username).values_list(
+            'pk', 'article_count', 'likes_received', 'views_received', 'comments_written'
+        ).first()
+        if stats is None:
+            return None, None
+        recent = list(Article.objects.filter(author_id=stats[0], status='published').order_by(
+            '-created_at'
+        ).values_list('pk', 'updated_at', 'likes_count')[:5])
+        tokens = pagecache.versions(f'profile:{stats[0]}', f'likes:{stats[0]}')
+        # Pas de Last-Modified : les modifications du profil ne sont pas datées
+        return (stats, recent, sorted(tokens.items())), None
+    return _validators(request, compute)
+
+def _etag(validators):
+    return lambda request, *args, **kwargs: validators(request, *args, **kwargs)[0]
+
+def _last_modified(validators):
+    return lambda request, *args, **kwargs: validators(request, *args, **kwargs)[1]
+
+@pagecache.cache_page_for_anonymous('article_list', params=('tag', 'search', 'sort', 'page'))
+@condition(etag_func=_etag(_article_list_validators), last_modified_func=_last_modified(_article_list_validators))
+def article_list(request):
+    # La liste change dès qu'un article est publié ou retiré
+    pagecache.track('articles')
+    _, tag_slug, search_query, sort_by = _filtered_articles(request)
+    page_obj = _article_list_page(request)
+    if search_query:
+        page_obj.object_list = search.highlight_articles(page_obj.object_list, search_query)
     
-    # Pagination
-    paginator = Paginator(articles, 6)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Curseur pour le chargement infini (tris par clé uniquement)
+    next_cursor = None
+    if page_obj.has_next() and sort_by in SORT_KEYS:
+        next_cursor = next_cursor_for(sort_by, page_obj.object_list[-1])
     
-    # Tags populaires
-    popular_tags = Tag.objects.annotate(article_count=Count('articles')).order_by('-article_count')[:10]
+    # Tags populaires (compteurs matérialisés, liste en cache)
+    popular_tags = counters.popular_tags()
     
     context = {
         'page_obj': page_obj,
         'popular_tags': popular_tags,
         'current_tag': tag_slug,
         'search_query': search_query,
-        'sort_by': sort_by
+        'sort_by': sort_by,
+        'show_featured': not search_query and not tag_slug,
+        'next_cursor': next_cursor,
+        'liked_ids': liked_article_ids(request.user, [article.pk for article in page_obj.object_list])
     }
     return render(request, 'blog/article_list.html', context)
 
-def article_detail(request, pk):
-    article = get_object_or_404(Article.objects.select_related('author').prefetch_related('tags', 'likes'), pk=pk)
+def article_list_more(request):
+    """Fragment HTML des articles suivants pour le défilement infini (pagination par curseur)"""
+    articles, tag_slug, search_query, sort_by = _filtered_articles(request)
+    if sort_by not in SORT_KEYS:
+        return HttpResponseBadRequest('Tri non compatible avec la pagination par curseur')
     
-    # Incrémenter les vues (une fois par IP/utilisateur)
-    ip_address = get_client_ip(request)
-    view_obj, created = ArticleView.objects.get_or_create(
-        article=article,
-        user=request.user if request.user.is_authenticated else None,
-        ip_address=ip_address
-    )
-    if created:
-        article.increment_views()
+    page = keyset_page(articles, sort_by, request.GET.get('cursor'), per_page=6)
+    articles = page.object_list
+    if search_query:
+        articles = search.highlight_articles(articles, search_query)
     
-    comments = article.comments.filter(parent=None).select_related('author').prefetch_related('replies__author')
+    response = render(request, 'blog/article_cards.html', {
+        'articles': articles,
+        'liked_ids': liked_article_ids(request.user, [article.pk for article in articles])
+    })
+    response['X-Next-Cursor'] = page.next_cursor or ''
+    return response
+
+def _record_cached_view(request, pk):
+    record_article_view(pk, None, get_client_ip(request))
+
+def _count_revalidated_views(view):
+    """Compte aussi la vue quand @condition répond 304 sans appeler la vue"""
+    @wraps(view)
+    def wrapper(request, pk):
+        response = view(request, pk)
+        if response.status_code == 304:
+            record_article_view(pk, request.user.pk if request.user.is_authenticated else None,
+                                get_client_ip(request))
+        return response
+    return wrapper
+
+@pagecache.cache_page_for_anonymous('article_detail', on_hit=_record_cached_view)
+@_count_revalidated_views
+@condition(etag_func=_etag(_article_detail_validators), last_modified_func=_last_modified(_article_detail_validators))
+def article_detail(request, pk):
+    article = get_object_or_404(Article.objects.select_related('author').prefetch_related('tags'), pk=pk)
+    
+    # Compter la vue (une fois par IP/utilisateur) sans écriture synchrone
+    record_article_view(article.pk, request.user.pk if request.user.is_authenticated else None, get_client_ip(request))
+    article.views += view_buffer.pending_for(article.pk)
     
     if request.method == 'POST':
         if not request.user.is_authenticated:
@@ -106,7 +232,7 @@ def article_detail(request, pk):
             comment.author = request.user
             parent_id = request.POST.get('parent_id')
             if parent_id:
-                comment.parent = Comment.objects.get(id=parent_id)
+                comment.parent = get_object_or_404(Comment, id=parent_id, article=article)
             comment.save()
             messages.success(request, 'Commentaire ajouté avec succès !')
             return redirect('article_detail', pk=pk)
@@ -119,14 +245,40 @@ def article_detail(request, pk):
         status='published'
     ).exclude(pk=article.pk).distinct()[:3]
     
+    # Première page de fils ; la suite est chargée à la demande
+    comment_page = thread_page(article)
+    
     context = {
         'article': article,
-        'comments': comments,
+        'comment_page': comment_page,
+        'user_liked': bool(liked_article_ids(request.user, [article.pk])),
         'form': form,
         'similar_articles': similar_articles
     }
     return render(request, 'blog/article_detail.html', context)
 
+def article_comments(request, pk):
+    """Page suivante des fils de commentaires d'un article (fragment HTML ou JSON)"""
+    article = get_object_or_404(Article.objects.only('pk'), pk=pk)
+    page = thread_page(article, request.GET.get('cursor'))
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [serialize_comment(comment) for comment in page.comments],
+            'next_cursor': page.next_cursor
+        })
+    return render(request, 'blog/comment_page.html', {'article': article, 'comment_page': page})
+
+def comment_replies(request, pk):
+    """Réponses suivantes d'un fil de commentaires (fragment HTML ou JSON)"""
+    root = get_object_or_404(Comment.objects.only('pk', 'path', 'parent_id'), pk=pk, parent__isnull=True)
+    page = reply_page(root, request.GET.get('cursor'))
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [serialize_comment(comment) for comment in page.comments],
+            'next_cursor': page.next_cursor
+        })
+    return render(request, 'blog/comment_replies.html', {'root': root, 'reply_page': page})
+
 @login_required
 def article_create(request):
     if request.method == 'POST':
@@ -176,35 +328,33 @@ def article_delete(request, pk):
 @login_required
 @require_POST
 def like_article(request, pk):
-    article = get_object_or_404(Article, pk=pk)
-    user_liked = article.likes.filter(id=request.user.id).exists()
-    
-    if user_liked:
-        article.likes.remove(request.user)
-        liked = False
-    else:
-        article.likes.add(request.user)
-        liked = True
+    article = get_object_or_404(Article.objects.only('pk', 'author_id', 'status'), pk=pk)
+    liked, total_likes = toggle_like(article, request.user)
     
     # Réponse AJAX
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({
             'liked': liked,
-            'total_likes': article.total_likes
+            'total_likes': total_likes
         })
     
     return redirect('article_detail', pk=pk)
 
 @login_required
+@condition(etag_func=_etag(_user_profile_validators))
 def user_profile(request, username):
     user = get_object_or_404(User, username=username)
-    profile, created = UserProfile.objects.get_or_create(user=user)
+    # Statistiques lues dans la même requête que le profil
+    profile, created = UserProfile.objects.select_related('user__author_stats').get_or_create(user=user)
     user_articles = Article.objects.filter(author=user, status='published').order_by('-created_at')[:5]
+    # Auteur joint : une seule requête pour l'onglet Favoris
+    liked_articles = list(user.blog_posts.select_related('author')[:10])
     
     context = {
         'profile_user': user,
         'profile': profile,
         'user_articles': user_articles,
+        'liked_articles': liked_articles,
         'is_own_profile': request.user == user
     }
     return render(request, 'blog/user_profile.html', context)
@@ -256,33 +406,50 @@ def account_settings(request):
             # Logique de suppression de compte (à implémenter avec précaution)
             messages.warning(request, '⚠️ Fonctionnalité de suppression en cours de développement.')
     
-    return render(request, 'blog/account_settings.html')
+    return render(request, 'blog/account_settings.html', {'stats': AuthorStats.for_user(request.user)})
 
+@pagecache.cache_page_for_anonymous('tag_list')
+@condition(etag_func=_etag(_tag_list_validators))
 def tag_list(request):
-    tags = Tag.objects.annotate(article_count=Count('articles')).order_by('-article_count')
+    pagecache.track('tags')
+    tags = Tag.objects.order_by('-published_count', 'name')
     return render(request, 'blog/tag_list.html', {'tags': tags})
 
+@pagecache.cache_page_for_anonymous('search_articles', params=('q',))
 def search_articles(request):
     query = request.GET.get('q', '')
-    articles = []
-    
-    if query:
-        articles = Article.objects.filter(
-            Q(title__icontains=query) | Q(content__icontains=query),
-            status='published'
-        ).select_related('author').prefetch_related('tags')[:10]
     
-    # Réponse AJAX pour l'autocomplétion
+    # Réponse AJAX pour l'autocomplétion : servie par l'index en mémoire
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        suggestions = autocomplete.get_index().search(query, limit=10, kinds={autocomplete.ARTICLE})
         results = [{
-            'id': article.id,
-            'title': article.title,
-            'author': article.author.username,
-            'url': article.get_absolute_url()
-        } for article in articles]
+            'id': suggestion.id,
+            'title': suggestion.label,
+            'author': suggestion.extra['author'],
+            'url': suggestion.url
+        } for suggestion in suggestions]
         return JsonResponse({'results': results})
     
+    articles = []
+    if query:
+        pagecache.track('articles')
+        articles = search.search_articles(query, limit=10)
+    
     return render(request, 'blog/search_results.html', {
         'articles': articles,
         'query': query
     })
+
+def search_autocomplete(request):
+    """Suggestions (articles, tags, auteurs) pour la saisie en cours, sans requête SQL"""
+    query = request.GET.get('q', '')[:100]
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 8)), 20))
+    except ValueError:
+        limit = 8
+    suggestions = autocomplete.get_index().search(query, limit=limit)
+    return JsonResponse({'results': [{
+        'type': suggestion.kind,
+        'label': suggestion.label,
+        'url': suggestion.url
+    } for suggestion in suggestions]})
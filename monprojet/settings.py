@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,6 +43,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Avant tout middleware qui lit ou modifie le corps des réponses
+    'blog.compression.CompressionMiddleware',
+    'blog.querybudget.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -77,9 +81,27 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        # Connexions persistantes (pragmas appliqués une fois par connexion)
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+    },
 }
 
+# Vues d'articles et sketches de visiteurs (blog.routers) dans leur propre
+# base avec BLOG_ANALYTICS_DB = 'analytics' : d'abord
+# `manage.py migrate --database=analytics`, puis `move_analytics_data`.
+# L'alias n'est déclaré que dans ce cas (sinon rien ne crée analytics.sqlite3),
+# et toujours pour `manage.py test` (base de test en mémoire).
+DATABASE_ROUTERS = ['blog.routers.AnalyticsRouter']
+BLOG_ANALYTICS_DB = None  # None : tables d'analyse dans 'default'
+if BLOG_ANALYTICS_DB or sys.argv[1:2] == ['test']:
+    DATABASES['analytics'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'analytics.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -120,5 +142,96 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Médias stockés par contenu (blog.storage) : envois identiques dédupliqués,
+# URLs immuables ; références comptées par blog.media.
+# Fichiers statiques : noms avec empreinte et copies .gz / .br (paquet
+# facultatif brotli) écrits par collectstatic
+STORAGES = {
+    'default': {'BACKEND': 'blog.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'blog.storage.CompressedManifestStaticFilesStorage'},
+}
+BLOG_STATIC_MAX_AGE = 60  # secondes, fichiers statiques sans empreinte
+
 LOGIN_REDIRECT_URL = 'article_list'
 LOGOUT_REDIRECT_URL = 'login'
+
+# Comptage des vues en écriture différée (blog.viewcounter)
+BLOG_VIEW_BUFFER_ENABLED = True
+BLOG_VIEW_BUFFER_MAX_PENDING = 500
+BLOG_VIEW_BUFFER_FLUSH_INTERVAL = 5  # secondes
+
+# 'exact' : une ligne ArticleView par visiteur ; 'sketch' : HyperLogLog par
+# article et par jour (erreur standard ~1,6 %, ~4 Ko max par sketch)
+BLOG_VIEW_COUNTING = 'exact'
+BLOG_VIEW_SKETCH_WINDOW = 1800  # fenêtre du filtre de Bloom, en secondes
+
+# Index d'autocomplétion en mémoire : reconstruit au plus tard après N secondes
+BLOG_AUTOCOMPLETE_TTL = 300
+
+# Cache partagé entre processus (workers, commandes de gestion) : les
+# invalidations du cache de pages et des tags populaires valent pour tous
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    }
+}
+
+# Cache des pages pour les visiteurs anonymes (blog.pagecache)
+BLOG_PAGE_CACHE_ENABLED = True
+BLOG_PAGE_CACHE_TIMEOUT = 300  # borne la fraîcheur de ce qui n'est pas suivi (vues)
+BLOG_PAGE_CACHE_STATS = False  # compteurs de `manage.py page_cache_report`
+
+# Déclinaisons d'images traitées hors requête (blog.imagequeue) par
+# `manage.py process_image_jobs` ; False : générées pendant la requête
+BLOG_IMAGE_QUEUE_ENABLED = True
+BLOG_IMAGE_JOB_TIMEOUT = 600  # secondes avant reprise d'une tâche abandonnée
+BLOG_IMAGE_JOB_MAX_ATTEMPTS = 3
+
+# Service des médias par blog.mediaserve : None (FileResponse / sendfile du
+# serveur WSGI), 'x-accel-redirect' (nginx, location interne
+# BLOG_MEDIA_ACCEL_PREFIX -> MEDIA_ROOT) ou 'x-sendfile' (Apache mod_xsendfile)
+BLOG_MEDIA_ACCEL = None
+BLOG_MEDIA_ACCEL_PREFIX = '/protected-media/'
+BLOG_MEDIA_MAX_AGE = 3600  # secondes, fichiers non stockés par contenu
+
+# Compression des réponses HTML / JSON (blog.compression.CompressionMiddleware)
+BLOG_COMPRESSION_ENABLED = True
+BLOG_COMPRESSION_MIN_SIZE = 512  # octets : en dessous, la compression ne gagne rien
+
+# Profil SQLite (blog.sqlite) : pragmas appliqués à chaque connexion ;
+# {} pour garder ceux de SQLite (WAL déconseillé sur un disque réseau)
+BLOG_SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'mmap_size': 128 * 1024 * 1024,
+    'cache_size': -32000,
+    'temp_store': 'memory',
+}
+BLOG_SQLITE_WRITE_RETRIES = 5  # nouveaux essais d'une écriture sur « database is locked »
+
+# Budgets de requêtes SQL par nom d'URL (blog.querybudget), vérifiés par les
+# tests ; en production, un dépassement ou un N+1 est journalisé ('log'),
+# 'raise' lève une exception, 'off' désactive le relevé
+BLOG_QUERY_BUDGET_MODE = 'log'
+BLOG_QUERY_BUDGET_TRACE = DEBUG  # ligne de gabarit de chaque requête (parcours de pile)
+BLOG_QUERY_N_PLUS_ONE_THRESHOLD = 5  # requêtes de même structure à partir desquelles on signale un N+1
+# Vues absentes de BLOG_QUERY_BUDGETS : BLOG_QUERY_BUDGET_DEFAULT (défaut blog.querybudget.DEFAULT_BUDGET)
+BLOG_QUERY_BUDGETS = {
+    'article_list': 10,
+    'article_list_more': 6,
+    'article_detail': 16,
+    'article_comments': 6,
+    'comment_replies': 6,
+    'like_article': 10,
+    'tag_list': 5,
+    'search_articles': 8,
+    'search_autocomplete': 4,
+    'user_profile': 12,
+    'edit_profile': 6,
+    'account_settings': 6,
+    'article_create': 5,
+    'article_update': 7,
+}